@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+
+from cart.models import Cart, CartItem
+from product.models import Product
+
+
+def fingerprint(operations):
+    """Stable hash of a batch, to tell a retry from a reused idempotency key"""
+    raw = json.dumps(operations, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def check_products(operations):
+    """Validate every product the operations touch in one IN query"""
+    product_ids = {operation["product_id"] for operation in operations}
+    available = set(
+        Product.objects.filter(pk__in=product_ids, is_archived=False).values_list(
+            "id", flat=True
+        )
+    )
+    missing = product_ids - available
+    if missing:
+        raise ValidationError(
+            {
+                "operations": {
+                    str(pk): "Invalid product_id: Product does not exist."
+                    for pk in missing
+                }
+            }
+        )
+    return product_ids
+
+
+def fold_operations(quantities, operations):
+    """Play add/set/remove `operations` over {product_id: quantity}, in order"""
+    for operation in operations:
+        product_id = operation["product_id"]
+        if operation["op"] == "add":
+            quantities[product_id] = (
+                quantities.get(product_id, 0) + operation["quantity"]
+            )
+        elif operation["op"] == "set":
+            quantities[product_id] = operation["quantity"]
+        else:
+            quantities[product_id] = 0
+    return quantities
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply add/set/remove `operations` to `cart`, in order, with a constant
+    number of queries: products are validated in one IN query, the touched
+    items are loaded once, and the result is written with bulk_create,
+    bulk_update and one delete. Parallel rows for the same product are
+    merged into the oldest one. Must run inside a transaction.
+    """
+    product_ids = check_products(operations)
+
+    existing = {}
+    merged = set()
+    to_delete = []
+    for item in CartItem.objects.filter(cart=cart, product_id__in=product_ids).order_by(
+        "created_at"
+    ):
+        if item.product_id in existing:
+            existing[item.product_id].quantity += item.quantity
+            merged.add(item.product_id)
+            to_delete.append(item.pk)
+        else:
+            existing[item.product_id] = item
+
+    quantities = fold_operations(
+        {product_id: item.quantity for product_id, item in existing.items()},
+        operations,
+    )
+
+    to_create, to_update = [], []
+    timestamp = now()
+    for product_id, quantity in quantities.items():
+        item = existing.get(product_id)
+        if item is None:
+            if quantity:
+                to_create.append(
+                    CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                )
+        elif not quantity:
+            to_delete.append(item.pk)
+        elif quantity != item.quantity or product_id in merged:
+            item.quantity = quantity
+            item.updated_at = timestamp
+            to_update.append(item)
+
+    if to_create:
+        CartItem.objects.bulk_create(to_create)
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ["quantity", "updated_at"])
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    # Bulk writes skip CartItem.save, so settle the stored totals in one go
+    Cart.objects.filter(pk=cart.pk).refresh_totals()
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from cart.models import Cart, CartItem
+from coupons.redemption import redeem_coupon
+from ecommerce.outbox import batch as outbox_batch
+from orders.models import Order, OrderItem
+from product.cache import invalidate_many as invalidate_catalog_cache
+from product.models import Product
+from users.models import User
+
+CENT = Decimal("0.01")
+
+
+def get_fee(name):
+    return Decimal(str(getattr(settings, name, "0.00")))
+
+
+def split_discount(discount, amounts):
+    """Spread `discount` over `amounts` pro rata; the last one takes the rest"""
+    total = sum(amounts)
+    if not total:
+        # Nothing to weigh the shares by
+        return [Decimal("0.00")] * (len(amounts) - 1) + [discount]
+    shares = []
+    for amount in amounts[:-1]:
+        shares.append((discount * amount / total).quantize(CENT, rounding=ROUND_DOWN))
+    shares.append(discount - sum(shares))
+    return shares
+
+
+def checkout_cart(cart, buyer, coupon_code=None):
+    """
+    Turn `cart` into one order per seller in a single transaction: stock is
+    reserved, orders and items are bulk inserted, the coupon (if any) is
+    redeemed and split across the orders, and the cart is emptied. Any
+    failure rolls everything back and leaves the cart untouched.
+    """
+    convenience_fee = get_fee("ORDER_CONVENIENCE_FEE")
+    delivery_fee = get_fee("ORDER_DELIVERY_FEE")
+
+    # Every outbox message the checkout queues is written in one INSERT
+    with transaction.atomic(), outbox_batch():
+        # Concurrent or retried checkouts of this cart wait here, then find
+        # the lines already ordered and gone
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        lines = list(
+            CartItem.objects.filter(cart=cart)
+            .select_related("product")
+            .only(
+                "quantity",
+                "product__price",
+                "product__owner_id",
+                "product__is_archived",
+                "product__name",
+            )
+            .order_by("created_at")
+        )
+        if not lines:
+            raise ValidationError({"cart": "Cart is empty"})
+
+        by_seller = defaultdict(list)
+        quantities = defaultdict(int)
+        for line in lines:
+            by_seller[line.product.owner_id].append(line)
+            quantities[line.product_id] += line.quantity
+
+        short = Product.objects.reserve_stock(quantities)
+        if short:
+            names = {line.product_id: line.product.name for line in lines}
+            raise ValidationError(
+                {"cart": {str(pk): f"Not enough stock for {names[pk]}" for pk in short}}
+            )
+
+        sellers = list(by_seller)
+        base_amounts = [
+            sum(line.product.price * line.quantity for line in by_seller[seller])
+            for seller in sellers
+        ]
+
+        coupon = None
+        discounts = [None] * len(sellers)
+        if coupon_code:
+            try:
+                coupon = redeem_coupon(coupon_code, buyer, sum(base_amounts))
+            except ValidationError as e:
+                raise ValidationError({"coupon_code": e.detail})
+            discounts = split_discount(
+                coupon.get_discount(sum(base_amounts)), base_amounts
+            )
+
+        orders = [
+            Order(
+                buyer=buyer,
+                seller_id=seller,
+                base_amount=base_amount,
+                convenience_fee=convenience_fee,
+                delivery_fee=delivery_fee,
+                discount=discount,
+                total_amount=base_amount
+                + convenience_fee
+                + delivery_fee
+                - (discount or 0),
+                coupons=coupon,
+            )
+            for seller, base_amount, discount in zip(sellers, base_amounts, discounts)
+        ]
+        Order.objects.bulk_create(orders)
+        reserved_at = timezone.now()
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product_id=line.product_id,
+                    price_at_order=line.product.price,
+                    quantity=line.quantity,
+                    stock_reserved_at=reserved_at,
+                )
+                for order, seller in zip(orders, sellers)
+                for line in by_seller[seller]
+            ]
+        )
+        # Only what was ordered; lines added meanwhile stay in the cart
+        CartItem.objects.filter(pk__in=[line.pk for line in lines]).delete()
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
+
+        # bulk_create skips post_save; send it so the seller notifications
+        # behave exactly as for orders created one at a time.
+        seller_users = User.objects.in_bulk(sellers)
+        for order in orders:
+            order.buyer = buyer
+            order.seller = seller_users[order.seller_id]
+            post_save.send(
+                sender=Order,
+                instance=order,
+                created=True,
+                update_fields=None,
+                raw=False,
+                using=order._state.db,
+            )
+
+        transaction.on_commit(
+            lambda: invalidate_catalog_cache("product", list(quantities))
+        )
+    return orders
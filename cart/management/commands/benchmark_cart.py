@@ -0,0 +1,136 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cart.models import Cart, CartItem
+from cart.serializer import CartSerializer
+from cart.views import CartViewSet
+from product.models import Brand, Category, Product
+from users.models import User
+
+
+class LegacyCartSerializer(CartSerializer):
+    """Totals recomputed from the items on every render, as they used to be"""
+
+    total_items = serializers.SerializerMethodField()
+    total_price = serializers.SerializerMethodField()
+
+    def get_total_items(self, obj):
+        return sum(item.quantity for item in obj.cart_items.all())
+
+    def get_total_price(self, obj):
+        return sum(item.quantity * item.product.price for item in obj.cart_items.all())
+
+
+class LegacyCartViewSet(CartViewSet):
+    """The cart GET path before totals were stored on the cart"""
+
+    serializer_class = LegacyCartSerializer
+
+    def get_queryset(self):
+        return Cart.objects.filter(owner=self.request.user).prefetch_related(
+            "cart_items__product"
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if not queryset.exists():
+            Cart.objects.create(owner=request.user)
+        return self.retrieve(request, pk=queryset.first().pk)
+
+    def retrieve(self, request, *args, **kwargs):
+        cart = self.get_queryset().first()
+        serializer = self.get_serializer(cart)
+        return Response({"success": True, "data": serializer.data})
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare cart GET latency before and after stored cart totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=200)
+        parser.add_argument("--runs", type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Seeded inside a transaction that is rolled back at the end, so the
+        # benchmark never leaves fixture rows behind.
+        try:
+            with transaction.atomic():
+                buyer = self.seed(options["items"])
+                self.run(buyer, options["runs"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        # bulk_create keeps the welcome email and cache signals out of it
+        seller = User(
+            fullname="Bench Seller",
+            email=f"bench-{uuid.uuid4().hex}@example.com",
+            role="seller",
+        )
+        buyer = User(
+            fullname="Bench Buyer",
+            email=f"bench-{uuid.uuid4().hex}@example.com",
+            role="buyer",
+        )
+        User.objects.bulk_create([seller, buyer])
+        brand = Brand(name=f"bench-{uuid.uuid4().hex[:8]}")
+        Brand.objects.bulk_create([brand])
+        category = Category(name="bench", slug=f"bench-{uuid.uuid4().hex}")
+        Category.objects.bulk_create([category])
+        products = [
+            Product(
+                name=f"Product {i}",
+                desp="benchmark",
+                price=Decimal(i % 500) + Decimal("0.99"),
+                stock=Decimal("100.00"),
+                brand=brand,
+                category=category,
+                owner=seller,
+            )
+            for i in range(count)
+        ]
+        Product.objects.bulk_create(products)
+        cart = Cart.objects.create(owner=buyer)
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product=product, quantity=2) for product in products]
+        )
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
+        return buyer
+
+    def run(self, buyer, runs):
+        factory = APIRequestFactory()
+        scenarios = [
+            ("before", LegacyCartViewSet.as_view({"get": "list"})),
+            ("after", CartViewSet.as_view({"get": "list"})),
+            ("summary", CartViewSet.as_view({"get": "summary"})),
+        ]
+        for name, view in scenarios:
+            timings = []
+            for _ in range(runs):
+                request = factory.get("/api/cart/")
+                force_authenticate(request, user=buyer)
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    view(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{name:<8} {len(queries):>4} queries "
+                f"p50={p50:8.2f}ms p99={p99:8.2f}ms"
+            )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_alter_cartitem_quantity"),
+        ("product", "0008_product_live_stock_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(
+                fields=["cart", "product"], name="cartitem_cart_product_idx"
+            ),
+        ),
+    ]
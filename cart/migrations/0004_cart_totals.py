@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:48
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    items = CartItem.objects.filter(cart=OuterRef("pk")).values("cart")
+    Cart.objects.update(
+        total_items=Coalesce(
+            Subquery(items.annotate(total=Sum("quantity")).values("total")), 0
+        ),
+        total_price=Coalesce(
+            Subquery(
+                items.annotate(
+                    total=Sum(
+                        F("quantity") * F("product__price"),
+                        output_field=DecimalField(),
+                    )
+                ).values("total")
+            ),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0003_cartitem_cart_product_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="total_items",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total_price",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=12
+            ),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
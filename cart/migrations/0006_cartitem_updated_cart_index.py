@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0005_cartmutation"),
+        ("product", "0008_product_live_stock_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(
+                fields=["updated_at", "cart"], name="cartitem_updated_cart_idx"
+            ),
+        ),
+    ]
@@ -1,20 +1,83 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from users.models import User
 from ecommerce.utils.models import UUID, TimeStampModel
 from product.models import Product
 
 
+def _cart_quantity(product_id):
+    """Quantity of `product_id` in the outer cart, for use in Cart updates"""
+    return Subquery(
+        CartItem.objects.filter(cart=OuterRef("pk"), product_id=product_id)
+        .values("cart")
+        .annotate(quantity=Sum("quantity"))
+        .values("quantity")
+    )
+
+
+class CartQuerySet(models.QuerySet):
+    def reprice(self, product_id, price_delta):
+        """Carry a price change of `product_id` into every cart holding it"""
+        return self.filter(cart_items__product_id=product_id).update(
+            total_price=F("total_price") + _cart_quantity(product_id) * price_delta
+        )
+
+    def drop_product(self, product_id, price):
+        """Take `product_id` out of the totals before its cart items go away"""
+        return self.filter(cart_items__product_id=product_id).update(
+            total_items=F("total_items") - _cart_quantity(product_id),
+            total_price=F("total_price") - _cart_quantity(product_id) * price,
+        )
+
+    def refresh_totals(self):
+        """Recompute the stored totals from the cart items, one UPDATE for all"""
+        items = CartItem.objects.filter(cart=OuterRef("pk")).values("cart")
+        return self.update(
+            total_items=Coalesce(
+                Subquery(items.annotate(total=Sum("quantity")).values("total")), 0
+            ),
+            total_price=Coalesce(
+                Subquery(
+                    items.annotate(
+                        total=Sum(
+                            F("quantity") * F("product__price"),
+                            output_field=DecimalField(),
+                        )
+                    ).values("total")
+                ),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(),
+            ),
+        )
+
+
 class Cart(UUID, TimeStampModel):
+    """
+    `total_items` and `total_price` are kept in step with the cart items by
+    CartItem.save/delete and by the product price/delete signals. Bulk
+    queryset writes bypass those, so call `refresh_totals` after them; the
+    reconcile_cart_totals task also recomputes every cart nightly.
+    """
+
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="carts")
+    total_items = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00")
+    )
+
+    objects = CartQuerySet.as_manager()
 
     def __str__(self):
         return f"Cart of {self.owner.fullname} ({self.id})"
 
     def get_total_items(self):
-        return sum(item.quantity for item in self.cart_items.all())
+        return self.total_items
 
     def get_total_price(self):
-        return sum(item.quantity * item.product.price for item in self.cart_items.all())
+        return self.total_price
 
 
 class CartItem(UUID, TimeStampModel):
@@ -26,3 +89,78 @@ class CartItem(UUID, TimeStampModel):
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in cart {self.cart.id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cart", "product"], name="cartitem_cart_product_idx"),
+            # Abandoned cart detection reads recent activity per cart
+            models.Index(
+                fields=["updated_at", "cart"], name="cartitem_updated_cart_idx"
+            ),
+        ]
+
+    def _locked_saved_state(self):
+        """(product_id, quantity) of the row, locked until the transaction ends"""
+        return (
+            CartItem.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list("product_id", "quantity")
+            .first()
+        )
+
+    def _adjust_cart_totals(self, product_id, quantity):
+        # The price is read in the same statement, so it is never stale
+        price = Product.objects.filter(pk=product_id).values("price")[:1]
+        Cart.objects.filter(pk=self.cart_id).update(
+            total_items=F("total_items") + quantity,
+            total_price=F("total_price") + Subquery(price) * quantity,
+        )
+
+    def save(self, *args, **kwargs):
+        # Deltas are taken against the locked row, not the loaded instance,
+        # so concurrent edits of one item cannot apply them to stale values
+        with transaction.atomic(using=kwargs.get("using")):
+            previous = None if self._state.adding else self._locked_saved_state()
+            super().save(*args, **kwargs)
+            if previous is None:
+                self._adjust_cart_totals(self.product_id, self.quantity)
+            elif previous[0] == self.product_id:
+                if previous[1] != self.quantity:
+                    self._adjust_cart_totals(
+                        self.product_id, self.quantity - previous[1]
+                    )
+            else:
+                self._adjust_cart_totals(previous[0], -previous[1])
+                self._adjust_cart_totals(self.product_id, self.quantity)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            previous = self._locked_saved_state()
+            if previous is not None:
+                self._adjust_cart_totals(previous[0], -previous[1])
+            return super().delete(*args, **kwargs)
+
+
+class CartMutation(UUID, TimeStampModel):
+    """
+    One applied batch of cart operations, keyed by the client's idempotency
+    key. A retry with the same key replays `response` instead of applying
+    the operations again.
+    """
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="cart_mutations"
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Cart mutation {self.key} by {self.owner_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "key"], name="cartmutation_owner_key_uniq"
+            ),
+        ]
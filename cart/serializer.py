@@ -59,3 +59,34 @@ class CartSerializer(serializers.ModelSerializer):
 
     def get_total_price(self, obj):
         return obj.get_total_price()
+
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cart
+        fields = ["id", "total_items", "total_price", "updated_at"]
+        read_only_fields = fields
+
+
+class CheckoutSerializer(serializers.Serializer):
+    coupon_code = serializers.CharField(required=False, allow_blank=True)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=["add", "set", "remove"])
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data["op"] == "remove":
+            return data
+        if "quantity" not in data:
+            raise ValidationError({"quantity": "This field is required."})
+        if data["op"] == "add" and data["quantity"] < 1:
+            raise ValidationError({"quantity": "Ensure this value is at least 1."})
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    idempotency_key = serializers.CharField(max_length=255, required=False)
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,319 @@
+import json
+import logging
+import uuid
+from decimal import Decimal
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from cart.batch import fold_operations
+from cart.models import Cart, CartItem
+from product.models import Product
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "cart:dirty"
+# Present in every loaded cart hash, so an empty cart is not a cache miss
+LOADED = b"_loaded"
+
+
+@lru_cache(maxsize=1)
+def get_redis():
+    return redis.Redis.from_url(settings.CART_REDIS_URL)
+
+
+def get_cart_store():
+    """
+    The Redis cart store when CART_BACKEND is "redis", or None when cart
+    items are read and written straight from the database.
+    """
+    if getattr(settings, "CART_BACKEND", "database") != "redis":
+        return None
+    return RedisCartStore(get_redis())
+
+
+class RedisCartStore:
+    """
+    Write-behind cart store. Each cart's items live in one Redis hash of
+    product id -> {"id", "quantity", "created_at", "updated_at"}, loaded from
+    CartItem rows on first use. Changes only touch Redis and mark the cart
+    dirty; `flush` writes a cart back to the database, which checkout and the
+    flush_redis_carts task do. Item ids are kept across flushes.
+    """
+
+    def __init__(self, client):
+        self.redis = client
+        self.ttl = getattr(settings, "CART_REDIS_TTL", 7 * 24 * 3600)
+
+    def key(self, cart):
+        return f"cart:{cart.pk.hex}:items"
+
+    def idempotency_key(self, owner, key):
+        return f"cart:{owner.pk.hex}:batch:{key}"
+
+    def entries(self, cart):
+        """{product_id: entry} for `cart`, loading it from the database on a miss"""
+        raw = self.redis.hgetall(self.key(cart))
+        if LOADED not in raw:
+            raw = self.load(cart)
+        return self.decode(raw)
+
+    def decode(self, raw):
+        return {
+            uuid.UUID(field.decode()): json.loads(value)
+            for field, value in raw.items()
+            if field != LOADED
+        }
+
+    def load(self, cart):
+        mapping = {LOADED: "1"}
+        for item in CartItem.objects.filter(cart=cart).order_by("created_at"):
+            field = item.product_id.hex
+            if field in mapping:
+                # Parallel rows for one product fold into the oldest
+                entry = json.loads(mapping[field])
+                entry["quantity"] += item.quantity
+            else:
+                entry = {
+                    "id": item.pk.hex,
+                    "quantity": item.quantity,
+                    "created_at": item.created_at.isoformat(),
+                    "updated_at": item.updated_at.isoformat(),
+                }
+            mapping[field] = json.dumps(entry)
+
+        key = self.key(cart)
+
+        def fill(pipe):
+            # Another request may have loaded (and changed) it meanwhile
+            if pipe.exists(key):
+                return pipe.hgetall(key)
+            pipe.multi()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            return {
+                field if isinstance(field, bytes) else field.encode(): value
+                for field, value in mapping.items()
+            }
+
+        return self.redis.transaction(fill, key, value_from_callable=True)
+
+    def apply(self, cart, operations):
+        """Apply add/set/remove operations atomically; returns the new entries"""
+        self.entries(cart)
+        key = self.key(cart)
+        timestamp = now().isoformat()
+
+        def change(pipe):
+            entries = self.decode(pipe.hgetall(key))
+            quantities = fold_operations(
+                {
+                    product_id: entry["quantity"]
+                    for product_id, entry in entries.items()
+                },
+                operations,
+            )
+            updates, removed = {}, []
+            for product_id, quantity in quantities.items():
+                entry = entries.get(product_id)
+                if not quantity:
+                    if entry is not None:
+                        removed.append(product_id.hex)
+                        del entries[product_id]
+                    continue
+                if entry is None:
+                    entry = entries[product_id] = {
+                        "id": uuid.uuid4().hex,
+                        "created_at": timestamp,
+                    }
+                elif entry["quantity"] == quantity:
+                    continue
+                entry.update(quantity=quantity, updated_at=timestamp)
+                updates[product_id.hex] = json.dumps(entry)
+
+            pipe.multi()
+            if removed:
+                pipe.hdel(key, *removed)
+            if updates:
+                pipe.hset(key, mapping=updates)
+            pipe.hset(key, LOADED, "1")
+            pipe.expire(key, self.ttl)
+            pipe.sadd(DIRTY_KEY, cart.pk.hex)
+            return entries
+
+        return self.redis.transaction(change, key, value_from_callable=True)
+
+    def materialize(self, cart, products):
+        """
+        Attach unsaved CartItem objects and totals to `cart` so the usual cart
+        serializers render it. `products` is the queryset products are read
+        from; items whose product is gone are dropped from the store.
+        """
+        entries = self.entries(cart)
+        found = products.in_bulk(list(entries))
+        gone = [product_id for product_id in entries if product_id not in found]
+        if gone:
+            self.apply(cart, [{"op": "remove", "product_id": pk} for pk in gone])
+
+        items = sorted(
+            (
+                CartItem(
+                    id=uuid.UUID(entry["id"]),
+                    cart=cart,
+                    product=found[product_id],
+                    quantity=entry["quantity"],
+                    created_at=parse_datetime(entry["created_at"]),
+                    updated_at=parse_datetime(entry["updated_at"]),
+                )
+                for product_id, entry in entries.items()
+                if product_id in found
+            ),
+            key=lambda item: item.created_at,
+        )
+        cart._prefetched_objects_cache = {"cart_items": items}
+        cart.total_items = sum(item.quantity for item in items)
+        cart.total_price = sum(
+            (item.quantity * item.product.price for item in items), Decimal("0.00")
+        )
+        return cart
+
+    def flush(self, cart):
+        """
+        Write the Redis copy of `cart` through to its CartItem rows. Returns
+        the hash that was written (None when there was nothing to write), read
+        under the cart's row lock so checkout orders exactly that snapshot.
+        """
+        key = self.key(cart)
+        try:
+            with transaction.atomic():
+                Cart.objects.select_for_update().get(pk=cart.pk)
+                # Cleared before reading, so a change made meanwhile marks it again
+                self.redis.srem(DIRTY_KEY, cart.pk.hex)
+                raw = self.redis.hgetall(key)
+                if LOADED not in raw:
+                    # Never loaded or expired: the database copy is already current
+                    return None
+                self.write_through(cart, self.decode(raw))
+        except Exception:
+            self.mark_dirty(cart)
+            raise
+        return raw
+
+    def mark_dirty(self, cart):
+        """Flush `cart` again later, e.g. when the flush was rolled back"""
+        self.redis.sadd(DIRTY_KEY, cart.pk.hex)
+
+    def write_through(self, cart, entries):
+        live = set(
+            Product.objects.filter(pk__in=list(entries)).values_list("id", flat=True)
+        )
+        wanted = {
+            uuid.UUID(entry["id"]): (product_id, entry)
+            for product_id, entry in entries.items()
+            if product_id in live
+        }
+        rows = CartItem.objects.filter(cart=cart).in_bulk()
+
+        to_update = []
+        for pk, (product_id, entry) in wanted.items():
+            row = rows.get(pk)
+            if row is None:
+                continue
+            if row.product_id != product_id or row.quantity != entry["quantity"]:
+                row.product_id = product_id
+                row.quantity = entry["quantity"]
+                row.updated_at = parse_datetime(entry["updated_at"])
+                to_update.append(row)
+
+        stale = [pk for pk in rows if pk not in wanted]
+        if stale:
+            CartItem.objects.filter(pk__in=stale).delete()
+        if to_update:
+            CartItem.objects.bulk_update(
+                to_update, ["product", "quantity", "updated_at"]
+            )
+        to_create = [
+            CartItem(
+                id=pk,
+                cart=cart,
+                product_id=product_id,
+                quantity=entry["quantity"],
+                created_at=parse_datetime(entry["created_at"]),
+                updated_at=parse_datetime(entry["updated_at"]),
+            )
+            for pk, (product_id, entry) in wanted.items()
+            if pk not in rows
+        ]
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
+
+    def flush_dirty(self):
+        """Flush every cart changed since its last flush; returns how many"""
+        cart_ids = [
+            uuid.UUID(value.decode()) for value in self.redis.smembers(DIRTY_KEY)
+        ]
+        carts = Cart.objects.in_bulk(cart_ids)
+        flushed = 0
+        for cart_id in cart_ids:
+            cart = carts.get(cart_id)
+            if cart is None:
+                self.redis.srem(DIRTY_KEY, cart_id.hex)
+                continue
+            try:
+                self.flush(cart)
+                flushed += 1
+            except Exception as e:
+                logger.error(f"Failed to flush cart {cart_id}: {str(e)}")
+        return flushed
+
+    def clear(self, cart, flushed):
+        """
+        Forget the entries of `flushed` (what `flush` returned) once checkout
+        ordered them. Entries added or changed since stay, and keep the cart
+        dirty so they are written back to the emptied rows.
+        """
+        key = self.key(cart)
+        flushed = flushed or {}
+
+        def drop(pipe):
+            current = pipe.hgetall(key)
+            ordered = [
+                field
+                for field, value in flushed.items()
+                if field != LOADED and current.get(field) == value
+            ]
+            left = set(current) - {LOADED} - set(ordered)
+            pipe.multi()
+            if left:
+                if ordered:
+                    pipe.hdel(key, *ordered)
+            else:
+                pipe.delete(key)
+                pipe.srem(DIRTY_KEY, cart.pk.hex)
+
+        self.redis.transaction(drop, key)
+
+    def claim(self, owner, key, request_hash):
+        """
+        Reserve an idempotency key for a batch. Returns None when it is new,
+        else what was stored for it: {"hash", "response"} where response is
+        None while the first request is still running.
+        """
+        redis_key = self.idempotency_key(owner, key)
+        record = json.dumps({"hash": request_hash, "response": None})
+        if self.redis.set(redis_key, record, nx=True, ex=24 * 3600):
+            return None
+        stored = self.redis.get(redis_key)
+        return json.loads(stored) if stored else None
+
+    def remember(self, owner, key, request_hash, response):
+        record = json.dumps({"hash": request_hash, "response": response})
+        self.redis.set(self.idempotency_key(owner, key), record, ex=24 * 3600)
+
+    def release(self, owner, key):
+        self.redis.delete(self.idempotency_key(owner, key))
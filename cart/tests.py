@@ -1,3 +1,587 @@
-from django.test import TestCase
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+import fakeredis
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cart.checkout import checkout_cart, split_discount
+from cart.models import Cart, CartItem, CartMutation
+from cart.views import CartItemViewSet, CartViewSet
+from ecommerce.tasks import flush_redis_carts, reconcile_cart_totals
+from coupons.models import Coupon, CouponUser
+from ecommerce.models import OutboxMessage
+from orders.models import Order, OrderItem
+from product.models import Brand, Category, Product
+from users.models import User
+
+
+class CartCheckoutTests(TestCase):
+    SELLERS = 10
+    LINES_PER_SELLER = 5
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = CartViewSet.as_view({"post": "checkout"})
+        # bulk_create skips the welcome email signal
+        self.buyer = User(fullname="buyer", email="buyer@example.com")
+        self.sellers = [
+            User(fullname=f"seller {i}", email=f"seller{i}@example.com")
+            for i in range(self.SELLERS)
+        ]
+        User.objects.bulk_create([self.buyer, *self.sellers])
+        self.products = [
+            Product(
+                name=f"product {i}-{j}",
+                desp="",
+                price=Decimal("10.00"),
+                stock=Decimal("3.00"),
+                owner=seller,
+            )
+            for i, seller in enumerate(self.sellers)
+            for j in range(self.LINES_PER_SELLER)
+        ]
+        Product.objects.bulk_create(self.products)
+        self.cart = Cart.objects.create(owner=self.buyer)
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=self.cart, product=product, quantity=2)
+                for product in self.products
+            ]
+        )
+
+    def checkout(self, data=None):
+        request = self.factory.post("/api/cart/checkout/", data or {}, format="json")
+        force_authenticate(request, user=self.buyer)
+        return self.view(request)
+
+    def test_checkout_creates_one_order_per_seller(self):
+        start = time.perf_counter()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["data"]), self.SELLERS)
+        self.assertEqual(Order.objects.count(), self.SELLERS)
+        self.assertEqual(OrderItem.objects.count(), len(self.products))
+        order = Order.objects.first()
+        self.assertEqual(order.base_amount, Decimal("100.00"))
+        self.assertEqual(order.order_items.count(), self.LINES_PER_SELLER)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual(
+            set(Product.objects.values_list("stock", flat=True)), {Decimal("1.00")}
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_items, 0)
+        self.assertEqual(self.cart.total_price, 0)
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                task="ecommerce.tasks.send_order_notification_email"
+            ).count(),
+            self.SELLERS,
+        )
+        self.assertLess(elapsed, 0.1)
+
+    def test_checkout_query_count(self):
+        # One conditional stock UPDATE per product plus a fixed overhead,
+        # which includes the cart lock and one outbox INSERT for every
+        # seller notification
+        with self.assertNumQueries(len(self.products) + 11):
+            self.checkout()
+
+    def test_short_stock_rolls_back_everything(self):
+        Product.objects.filter(pk=self.products[-1].pk).update(stock=1)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.products[-1].pk), response.data["cart"])
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 50)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 3)
+
+    def test_coupon_discount_is_split_across_orders(self):
+        Coupon.objects.create(
+            code="SAVE",
+            type="flat",
+            value=Decimal("100.00"),
+            valid_from=timezone.now() - timedelta(days=1),
+            valid_to=timezone.now() + timedelta(days=1),
+        )
+
+        response = self.checkout({"coupon_code": "SAVE"})
+
+        self.assertEqual(response.status_code, 201)
+        discounts = Order.objects.values_list("discount", flat=True)
+        self.assertEqual(sum(discounts), Decimal("100.00"))
+        self.assertEqual(set(discounts), {Decimal("10.00")})
+        self.assertEqual(CouponUser.objects.filter(user=self.buyer).count(), 1)
+        self.assertEqual(Coupon.objects.get(code="SAVE").used_count, 1)
+
+    def test_items_added_during_checkout_stay_in_the_cart(self):
+        extra = Product.objects.create(
+            name="late", desp="", price=Decimal("5.00"), stock=5, owner=self.buyer
+        )
+        reserve_stock = Product.objects.reserve_stock
+
+        def add_item_then_reserve(quantities):
+            CartItem.objects.create(cart=self.cart, product=extra, quantity=1)
+            return reserve_stock(quantities)
+
+        with patch.object(
+            Product.objects, "reserve_stock", side_effect=add_item_then_reserve
+        ):
+            response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(OrderItem.objects.filter(product=extra).exists())
+        self.assertEqual(
+            list(
+                CartItem.objects.filter(cart=self.cart).values_list(
+                    "product", flat=True
+                )
+            ),
+            [extra.pk],
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual(
+            (self.cart.total_items, self.cart.total_price), (1, Decimal("5.00"))
+        )
+
+    def test_discount_split_over_free_orders(self):
+        self.assertEqual(
+            split_discount(Decimal("5.00"), [Decimal("0"), Decimal("0")]),
+            [Decimal("0.00"), Decimal("5.00")],
+        )
+
+    def test_empty_cart_is_rejected(self):
+        CartItem.objects.all().delete()
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        # bulk_create skips the welcome email signal
+        self.buyer = User(fullname="buyer", email="buyer@example.com")
+        seller = User(fullname="seller", email="seller@example.com")
+        User.objects.bulk_create([self.buyer, seller])
+        brand = Brand(name="Acme")
+        Brand.objects.bulk_create([brand])
+        category = Category(name="Shoes", slug="shoes")
+        Category.objects.bulk_create([category])
+        self.products = [
+            Product(
+                name=f"product {i}",
+                desp="",
+                price=Decimal("2.50") * (i + 1),
+                stock=Decimal("10.00"),
+                brand=brand,
+                category=category,
+                owner=seller,
+            )
+            for i in range(3)
+        ]
+        Product.objects.bulk_create(self.products)
+        self.cart = Cart.objects.create(owner=self.buyer)
+
+    def assertTotals(self, items, price):
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_items, items)
+        self.assertEqual(self.cart.total_price, Decimal(price))
+        # The incrementally kept totals agree with a full recompute
+        Cart.objects.filter(pk=self.cart.pk).refresh_totals()
+        self.cart.refresh_from_db()
+        self.assertEqual(
+            (self.cart.total_items, self.cart.total_price), (items, Decimal(price))
+        )
+
+    def test_item_add_update_delete_keep_totals(self):
+        first = CartItem.objects.create(
+            cart=self.cart, product=self.products[0], quantity=2
+        )
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=1)
+        self.assertTotals(3, "10.00")
+
+        item = CartItem.objects.get(pk=first.pk)
+        item.quantity = 4
+        item.save()
+        self.assertTotals(5, "15.00")
+
+        item.product = self.products[2]
+        item.save()
+        self.assertTotals(5, "35.00")
+
+        item.delete()
+        self.assertTotals(1, "5.00")
+
+    def test_edits_through_stale_instances_keep_totals(self):
+        created = CartItem.objects.create(
+            cart=self.cart, product=self.products[0], quantity=1
+        )
+        first = CartItem.objects.get(pk=created.pk)
+        second = CartItem.objects.get(pk=created.pk)
+
+        first.quantity = 3
+        first.save()
+        second.quantity = 5
+        second.save()
+        self.assertTotals(5, "12.50")
+
+        first.delete()
+        self.assertTotals(0, "0.00")
+        second.delete()
+        self.assertTotals(0, "0.00")
+
+    def test_reconciliation_repairs_drifted_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        Cart.objects.filter(pk=self.cart.pk).update(total_items=7, total_price=1)
+
+        self.assertEqual(reconcile_cart_totals(), "Reconciled totals of 1 carts")
+        self.assertTotals(2, "5.00")
+
+    def test_product_price_change_and_delete_update_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.price = Decimal("4.00")
+        product.save()
+        self.assertTotals(5, "23.00")
+
+        # The previous price and stock come from the load, not a SELECT
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        selects = [
+            q for q in queries if q["sql"].startswith('SELECT "product_product"')
+        ]
+        self.assertEqual(selects, [])
+        self.assertTotals(5, "23.00")
+
+        Product.objects.get(pk=self.products[1].pk).delete()
+        self.assertTotals(2, "8.00")
+
+    def test_price_change_on_unloaded_instances_updates_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+
+        Product(pk=self.products[0].pk, price=Decimal("4.00")).save(
+            force_update=True, update_fields=["price"]
+        )
+        self.assertTotals(5, "23.00")
+
+        product = Product.objects.defer("price").get(pk=self.products[1].pk)
+        product.price = Decimal("6.00")
+        product.save()
+        self.assertTotals(5, "26.00")
+
+    def test_cart_fetch_query_count_does_not_grow_with_items(self):
+        view = CartViewSet.as_view({"get": "list"})
+        for product in self.products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+
+        request = self.factory.get("/api/cart/")
+        force_authenticate(request, user=self.buyer)
+        # cart, items with products, brand and category counts, owner m2ms
+        with self.assertNumQueries(6):
+            response = view(request)
+
+        self.assertEqual(len(response.data["data"]["cart_items"]), 3)
+        self.assertEqual(response.data["data"]["total_items"], 3)
+        self.assertEqual(response.data["data"]["total_price"], Decimal("15.00"))
+
+    def test_summary_is_a_single_query(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        view = CartViewSet.as_view({"get": "summary"})
+        request = self.factory.get("/api/cart/summary/")
+        force_authenticate(request, user=self.buyer)
+
+        with self.assertNumQueries(1):
+            response = view(request)
+
+        self.assertEqual(response.data["data"]["total_items"], 2)
+        self.assertEqual(response.data["data"]["total_price"], "5.00")
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.view = CartViewSet.as_view({"post": "batch"})
+        # bulk_create skips the welcome email signal
+        self.buyer = User(fullname="buyer", email="buyer@example.com")
+        seller = User(fullname="seller", email="seller@example.com")
+        User.objects.bulk_create([self.buyer, seller])
+        self.products = [
+            Product(
+                name=f"product {i}",
+                desp="",
+                price=Decimal("1.50"),
+                stock=Decimal("10.00"),
+                owner=seller,
+            )
+            for i in range(20)
+        ]
+        Product.objects.bulk_create(self.products)
+        self.cart = Cart.objects.create(owner=self.buyer)
+
+    def batch(self, operations, key="key-1"):
+        request = self.factory.post(
+            "/api/cart/batch/",
+            {"operations": operations},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+        force_authenticate(request, user=self.buyer)
+        return self.view(request)
+
+    def add_all(self):
+        return [
+            {"op": "add", "product_id": str(product.pk), "quantity": 1}
+            for product in self.products
+        ]
+
+    def test_batch_applies_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.batch(self.add_all()[:2], key="small")
+        CartItem.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            response = self.batch(self.add_all(), key="large")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 20)
+        self.assertEqual(response.data["data"]["total_items"], 20)
+
+    def test_operations_merge_into_existing_rows(self):
+        product, other = self.products[0], self.products[1]
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=self.cart, product=product, quantity=1),
+                CartItem(cart=self.cart, product=product, quantity=2),
+                CartItem(cart=self.cart, product=other, quantity=5),
+            ]
+        )
+
+        response = self.batch(
+            [
+                {"op": "add", "product_id": str(product.pk), "quantity": 1},
+                {"op": "add", "product_id": str(product.pk), "quantity": 1},
+                {"op": "remove", "product_id": str(other.pk)},
+                {"op": "set", "product_id": str(self.products[2].pk), "quantity": 3},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(
+                CartItem.objects.filter(cart=self.cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {product.pk: 5, self.products[2].pk: 3},
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_items, 8)
+        self.assertEqual(self.cart.total_price, Decimal("12.00"))
+
+    def test_retry_with_same_key_replays_response(self):
+        operations = self.add_all()[:3]
+        first = self.batch(operations)
+        retry = self.batch(operations)
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(sum(CartItem.objects.values_list("quantity", flat=True)), 3)
+
+        conflict = self.batch(self.add_all()[:1])
+        self.assertEqual(conflict.status_code, 409)
+
+    def test_unknown_product_rejects_whole_batch(self):
+        operations = self.add_all()[:2] + [
+            {"op": "add", "product_id": str(uuid.uuid4()), "quantity": 1}
+        ]
+
+        response = self.batch(operations)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+        # A failed batch does not use up its key
+        self.assertEqual(self.batch(self.add_all()[:2]).status_code, 200)
+
+
+def write_queries(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+    ]
+
+
+@override_settings(CART_BACKEND="redis")
+class RedisCartStoreTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("cart.store.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.factory = APIRequestFactory()
+        # bulk_create skips the welcome email signal
+        self.buyer = User(fullname="buyer", email="buyer@example.com")
+        self.seller = User(fullname="seller", email="seller@example.com")
+        User.objects.bulk_create([self.buyer, self.seller])
+        self.products = [
+            Product(
+                name=f"product {i}",
+                desp="",
+                price=Decimal("4.00"),
+                stock=Decimal("10.00"),
+                owner=self.seller,
+            )
+            for i in range(3)
+        ]
+        Product.objects.bulk_create(self.products)
+        self.cart = Cart.objects.create(owner=self.buyer)
+
+    def call(self, viewset, actions, method, data=None, **kwargs):
+        request = getattr(self.factory, method)("/api/", data, format="json")
+        force_authenticate(request, user=self.buyer)
+        return viewset.as_view(actions)(request, **kwargs)
+
+    def add(self, product, quantity):
+        return self.call(
+            CartItemViewSet,
+            {"post": "create"},
+            "post",
+            {"product_id": str(product.pk), "quantity": quantity},
+        )
+
+    def test_item_changes_stay_in_redis_until_flushed(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(10):
+                self.add(self.products[0], 1)
+            item_id = self.add(self.products[1], 2).data["id"]
+            self.call(
+                CartItemViewSet,
+                {"patch": "partial_update"},
+                "patch",
+                {"quantity": 5},
+                pk=item_id,
+            )
+            self.call(CartItemViewSet, {"delete": "destroy"}, "delete", pk=item_id)
+            response = self.call(CartViewSet, {"get": "list"}, "get")
+
+        self.assertEqual(write_queries(queries), [])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(response.data["data"]["total_items"], 10)
+        self.assertEqual(response.data["data"]["total_price"], Decimal("40.00"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_redis_carts(), "Flushed 1 carts to the database")
+
+        # One insert plus the totals refresh, for twelve cart changes
+        self.assertEqual(len(write_queries(queries)), 2)
+        item = CartItem.objects.get()
+        self.assertEqual((item.product_id, item.quantity), (self.products[0].pk, 10))
+        self.assertEqual(str(item.pk), response.data["data"]["cart_items"][0]["id"])
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_price, Decimal("40.00"))
+        self.assertEqual(flush_redis_carts(), "Flushed 0 carts to the database")
+
+    def test_existing_rows_load_with_their_ids(self):
+        existing = CartItem.objects.create(
+            cart=self.cart, product=self.products[0], quantity=1
+        )
+
+        response = self.call(
+            CartItemViewSet,
+            {"patch": "partial_update"},
+            "patch",
+            {"quantity": 3},
+            pk=str(existing.pk),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        flush_redis_carts()
+
+        self.assertEqual(
+            list(CartItem.objects.values_list("id", "quantity")), [(existing.pk, 3)]
+        )
+
+    def test_batch_replays_from_redis(self):
+        operations = [
+            {"op": "add", "product_id": str(product.pk), "quantity": 1}
+            for product in self.products
+        ]
+        view = CartViewSet.as_view({"post": "batch"})
+
+        def batch():
+            request = self.factory.post(
+                "/api/cart/batch/",
+                {"operations": operations},
+                format="json",
+                HTTP_IDEMPOTENCY_KEY="key-1",
+            )
+            force_authenticate(request, user=self.buyer)
+            return view(request)
+
+        first = batch()
+        retry = batch()
+
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(first.data["data"]["total_items"], 3)
+        self.assertFalse(CartMutation.objects.exists())
+
+    def test_checkout_flushes_and_clears_the_store(self):
+        self.add(self.products[0], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call(CartViewSet, {"post": "checkout"}, "post", {})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+        self.assertEqual(self.redis.keys("cart:*"), [])
+        cart = self.call(CartViewSet, {"get": "list"}, "get")
+        self.assertEqual(cart.data["data"]["total_items"], 0)
+
+    def test_items_added_after_the_flush_survive_checkout(self):
+        self.add(self.products[0], 2)
+
+        def add_then_checkout(*args, **kwargs):
+            self.add(self.products[1], 1)
+            return checkout_cart(*args, **kwargs)
+
+        with patch("cart.views.checkout_cart", side_effect=add_then_checkout):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.call(CartViewSet, {"post": "checkout"}, "post", {})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.get().product_id, self.products[0].pk)
+        self.assertEqual(flush_redis_carts(), "Flushed 1 carts to the database")
+        item = CartItem.objects.get()
+        self.assertEqual((item.product_id, item.quantity), (self.products[1].pk, 1))
+
+    def test_failed_checkout_keeps_the_cart_dirty(self):
+        self.add(self.products[0], 20)
+
+        response = self.call(CartViewSet, {"post": "checkout"}, "post", {})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(flush_redis_carts(), "Flushed 1 carts to the database")
+        self.assertEqual(CartItem.objects.get().quantity, 20)
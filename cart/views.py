@@ -1,37 +1,232 @@
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from cart.models import Cart, CartItem
-from cart.serializer import CartSerializer, CartItemSerializer
+from cart.batch import apply_cart_operations, check_products, fingerprint
+from cart.checkout import checkout_cart
+from cart.models import Cart, CartItem, CartMutation
+from cart.serializer import (
+    CartBatchSerializer,
+    CartSerializer,
+    CartItemSerializer,
+    CartSummarySerializer,
+    CheckoutSerializer,
+)
+from cart.store import get_cart_store
+from orders.serializers import OrderSummarySerializer
+from product.models import Brand, Category, Product
+from product.views import ProductViewSet
 
 
 class CartViewSet(viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
+    # Everything the nested product serializer reads, in a fixed number of
+    # queries however many items the cart holds
+    cart_items_queryset = (
+        CartItem.objects.select_related(
+            "product__size__brand", "product__size__category", "product__owner"
+        )
+        .prefetch_related(
+            Prefetch("product__brand", queryset=Brand.objects.with_counts()),
+            Prefetch("product__category", queryset=Category.objects.with_counts()),
+            "product__owner__groups",
+            "product__owner__user_permissions",
+        )
+        .order_by("created_at")
+    )
+
     def get_queryset(self):
         return Cart.objects.filter(owner=self.request.user).prefetch_related(
-            "cart_items__product"
+            Prefetch("cart_items", queryset=self.cart_items_queryset.all())
         )
 
+    def get_cart(self, queryset):
+        cart = queryset.first()
+        if cart is None:
+            cart, _ = Cart.objects.get_or_create(owner=self.request.user)
+        return cart
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            cart = Cart.objects.create(owner=request.user)
-        return self.retrieve(request, pk=queryset.first().pk)
+        return self.retrieve(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
-        cart = self.get_queryset().first()
-        if not cart:
-            cart = Cart.objects.create(owner=request.user)
+        store = get_cart_store()
+        if store is None:
+            cart = self.get_cart(self.get_queryset())
+        else:
+            cart = store.materialize(
+                self.get_cart(Cart.objects.filter(owner=request.user)),
+                ProductViewSet.read_queryset.all(),
+            )
         serializer = self.get_serializer(cart)
         return Response({"success": True, "data": serializer.data})
 
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """Stored cart totals without the items, read in a single query"""
+        cart = self.get_cart(Cart.objects.filter(owner=request.user))
+        store = get_cart_store()
+        if store is not None:
+            cart = store.materialize(cart, Product.objects.only("id", "price"))
+        return Response({"success": True, "data": CartSummarySerializer(cart).data})
+
+    def render_cart(self, cart):
+        # Stored as rendered, so a replay is byte-for-byte the same body
+        return json.loads(
+            JSONRenderer().render(
+                {
+                    "success": True,
+                    "message": "Cart updated successfully",
+                    "data": self.get_serializer(cart).data,
+                }
+            )
+        )
+
+    def batch_conflict(self, message):
+        return Response(
+            {"success": False, "message": message}, status=status.HTTP_409_CONFLICT
+        )
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Apply a list of add/set/remove operations to the cart at once. The
+        Idempotency-Key header (or `idempotency_key`) makes retries safe: a
+        repeated key replays the first response instead of applying again.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = request.headers.get("Idempotency-Key") or serializer.validated_data.get(
+            "idempotency_key"
+        )
+        if not key:
+            return Response(
+                {
+                    "success": False,
+                    "message": "An Idempotency-Key header or idempotency_key is required",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        operations = serializer.validated_data["operations"]
+        request_hash = fingerprint(operations)
+
+        store = get_cart_store()
+        if store is not None:
+            return self.batch_in_store(store, key, operations, request_hash)
+
+        with transaction.atomic():
+            mutation, created = CartMutation.objects.get_or_create(
+                owner=request.user, key=key, defaults={"request_hash": request_hash}
+            )
+            if not created:
+                if mutation.request_hash != request_hash:
+                    return self.batch_conflict(
+                        "Idempotency key was already used for a different request"
+                    )
+                return Response(
+                    mutation.response, headers={"Idempotent-Replayed": "true"}
+                )
+
+            # Locking the cart keeps concurrent batches from creating
+            # parallel rows for the same product
+            cart = self.get_cart(
+                Cart.objects.select_for_update().filter(owner=request.user)
+            )
+            apply_cart_operations(cart, operations)
+            mutation.response = self.render_cart(self.get_cart(self.get_queryset()))
+            mutation.save(update_fields=["response", "updated_at"])
+        return Response(mutation.response)
+
+    def batch_in_store(self, store, key, operations, request_hash):
+        """`batch` against the Redis cart store, which also holds the key"""
+        user = self.request.user
+        stored = store.claim(user, key, request_hash)
+        if stored is not None:
+            if stored["hash"] != request_hash:
+                return self.batch_conflict(
+                    "Idempotency key was already used for a different request"
+                )
+            if stored["response"] is None:
+                return self.batch_conflict(
+                    "A request with this idempotency key is still in progress"
+                )
+            return Response(stored["response"], headers={"Idempotent-Replayed": "true"})
+
+        try:
+            check_products(operations)
+            cart = self.get_cart(Cart.objects.filter(owner=user))
+            store.apply(cart, operations)
+            response = self.render_cart(
+                store.materialize(cart, ProductViewSet.read_queryset.all())
+            )
+        except Exception:
+            store.release(user, key)
+            raise
+        store.remember(user, key, request_hash, response)
+        return Response(response)
+
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        """Place one order per seller for everything in the user's cart"""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        cart = Cart.objects.filter(owner=request.user).first()
+        if cart is None:
+            return Response(
+                {"success": False, "message": "Cart is empty"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        store = get_cart_store()
+        coupon_code = serializer.validated_data.get("coupon_code")
+        if store is None:
+            orders = checkout_cart(cart, request.user, coupon_code)
+        else:
+            orders = self.checkout_stored_cart(store, cart, request.user, coupon_code)
+        return Response(
+            {
+                "success": True,
+                "message": f"{len(orders)} orders placed successfully",
+                "data": OrderSummarySerializer(orders, many=True).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    def checkout_stored_cart(self, store, cart, user, coupon_code):
+        """
+        Flush the Redis cart under the lock checkout takes, so the lines it
+        orders are exactly the snapshot cleared from Redis after the commit.
+        """
+        try:
+            with transaction.atomic():
+                flushed = store.flush(cart)
+                orders = checkout_cart(cart, user, coupon_code)
+                transaction.on_commit(lambda: store.clear(cart, flushed))
+        except Exception:
+            # The flush was rolled back with the checkout
+            store.mark_dirty(cart)
+            raise
+        return orders
+
 
 class CartItemViewSet(viewsets.ModelViewSet):
+    """
+    With the Redis cart store enabled, items are read from and written to
+    Redis; adding a product that is already in the cart raises its quantity.
+    """
+
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
 
@@ -45,21 +240,95 @@ class CartItemViewSet(viewsets.ModelViewSet):
         cart, created = Cart.objects.get_or_create(owner=user)
         serializer.save(cart=cart)
 
+    def get_stored_items(self, store):
+        cart, _ = Cart.objects.get_or_create(owner=self.request.user)
+        cart = store.materialize(cart, ProductViewSet.read_queryset.all())
+        return cart, cart.cart_items.all()
+
+    def get_stored_item(self, store):
+        cart, items = self.get_stored_items(store)
+        for item in items:
+            if str(item.pk) == str(self.kwargs["pk"]):
+                return cart, item
+        raise Http404
+
+    def list(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().list(request, *args, **kwargs)
+        _, items = self.get_stored_items(store)
+        return Response(self.get_serializer(items, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+        _, item = self.get_stored_item(store)
+        return Response(self.get_serializer(item).data)
+
+    def create(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data["product_id"]
+        cart, _ = Cart.objects.get_or_create(owner=request.user)
+        store.apply(
+            cart,
+            [
+                {
+                    "op": "add",
+                    "product_id": product_id,
+                    "quantity": serializer.validated_data["quantity"],
+                }
+            ],
+        )
+        _, items = self.get_stored_items(store)
+        item = next(item for item in items if item.product_id == product_id)
+        return Response(self.get_serializer(item).data, status=status.HTTP_201_CREATED)
+
     def destroy(self, request, *args, **kwargs):
-        item = self.get_object()
-        self.perform_destroy(item)
+        store = get_cart_store()
+        if store is None:
+            item = self.get_object()
+            self.perform_destroy(item)
+        else:
+            cart, item = self.get_stored_item(store)
+            store.apply(cart, [{"op": "remove", "product_id": item.product_id}])
         return Response(
             {"success": True, "message": "Item removed from cart"},
             status=status.HTTP_200_OK,
         )
 
     def update(self, request, *args, **kwargs):
-        response = super().update(request, *args, **kwargs)
+        store = get_cart_store()
+        if store is None:
+            response = super().update(request, *args, **kwargs)
+            data, status_code = response.data, response.status_code
+        else:
+            cart, item = self.get_stored_item(store)
+            serializer = self.get_serializer(
+                item, data=request.data, partial=kwargs.get("partial", False)
+            )
+            serializer.is_valid(raise_exception=True)
+            item.quantity = serializer.validated_data.get("quantity", item.quantity)
+            store.apply(
+                cart,
+                [
+                    {
+                        "op": "set",
+                        "product_id": item.product_id,
+                        "quantity": item.quantity,
+                    }
+                ],
+            )
+            data, status_code = self.get_serializer(item).data, status.HTTP_200_OK
         return Response(
             {
                 "success": True,
                 "message": "Cart item updated successfully",
-                "data": response.data,
+                "data": data,
             },
-            status=response.status_code,
+            status=status_code,
         )
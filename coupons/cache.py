@@ -0,0 +1,122 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils.timezone import now
+
+from coupons.models import Coupon, CouponUser
+from coupons.serializers import CouponSerializer
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "coupons"
+VERSION_KEY = f"{CACHE_PREFIX}:active:v"
+
+
+def get_timeout():
+    return getattr(settings, "COUPON_CACHE_TIMEOUT", 300)
+
+
+def _catalog_key(version):
+    return f"{CACHE_PREFIX}:active:{version}"
+
+
+def _used_key(user_id):
+    return f"{CACHE_PREFIX}:used:{uuid.UUID(str(user_id)).hex}"
+
+
+def _get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def build_catalog(current_time):
+    """
+    Serialized coupons valid at `current_time`, and when that set next
+    changes on its own: the earliest upcoming `valid_from` or `valid_to`.
+    """
+    coupons = Coupon.objects.filter(
+        is_active=True, valid_from__lte=current_time, valid_to__gte=current_time
+    )
+    boundaries = Coupon.objects.filter(is_active=True).aggregate(
+        next_start=Min("valid_from", filter=Q(valid_from__gt=current_time)),
+        next_end=Min(
+            "valid_to",
+            filter=Q(valid_from__lte=current_time, valid_to__gt=current_time),
+        ),
+    )
+    upcoming = [value for value in boundaries.values() if value is not None]
+    return {
+        "coupons": list(CouponSerializer(coupons, many=True).data),
+        "refresh_at": min(upcoming, default=None),
+    }
+
+
+def get_active_coupons():
+    """
+    Currently valid coupons, served from the cache. Coupon changes evict the
+    catalog (see `invalidate_catalog`), and a cached catalog is rebuilt once
+    a coupon in it expires or another one starts, so no scheduler is needed
+    for the boundaries. Counters bumped by redemption are not evicted for, so
+    `used_count` may lag by up to COUPON_CACHE_TIMEOUT.
+    """
+    current_time = now()
+    try:
+        key = _catalog_key(_get_version())
+        catalog = cache.get(key)
+    except Exception as e:
+        logger.error(f"Coupon cache unavailable: {str(e)}")
+        return build_catalog(current_time)["coupons"]
+
+    if catalog is None or (
+        catalog["refresh_at"] is not None and catalog["refresh_at"] <= current_time
+    ):
+        catalog = build_catalog(current_time)
+        try:
+            cache.set(key, catalog, get_timeout())
+        except Exception as e:
+            logger.error(f"Failed to cache active coupons: {str(e)}")
+    return catalog["coupons"]
+
+
+def get_used_coupon_ids(user):
+    """Ids (as strings) of the coupons `user` has used, cached per user"""
+    key = _used_key(user.pk)
+    try:
+        used = cache.get(key)
+    except Exception as e:
+        logger.error(f"Coupon cache unavailable: {str(e)}")
+        used = None
+    if used is None:
+        used = frozenset(
+            str(pk)
+            for pk in CouponUser.objects.filter(user=user).values_list(
+                "coupon_id", flat=True
+            )
+        )
+        try:
+            cache.set(key, used, get_timeout())
+        except Exception as e:
+            logger.error(f"Failed to cache used coupons: {str(e)}")
+    return used
+
+
+def invalidate_catalog():
+    """Evict the cached active coupons after a coupon changed"""
+    try:
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.error(f"Failed to invalidate active coupons: {str(e)}")
+
+
+def invalidate_used(user_id):
+    """Evict the cached used coupons of `user_id` after they used one"""
+    try:
+        cache.delete(_used_key(user_id))
+    except Exception as e:
+        logger.error(f"Failed to invalidate used coupons: {str(e)}")
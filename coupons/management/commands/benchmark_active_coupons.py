@@ -0,0 +1,124 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from coupons.models import Coupon, CouponUser
+from coupons.views import CouponViewSet
+from users.models import User
+
+
+class LegacyCouponViewSet(CouponViewSet):
+    """The active coupon list before it was cached"""
+
+    def active(self, request):
+        current_time = now()
+        valid_coupons = Coupon.objects.filter(
+            is_active=True,
+            valid_from__lte=current_time,
+            valid_to__gte=current_time,
+        ).exclude(users__user=request.user)
+
+        serializer = self.get_serializer(valid_coupons, many=True)
+        return Response({"success": True, "data": serializer.data})
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare active coupon list latency before and after caching it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coupons", type=int, default=10000)
+        parser.add_argument("--redemptions", type=int, default=5000000)
+        parser.add_argument("--users", type=int, default=50000)
+        parser.add_argument("--runs", type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Seeded inside a transaction that is rolled back at the end, so the
+        # benchmark never leaves fixture rows behind.
+        try:
+            with transaction.atomic():
+                user = self.seed(
+                    options["coupons"], options["redemptions"], options["users"]
+                )
+                self.run(user, options["runs"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, coupon_count, redemptions, user_count):
+        started = time.perf_counter()
+        current_time = now()
+        tag = uuid.uuid4().hex[:8]
+        # bulk_create keeps the welcome email and cache signals out of it
+        users = [
+            User(fullname=f"Bench {i}", email=f"bench-{tag}-{i}@example.com")
+            for i in range(user_count)
+        ]
+        User.objects.bulk_create(users, batch_size=5000)
+        coupons = [
+            Coupon(
+                code=f"B{tag}{i}",
+                value=10,
+                valid_from=current_time - timedelta(days=1),
+                valid_to=current_time + timedelta(days=30),
+            )
+            for i in range(coupon_count)
+        ]
+        Coupon.objects.bulk_create(coupons, batch_size=5000)
+
+        per_user = min(coupon_count, max(1, redemptions // user_count))
+        batch = []
+        for index, user in enumerate(users):
+            for offset in range(per_user):
+                coupon = coupons[(index * 101 + offset) % coupon_count]
+                batch.append(CouponUser(coupon=coupon, user=user))
+            if len(batch) >= 50000:
+                CouponUser.objects.bulk_create(batch)
+                batch = []
+        CouponUser.objects.bulk_create(batch)
+
+        self.stdout.write(
+            f"seeded {coupon_count} coupons, {per_user * user_count} redemptions "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return users[0]
+
+    def run(self, user, runs):
+        factory = APIRequestFactory()
+        initkwargs = CouponViewSet.active.kwargs
+        scenarios = [
+            ("before", LegacyCouponViewSet, False),
+            ("cold", CouponViewSet, True),
+            ("warm", CouponViewSet, False),
+        ]
+        for name, viewset, clear in scenarios:
+            view = viewset.as_view({"get": "active"}, **initkwargs)
+            timings = []
+            for _ in range(runs):
+                if clear:
+                    cache.clear()
+                request = factory.get("/api/coupons/active/")
+                force_authenticate(request, user=user)
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    view(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{name:<8} {len(queries):>4} queries "
+                f"p50={p50:8.2f}ms p99={p99:8.2f}ms"
+            )
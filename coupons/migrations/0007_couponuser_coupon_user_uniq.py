@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+
+
+def drop_duplicate_uses(apps, schema_editor):
+    # Keep the first use of each coupon per user
+    CouponUser = apps.get_model("coupons", "CouponUser")
+    earlier = CouponUser.objects.filter(
+        Q(used_at__lt=OuterRef("used_at"))
+        | Q(used_at=OuterRef("used_at"), id__lt=OuterRef("id")),
+        coupon=OuterRef("coupon"),
+        user=OuterRef("user"),
+    )
+    CouponUser.objects.filter(Exists(earlier)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coupons", "0006_alter_coupon_value"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_uses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="couponuser",
+            constraint=models.UniqueConstraint(
+                fields=("coupon", "user"), name="couponuser_coupon_user_uniq"
+            ),
+        ),
+    ]
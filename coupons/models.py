@@ -1,3 +1,4 @@
+from decimal import ROUND_HALF_UP, Decimal
 from django.db import models
 from ecommerce.utils.models import UUID, TimeStampModel
 from users.models import User
@@ -25,9 +26,17 @@ class Coupon(UUID, TimeStampModel):
     def __str__(self):
         return f"{self.code}"
 
-    def update_used_count(self):
-        self.used_count = self.users.count()
-        self.save()
+    def get_discount(self, amount):
+        """Discount this coupon gives on an order total of `amount`"""
+        if self.type == "percentage":
+            discount = (amount * self.value / Decimal("100")).quantize(
+                Decimal("0.01"), rounding=ROUND_HALF_UP
+            )
+            if self.max_value is not None:
+                discount = min(discount, self.max_value)
+        else:
+            discount = self.value
+        return min(discount, amount)
 
     class Meta:
         ordering = ["-created_at"]
@@ -45,3 +54,8 @@ class CouponUser(UUID):
 
     class Meta:
         ordering = ["-used_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["coupon", "user"], name="couponuser_coupon_user_uniq"
+            ),
+        ]
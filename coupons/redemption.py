@@ -0,0 +1,41 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+
+from coupons.models import Coupon, CouponUser
+
+
+def redeem_coupon(code, user, order_total=None):
+    """
+    Validate `code` for `user` and count one use of it; returns the coupon.
+
+    Safe under concurrency without locking ahead of time: the unique
+    (coupon, user) constraint turns a second use by the same user into an
+    IntegrityError, and `used_count` is only bumped by a conditional UPDATE
+    that matches no row once `max_use` is reached. Either failure rolls the
+    whole redemption back. The minimum order value is only checked when
+    `order_total` is given.
+    """
+    current_time = now()
+    coupon = Coupon.objects.filter(code=code, is_active=True).first()
+    if coupon is None:
+        raise ValidationError("Invalid or inactive coupon code")
+    if coupon.valid_from > current_time or coupon.valid_to < current_time:
+        raise ValidationError("Coupon is not valid at this time")
+    if order_total is not None and order_total < coupon.min_order_value:
+        raise ValidationError(f"Minimum order value is {coupon.min_order_value}")
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                CouponUser.objects.create(coupon=coupon, user=user)
+        except IntegrityError:
+            raise ValidationError("You have already used this coupon")
+
+        # Last, so the coupon row is locked only until the commit
+        if not Coupon.objects.filter(pk=coupon.pk, used_count__lt=F("max_use")).update(
+            used_count=F("used_count") + 1
+        ):
+            raise ValidationError("Coupon usage limit reached")
+    return coupon
@@ -1,3 +1,224 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+from coupons.models import Coupon, CouponUser
+from coupons.redemption import redeem_coupon
+from coupons.views import CouponViewSet
+from ecommerce.models import Watermark
+from ecommerce.tasks import deactivate_expired_coupons, update_coupon_usage_stats
+from notification.models import Notification
+from users.models import User
 
-# Create your tests here.
+
+def make_coupon(**kwargs):
+    kwargs.setdefault("code", "FLASH")
+    kwargs.setdefault("valid_from", timezone.now() - timedelta(days=1))
+    kwargs.setdefault("valid_to", timezone.now() + timedelta(days=1))
+    return Coupon.objects.create(value=10, **kwargs)
+
+
+class CouponRedemptionConcurrencyTests(TransactionTestCase):
+    """Parallel redemptions must never exceed max_use or reuse a coupon"""
+
+    USERS = 24
+    MAX_USE = 5
+
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.users = [
+            User(fullname=f"user {i}", email=f"user{i}@example.com")
+            for i in range(self.USERS)
+        ]
+        User.objects.bulk_create(self.users)
+        self.coupon = make_coupon(max_use=self.MAX_USE)
+
+    def attempt(self, user, barrier):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    redeem_coupon(self.coupon.code, user)
+                    return "redeemed"
+                except OperationalError:
+                    # SQLite's shared in-memory test database reports lock
+                    # contention instead of waiting; just try again.
+                    continue
+                except ValidationError as e:
+                    return str(e.detail[0])
+        finally:
+            connection.close()
+
+    def redeem_in_parallel(self, users):
+        barrier = threading.Barrier(len(users))
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            return list(pool.map(lambda user: self.attempt(user, barrier), users))
+
+    def test_parallel_redemptions_stop_at_max_use(self):
+        results = self.redeem_in_parallel(self.users)
+
+        self.assertEqual(results.count("redeemed"), self.MAX_USE)
+        self.assertEqual(
+            results.count("Coupon usage limit reached"), self.USERS - self.MAX_USE
+        )
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, self.MAX_USE)
+        self.assertEqual(CouponUser.objects.count(), self.MAX_USE)
+
+    def test_parallel_redemptions_by_one_user_count_once(self):
+        results = self.redeem_in_parallel([self.users[0]] * 8)
+
+        self.assertEqual(results.count("redeemed"), 1)
+        self.assertEqual(results.count("You have already used this coupon"), 7)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 1)
+
+
+class CouponUsageReconciliationTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.user = User(fullname="user", email="user@example.com")
+        User.objects.bulk_create([self.user])
+
+    def test_only_recently_used_coupons_are_recounted(self):
+        used = make_coupon(code="USED")
+        idle = make_coupon(code="IDLE", used_count=3)
+        # Recorded outside redeem_coupon, so the counter is behind
+        CouponUser.objects.create(coupon=used, user=self.user)
+
+        result = update_coupon_usage_stats()
+
+        self.assertEqual(result, "Updated usage stats for 1 coupons")
+        used.refresh_from_db()
+        idle.refresh_from_db()
+        self.assertEqual(used.used_count, 1)
+        self.assertEqual(idle.used_count, 3)
+
+    def test_drifted_coupons_are_fixed_in_chunks_of_constant_queries(self):
+        coupons = [make_coupon(code=f"C{i}") for i in range(9)]
+        CouponUser.objects.bulk_create(
+            [CouponUser(coupon=coupon, user=self.user) for coupon in coupons]
+        )
+
+        def reconcile(chunk_size):
+            Watermark.objects.filter(name="coupon_usage").delete()
+            with self.settings(COUPON_STATS_CHUNK_SIZE=chunk_size):
+                with CaptureQueriesContext(connection) as queries:
+                    result = update_coupon_usage_stats()
+            return result, len(queries)
+
+        single = reconcile(100)
+        settled = reconcile(100)
+        Coupon.objects.update(used_count=0)
+        chunked = reconcile(4)
+
+        self.assertEqual(single[0], "Updated usage stats for 9 coupons")
+        self.assertEqual(chunked[0], "Updated usage stats for 9 coupons")
+        # Nothing drifted, so nothing is written back
+        self.assertEqual(settled, ("Updated usage stats for 0 coupons", single[1] - 1))
+        # Two more chunks, each one count query and one bulk_update
+        self.assertEqual(chunked[1], single[1] + 4)
+        self.assertFalse(Coupon.objects.exclude(used_count=1).exists())
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class CouponExpiryTests(TestCase):
+    def test_expired_coupons_are_deactivated_and_admins_notified_in_bulk(self):
+        admins = [
+            User(fullname=f"admin {i}", email=f"admin{i}@example.com", role="admin")
+            for i in range(3)
+        ]
+        User.objects.bulk_create(admins)
+        yesterday = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            make_coupon(
+                code=f"OLD{i}",
+                valid_from=yesterday - timedelta(days=1),
+                valid_to=yesterday,
+            )
+        make_coupon(code="CURRENT")
+
+        with self.assertNumQueries(5):
+            result = deactivate_expired_coupons()
+
+        self.assertTrue(result.startswith("Deactivated 5 expired coupons"))
+        self.assertEqual(
+            list(Coupon.objects.filter(is_active=True).values_list("code", flat=True)),
+            ["CURRENT"],
+        )
+        notifications = Notification.objects.filter(notification_type="coupon_expiry")
+        self.assertEqual(
+            sorted(notifications.values_list("user_id", flat=True)),
+            sorted(admin.pk for admin in admins),
+        )
+        self.assertEqual(len(notifications[0].data["expired_codes"]), 5)
+
+
+class ActiveCouponCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # bulk_create skips the welcome email signal
+        self.user = User(fullname="user", email="user@example.com")
+        User.objects.bulk_create([self.user])
+        self.view = CouponViewSet.as_view(
+            {"get": "active"}, **CouponViewSet.active.kwargs
+        )
+
+    def active_codes(self):
+        request = APIRequestFactory().get("/api/coupons/active/")
+        force_authenticate(request, user=self.user)
+        return [coupon["code"] for coupon in self.view(request).data["data"]]
+
+    def test_warm_cache_answers_without_sql(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_coupon(code="WELCOME")
+        self.active_codes()
+
+        with CaptureQueriesContext(connection) as queries:
+            codes = self.active_codes()
+
+        self.assertEqual(codes, ["WELCOME"])
+        self.assertEqual(len(queries), 0)
+
+    def test_coupon_changes_and_redemptions_evict(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_coupon(code="FIRST")
+        self.assertEqual(self.active_codes(), ["FIRST"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_coupon(code="SECOND")
+        self.assertEqual(self.active_codes(), ["SECOND", "FIRST"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            redeem_coupon("FIRST", self.user)
+        self.assertEqual(self.active_codes(), ["SECOND"])
+
+    def test_cached_list_follows_validity_boundaries(self):
+        current_time = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            Coupon.objects.create(
+                code="LATER",
+                value=10,
+                valid_from=current_time + timedelta(hours=1),
+                valid_to=current_time + timedelta(hours=3),
+            )
+            make_coupon(code="ENDING", valid_to=current_time + timedelta(hours=2))
+        self.assertEqual(self.active_codes(), ["ENDING"])
+
+        with patch(
+            "coupons.cache.now", return_value=current_time + timedelta(minutes=90)
+        ):
+            self.assertEqual(self.active_codes(), ["ENDING", "LATER"])
+        with patch(
+            "coupons.cache.now", return_value=current_time + timedelta(minutes=150)
+        ):
+            self.assertEqual(self.active_codes(), ["LATER"])
@@ -1,9 +1,11 @@
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.utils.timezone import now
+from coupons.cache import get_active_coupons, get_used_coupon_ids
 from coupons.models import Coupon, CouponUser
+from coupons.redemption import redeem_coupon
 from coupons.serializers import CouponSerializer, CouponUserSerializer
 
 
@@ -15,15 +17,9 @@ class CouponViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def active(self, request):
         """List active and valid coupons for user"""
-        current_time = now()
-        valid_coupons = Coupon.objects.filter(
-            is_active=True,
-            valid_from__lte=current_time,
-            valid_to__gte=current_time,
-        ).exclude(users__user=request.user)
-
-        serializer = self.get_serializer(valid_coupons, many=True)
-        return Response({"success": True, "data": serializer.data})
+        used = get_used_coupon_ids(request.user)
+        data = [coupon for coupon in get_active_coupons() if coupon["id"] not in used]
+        return Response({"success": True, "data": data})
 
 
 class CouponUserViewSet(viewsets.ReadOnlyModelViewSet):
@@ -46,34 +42,13 @@ class CouponUserViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
         try:
-            coupon = Coupon.objects.get(code=code, is_active=True)
-        except Coupon.DoesNotExist:
-            return Response(
-                {"error": "Invalid or inactive coupon code"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if coupon.valid_from > now() or coupon.valid_to < now():
-            return Response(
-                {"error": "Coupon is not valid at this time"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if CouponUser.objects.filter(coupon=coupon, user=request.user).exists():
+            redeem_coupon(code, request.user)
+        except ValidationError as e:
             return Response(
-                {"error": "You have already used this coupon"},
+                {"error": e.detail[0]},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if coupon.used_count >= coupon.max_use:
-            return Response(
-                {"error": "Coupon usage limit reached"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        CouponUser.objects.create(user=request.user, coupon=coupon)
-        coupon.update_used_count()
-
         return Response(
             {"success": True, "message": "Coupon applied successfully"},
             status=status.HTTP_200_OK,
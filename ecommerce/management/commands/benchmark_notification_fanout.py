@@ -0,0 +1,101 @@
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from ecommerce.tasks import _notification_event, fan_out_notifications
+from notification.models import Notification
+from users.models import User
+
+
+def legacy_send(user_id, notification_data):
+    """One send_websocket_notification before the bulk fan-out"""
+    if not User.objects.filter(id=user_id).exists():
+        return
+    notification = Notification.objects.create(
+        user_id=user_id,
+        title=notification_data["title"],
+        message=notification_data["message"],
+        notification_type=notification_data.get("notification_type", "system"),
+        data=notification_data.get("data", {}),
+    )
+    async_to_sync(get_channel_layer().group_send)(
+        f"user_{user_id}", _notification_event(notification)
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare a broadcast sent per recipient with the bulk fan-out"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument(
+            "--legacy-sample",
+            type=int,
+            default=1000,
+            help="Recipients timed on the per-recipient path, then extrapolated",
+        )
+        parser.add_argument(
+            "--in-memory-layer",
+            action="store_true",
+            help="Push to an in-memory channel layer instead of the configured one",
+        )
+
+    def handle(self, *args, **options):
+        if options["in_memory_layer"]:
+            layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+            with override_settings(CHANNEL_LAYERS=layers):
+                self.run(options)
+        else:
+            self.run(options)
+
+    def run(self, options):
+        # Not rolled back like the other benchmarks: pushes wait for the
+        # commit. The seeded users, and their notifications with them, are
+        # deleted at the end instead.
+        tag = uuid.uuid4().hex[:8]
+        try:
+            ids = self.seed(tag, options["users"])
+            payload = {
+                "title": "Flash sale",
+                "message": "Everything is 20% off today",
+                "notification_type": "system",
+            }
+
+            sample = ids[: options["legacy_sample"]]
+            started = time.perf_counter()
+            for user_id in sample:
+                legacy_send(user_id, payload)
+            per_recipient = (time.perf_counter() - started) / max(len(sample), 1)
+            self.stdout.write(
+                f"per recipient {len(sample)} sent in "
+                f"{per_recipient * len(sample):.1f}s, "
+                f"~{per_recipient * len(ids):.0f}s for {len(ids)} "
+                "(before any broker or queue time)"
+            )
+
+            started = time.perf_counter()
+            sent = fan_out_notifications((user_id, payload) for user_id in ids)
+            self.stdout.write(
+                f"fan-out       {sent} sent in {time.perf_counter() - started:.1f}s"
+            )
+        finally:
+            seeded = User.objects.filter(email__startswith=f"bench-{tag}-")
+            Notification.objects.filter(user__in=seeded).delete()
+            seeded.delete()
+
+    def seed(self, tag, user_count):
+        started = time.perf_counter()
+        # bulk_create keeps the welcome email signal out of it
+        users = [
+            User(fullname=f"Bench {i}", email=f"bench-{tag}-{i}@example.com")
+            for i in range(user_count)
+        ]
+        User.objects.bulk_create(users, batch_size=5000)
+        self.stdout.write(
+            f"seeded {user_count} users in {time.perf_counter() - started:.1f}s"
+        )
+        return [user.pk for user in users]
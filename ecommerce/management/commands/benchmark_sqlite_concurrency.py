@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from notification.models import Notification
+from orders.models import Order, OrderItem
+from product.models import Product
+from users.models import User
+
+BUYER_EMAIL = "bench-buyer@example.com"
+SELLER_EMAIL = "bench-seller@example.com"
+MODES = {"default": "false", "wal": "true"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent writer processes against a scratch SQLite file, with "
+        "and without SQLITE_WAL, and compare throughput and lock errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--modes", default=",".join(MODES))
+        # Internal: the roles the parent process runs this command in
+        parser.add_argument("--seed", action="store_true", help="(internal)")
+        parser.add_argument("--worker", action="store_true", help="(internal)")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            return self.seed()
+        if options["worker"]:
+            return self.work(options["seconds"])
+
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only makes sense on SQLite")
+        modes = [mode.strip() for mode in options["modes"].split(",")]
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(unknown)}")
+
+        scratch = tempfile.mkdtemp(prefix="sqlite-bench-")
+        try:
+            for mode in modes:
+                self.run_mode(mode, scratch, options["workers"], options["seconds"])
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def run_mode(self, mode, scratch, workers, seconds):
+        env = os.environ.copy()
+        env.pop("REPLICA_DATABASE_URL", None)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, mode + '.sqlite3')}"
+        env["SQLITE_WAL"] = MODES[mode]
+
+        self.stdout.write(f"[{mode}] migrating scratch database...")
+        self.manage(["migrate", "-v", "0"], env)
+        self.manage(["benchmark_sqlite_concurrency", "--seed"], env)
+
+        command = [
+            "benchmark_sqlite_concurrency",
+            "--worker",
+            "--seconds",
+            str(seconds),
+        ]
+        processes = [
+            subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / "manage.py"), *command],
+                env=env,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            for _ in range(workers)
+        ]
+        results = [json.loads(process.communicate()[0]) for process in processes]
+
+        orders = sum(result["orders"] for result in results)
+        locked = sum(result["locked"] for result in results)
+        latencies = sorted(ms for result in results for ms in result["latencies"])
+        p50 = latencies[len(latencies) // 2] if latencies else 0
+        p99 = (
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            if latencies
+            else 0
+        )
+        self.stdout.write(
+            f"[{mode}] {workers} workers: {orders} orders "
+            f"({orders / seconds:.1f}/s), {locked} 'database is locked' errors, "
+            f"p50={p50:.2f}ms p99={p99:.2f}ms"
+        )
+
+    def manage(self, command, env):
+        subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), *command],
+            env=env,
+            check=True,
+        )
+
+    def seed(self):
+        # bulk_create keeps the welcome email and cache signals out of it
+        seller = User(fullname="Bench Seller", email=SELLER_EMAIL, role="seller")
+        User.objects.bulk_create(
+            [User(fullname="Bench Buyer", email=BUYER_EMAIL, role="buyer"), seller]
+        )
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name="Bench product",
+                    desp="benchmark",
+                    price=Decimal("10.00"),
+                    stock=Decimal("1000000.00"),
+                    owner=seller,
+                )
+            ]
+        )
+
+    def work(self, seconds):
+        """
+        Write what a checkout and its seller notification write, then read
+        what the seller's notification badge and order list read. The seller
+        is left off the order so no broker round trips are involved.
+        """
+        buyer = User.objects.get(email=BUYER_EMAIL)
+        seller = User.objects.get(email=SELLER_EMAIL)
+        product = Product.objects.get(owner=seller)
+
+        orders = locked = 0
+        latencies = []
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        buyer=buyer,
+                        base_amount=product.price,
+                        convenience_fee=Decimal("0.00"),
+                        delivery_fee=Decimal("0.00"),
+                        total_amount=product.price,
+                    )
+                    OrderItem.objects.create(
+                        order=order,
+                        product=product,
+                        price_at_order=product.price,
+                        quantity=1,
+                    )
+                    Notification.objects.create(
+                        user=seller,
+                        title="New Order Received!",
+                        message=f"Order #{order.id}",
+                        notification_type="order_new",
+                    )
+                Notification.objects.filter(user=seller, is_read=False).count()
+                list(Order.objects.filter(buyer=buyer)[:20])
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+                continue
+            orders += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        self.stdout.write(
+            json.dumps({"orders": orders, "locked": locked, "latencies": latencies})
+        )
@@ -0,0 +1,129 @@
+import re
+import textwrap
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from notification.models import Notification
+from orders.models import Order
+from product.models import Product
+
+# SQLite: "SCAN orders_order" (a bare SCAN has no index). PostgreSQL: "Seq Scan on".
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (?!CONSTANT ROW)(?P<table>\S+)(?!.*\bUSING\b)"),
+    "postgresql": re.compile(r"\bSeq Scan on (?P<table>\S+)"),
+}
+
+
+def get_hot_queries():
+    """
+    Representative queries from the request paths and periodic tasks. The
+    filter values are placeholders; only the plans matter.
+    """
+    user_id = uuid.uuid4()
+    now = timezone.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return [
+        (
+            "orders: buyer history",
+            Order.objects.filter(buyer_id=user_id).order_by("-created_at")[:20],
+        ),
+        (
+            "orders: seller history",
+            Order.objects.filter(seller_id=user_id).order_by("-created_at")[:20],
+        ),
+        (
+            "orders: buyer or seller",
+            Order.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id)),
+        ),
+        (
+            "orders: daily analytics",
+            Order.objects.filter(
+                created_at__range=(day_start, day_start + timedelta(days=1))
+            ),
+        ),
+        (
+            "notifications: user feed",
+            Notification.objects.filter(user_id=user_id).order_by("-created_at")[:20],
+        ),
+        (
+            "notifications: unread count",
+            Notification.objects.filter(user_id=user_id, is_read=False),
+        ),
+        (
+            "notifications: retention cleanup",
+            Notification.objects.filter(created_at__lt=now - timedelta(days=30)),
+        ),
+        ("cart: owner carts", Cart.objects.filter(owner_id=user_id)),
+        (
+            "cart: item lookup",
+            CartItem.objects.filter(cart_id=uuid.uuid4(), product_id=uuid.uuid4()),
+        ),
+        ("products: seller catalog", Product.objects.filter(owner_id=user_id)),
+        (
+            "products: low stock sweep",
+            Product.objects.filter(
+                stock__lte=Decimal("10.00"),
+                is_archived=False,
+                stock_alert__isnull=True,
+            ),
+        ),
+        (
+            "products: stock reconciliation",
+            Product.objects.filter(updated_at__gte=now - timedelta(hours=1)),
+        ),
+        (
+            "products: out of stock sweep",
+            Product.objects.filter(stock=0, is_archived=False),
+        ),
+        (
+            "products: newest first page",
+            Product.objects.order_by("-created_at", "-id")[:20],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries and fail if any of them needs a full table scan"
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f"EXPLAIN checks are not supported on {connection.vendor}"
+            )
+
+        failures = []
+        for label, queryset in get_hot_queries():
+            plan = self.explain(queryset)
+            scans = [match.group("table") for match in pattern.finditer(plan)]
+            if scans:
+                failures.append(label)
+                self.stdout.write(
+                    self.style.ERROR(f"FULL SCAN {label}: {', '.join(scans)}")
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK        {label}"))
+            if options["verbosity"] > 1 or scans:
+                self.stdout.write(textwrap.indent(plan, "    "))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to a full scan")
+
+    def explain(self, queryset):
+        if connection.vendor != "postgresql":
+            return queryset.explain()
+
+        # On small tables PostgreSQL rightly prefers sequential scans, which
+        # would hide a missing index. Ask whether an index plan exists at all.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ecommerce.outbox import prune, relay
+
+
+class Command(BaseCommand):
+    help = "Relay outbox messages to the Celery broker until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--idle-sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the outbox once and exit"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or settings.OUTBOX_BATCH_SIZE
+        last_prune = 0
+        while True:
+            close_old_connections()
+            sent = relay(batch_size)
+            if sent:
+                self.stdout.write(f"Relayed {sent} messages")
+            if time.monotonic() - last_prune > 3600:
+                prune()
+                last_prune = time.monotonic()
+            if sent < batch_size:
+                if options["once"]:
+                    return
+                time.sleep(options["idle_sleep"])
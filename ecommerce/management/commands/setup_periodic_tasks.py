@@ -30,6 +30,11 @@ class Command(BaseCommand):
             period=IntervalSchedule.MINUTES,
         )
 
+        every_10_seconds, _ = IntervalSchedule.objects.get_or_create(
+            every=10,
+            period=IntervalSchedule.SECONDS,
+        )
+
         tasks = [
             {
                 "name": "Deactivate Expired Coupons",
@@ -61,6 +66,26 @@ class Command(BaseCommand):
                 "task": "ecommerce.tasks.archive_out_of_stock_products",
                 "schedule": daily_midnight,
             },
+            {
+                "name": "Send Abandoned Cart Reminders",
+                "task": "ecommerce.tasks.send_abandoned_cart_reminders",
+                "schedule": hourly,
+            },
+            {
+                "name": "Flush Redis Carts",
+                "task": "ecommerce.tasks.flush_redis_carts",
+                "schedule": every_1_minute,
+            },
+            {
+                "name": "Reconcile Cart Totals",
+                "task": "ecommerce.tasks.reconcile_cart_totals",
+                "schedule": daily_midnight,
+            },
+            {
+                "name": "Relay Outbox",
+                "task": "ecommerce.tasks.relay_outbox",
+                "schedule": every_10_seconds,
+            },
             {
                 "name": "Remind Inactive Users",
                 "task": "ecommerce.tasks.remind_inactive_users",
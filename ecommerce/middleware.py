@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from ecommerce.routers import pin_user, routing_state
 
 User = get_user_model()
 
@@ -39,3 +40,25 @@ class JWTAuthMiddleware(BaseMiddleware):
             scope["user"] = AnonymousUser()
 
         return await super().__call__(scope, receive, send)
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Give each request its own database routing scope, and pin the user to the
+    primary for a while after a request in which they wrote something.
+
+    Keep it after SilkyMiddleware so silk's own bookkeeping writes do not
+    count as the user's.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing_state() as state:
+            response = self.get_response(request)
+
+        user = getattr(request, "user", None)
+        if state.wrote and user is not None and user.is_authenticated:
+            pin_user(user)
+        return response
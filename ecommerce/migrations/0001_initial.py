@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:01
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Watermark",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("timestamp", models.DateTimeField(blank=True, null=True)),
+                ("key", models.CharField(blank=True, max_length=64)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import models
+from ecommerce.utils.models import UUID, TimeStampModel
+
+
+class Watermark(UUID, TimeStampModel):
+    """
+    How far a chunked background job has got. `timestamp` is the position
+    reached and `key` breaks ties between rows sharing that timestamp, so
+    the next run resumes exactly after the last row it handled.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    timestamp = models.DateTimeField(null=True, blank=True)
+    key = models.CharField(max_length=64, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.timestamp} / {self.key}"
+
+    def advance(self, timestamp, key=""):
+        self.timestamp = timestamp
+        self.key = str(key)
+        self.save(update_fields=["timestamp", "key", "updated_at"])
+
+
+class OutboxMessage(UUID, TimeStampModel):
+    """
+    A Celery task to run once the transaction that wrote this row commits.
+    The relay (ecommerce.outbox.relay) sends pending rows to the broker with
+    the row id as task id, so a redelivery after a crash keeps its id, and
+    `key` stops the same event from being queued twice.
+    """
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    key = models.CharField(max_length=255, unique=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay reads pending messages oldest first
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(dispatched_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.key})"
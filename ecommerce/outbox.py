@@ -0,0 +1,97 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from ecommerce.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Messages held back by an enclosing `batch()`
+_pending = ContextVar("outbox_pending", default=None)
+
+
+def message(task, *args, key, **kwargs):
+    """An unsaved outbox row running `task` with the given arguments"""
+    # Round-trip through JSON so UUIDs, Decimals and dates are stored the
+    # way Celery's JSON serializer would have sent them
+    args, kwargs = json.loads(json.dumps([args, kwargs], cls=DjangoJSONEncoder))
+    return OutboxMessage(task=task, args=args, kwargs=kwargs, key=key)
+
+
+def enqueue(*messages):
+    """
+    Write `messages` in the current transaction, one INSERT for all. They
+    only reach the broker once it commits, and never if it rolls back.
+    Messages whose key is already queued are dropped.
+    """
+    pending = _pending.get()
+    if pending is not None:
+        pending.extend(messages)
+    elif messages:
+        OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+
+
+@contextmanager
+def batch():
+    """Hold back `enqueue` calls made inside and write them in one INSERT"""
+    pending = []
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    enqueue(*pending)
+
+
+def relay(batch_size=None):
+    """
+    Send up to `batch_size` pending messages to the broker, oldest first,
+    and mark them dispatched; returns how many were sent. Rows are locked
+    with SKIP LOCKED so several relays can run side by side. A message is
+    marked only after the broker took it, so delivery is at least once.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.filter(dispatched_at__isnull=True)
+            .select_for_update(skip_locked=True)
+            .order_by("created_at")[:batch_size]
+        )
+        sent = []
+        for outbox_message in messages:
+            try:
+                current_app.send_task(
+                    outbox_message.task,
+                    args=outbox_message.args,
+                    kwargs=outbox_message.kwargs,
+                    task_id=str(outbox_message.id),
+                )
+            except Exception as e:
+                # The broker is most likely down; leave the rest for later
+                logger.error(f"Failed to relay {outbox_message}: {str(e)}")
+                OutboxMessage.objects.filter(pk=outbox_message.pk).update(
+                    attempts=outbox_message.attempts + 1, last_error=str(e)
+                )
+                break
+            sent.append(outbox_message.pk)
+
+        if sent:
+            OutboxMessage.objects.filter(pk__in=sent).update(
+                dispatched_at=timezone.now()
+            )
+    return len(sent)
+
+
+def prune():
+    """Delete messages dispatched more than OUTBOX_RETENTION_DAYS ago"""
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxMessage.objects.filter(dispatched_at__lt=cutoff).delete()
+    return deleted
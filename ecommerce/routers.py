@@ -0,0 +1,114 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+
+class RoutingState:
+    """Per request (or per task) routing decision"""
+
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        # Set once anything is written; later reads stay on the primary so
+        # the caller sees its own changes despite replication lag.
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def get_state():
+    return _state.get()
+
+
+@contextmanager
+def routing_state(use_replica=False):
+    """Open a fresh routing scope; reads stay on the primary unless asked"""
+    state = RoutingState(use_replica=use_replica)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def read_replica():
+    """
+    Send reads in this block (or decorated function) to the replica. Writes
+    always go to the primary and pin the remaining reads there too.
+    """
+    state = get_state()
+    if state is None:
+        with routing_state(use_replica=True):
+            yield
+        return
+
+    previous = state.use_replica
+    state.use_replica = True
+    try:
+        yield
+    finally:
+        state.use_replica = previous
+
+
+def _pin_key(user_id):
+    return f"db:pin:user:{user_id}"
+
+
+def pin_user(user):
+    """Keep `user` on the primary for a while after they changed something"""
+    try:
+        cache.set(_pin_key(user.pk), True, getattr(settings, "REPLICA_PIN_SECONDS", 10))
+    except Exception as e:
+        logger.error(f"Failed to pin user {user.pk} to the primary: {str(e)}")
+
+
+def is_pinned(user):
+    if not user or not user.is_authenticated:
+        return False
+    try:
+        return bool(cache.get(_pin_key(user.pk)))
+    except Exception as e:
+        # Without the pin we cannot promise fresh reads; use the primary
+        logger.error(f"Failed to read primary pin for user {user.pk}: {str(e)}")
+        return True
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary. Reads go to the replica only inside an explicit
+    read_replica() scope with no writes so far, and only if one is configured.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = get_state()
+        if state is None or not state.use_replica or state.wrote:
+            return PRIMARY
+        if not replica_configured():
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = get_state()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
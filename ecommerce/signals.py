@@ -1,34 +1,219 @@
-import logging
-from django.db.models.signals import post_save, pre_save
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
 from django.utils import timezone
 
-from product.models import ProductMedia
-from orders.models import Order, OrderStatusHistory
-from coupons.models import CouponUser
+from product.models import (
+    Brand,
+    BrandCategory,
+    Category,
+    Product,
+    ProductMedia,
+    Size,
+    StockAlertRule,
+)
+from product.signals import stock_changed
+from product.cache import invalidate as invalidate_catalog_cache
+from product.cache import invalidate_many as invalidate_catalog_cache_many
+from product.search import reindex_products, remove_products
+from cart.models import Cart
+from orders.models import Order, OrderItem, OrderStatusHistory
+from orders.signals import order_status_changed
+from coupons.cache import invalidate_catalog as invalidate_coupon_catalog
+from coupons.cache import invalidate_used as invalidate_used_coupons
+from coupons.models import Coupon, CouponUser
 from users.models import User
+from ecommerce.outbox import enqueue, message
 from ecommerce.tasks import (
     process_product_media,
+    process_stock_changes,
+    rebuild_sales_rollup,
     send_order_notification_email,
     send_websocket_notification,
-    update_coupon_usage_stats,
     send_welcome_email,
 )
 
-logger = logging.getLogger(__name__)
-
 
 @receiver(post_save, sender=ProductMedia)
 def trigger_media_processing(sender, instance, created, **kwargs):
     """Trigger media processing when new media is uploaded"""
     if created and instance.type == "image":
-        try:
-            process_product_media.delay(instance.id)
-            logger.info(f"Media processing queued for ProductMedia {instance.id}")
-        except Exception as e:
-            logger.error(
-                f"Failed to queue media processing for ProductMedia {instance.id}: {str(e)}"
+        enqueue(
+            message(
+                process_product_media.name,
+                instance.id,
+                key=f"media:{instance.id}:process",
             )
+        )
+
+
+CATALOG_CACHE_NAMESPACES = {
+    Product: "product",
+    Brand: "brand",
+    Category: "category",
+    Size: "size",
+    BrandCategory: "brand_category",
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Size)
+@receiver(post_save, sender=BrandCategory)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Size)
+@receiver(post_delete, sender=BrandCategory)
+def invalidate_catalog_cache_on_change(sender, instance, **kwargs):
+    """Evict cached catalog responses that include the changed object"""
+    namespace = CATALOG_CACHE_NAMESPACES[sender]
+    pk = instance.pk
+    # Evicting before commit would let a concurrent read re-cache the old row
+    transaction.on_commit(lambda: invalidate_catalog_cache(namespace, pk))
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_catalog_on_change(sender, instance, **kwargs):
+    """Evict the cached active coupons when a coupon changes"""
+    transaction.on_commit(invalidate_coupon_catalog)
+
+
+@receiver(post_save, sender=CouponUser)
+@receiver(post_delete, sender=CouponUser)
+def invalidate_used_coupons_on_change(sender, instance, **kwargs):
+    """Evict the user's cached used coupons when they use one"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_used_coupons(user_id))
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    """Keep the product's full-text search document in sync"""
+    reindex_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_products_on_rename(sender, instance, created, **kwargs):
+    """Brand and category names are part of every product search document"""
+    if not created:
+        reindex_products(instance.products.all())
+
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+def remember_products_before_delete(sender, instance, **kwargs):
+    # Products are detached (SET_NULL) without signals, so note them now
+    instance._search_product_ids = list(instance.products.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def reindex_products_on_delete(sender, instance, **kwargs):
+    product_ids = getattr(instance, "_search_product_ids", [])
+    if product_ids:
+        reindex_products(Product.objects.filter(id__in=product_ids))
+
+
+@receiver(post_save, sender=User)
+def reindex_products_on_owner_rename(
+    sender, instance, created, update_fields, **kwargs
+):
+    """Seller names are searchable; skip saves that cannot touch them (e.g. login)"""
+    if created or (update_fields is not None and "fullname" not in update_fields):
+        return
+    reindex_products(instance.products.all())
+
+
+@receiver(post_save, sender=User)
+def invalidate_catalog_cache_on_owner_rename(
+    sender, instance, created, update_fields, **kwargs
+):
+    """Cached product pages show the seller's name; evict theirs on a rename"""
+    if created or (update_fields is not None and "fullname" not in update_fields):
+        return
+    product_ids = list(instance.products.values_list("pk", flat=True))
+    if product_ids:
+        transaction.on_commit(
+            lambda: invalidate_catalog_cache_many("product", product_ids)
+        )
+
+
+@receiver(pre_save, sender=Product)
+def snapshot_product_price_and_stock(sender, instance, update_fields, **kwargs):
+    """
+    Products loaded from the database already carry their loaded price and
+    stock; one built by hand, or loaded with them deferred, is read once
+    here, before the save overwrites the row.
+    """
+    # A hand-built instance saved with update_fields is still "adding"
+    if instance._state.adding and update_fields is None:
+        return
+    for field in ("price", "stock"):
+        if update_fields is None or field in update_fields:
+            instance.get_loaded_value(field)
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts_on_price_change(sender, instance, created, update_fields, **kwargs):
+    """Keep the stored total of every cart holding the product in step"""
+    if created or (update_fields is not None and "price" not in update_fields):
+        return
+    previous = instance.get_loaded_value("price")
+    if previous is None or previous == instance.price:
+        return
+    Cart.objects.reprice(instance.pk, Decimal(instance.price) - previous)
+
+
+@receiver(post_save, sender=Product)
+def announce_stock_change(sender, instance, created, update_fields, **kwargs):
+    """Seller and admin edits go through save(); checkouts send their own"""
+    if not created and update_fields is not None and "stock" not in update_fields:
+        return
+    if created or instance.get_loaded_value("stock") != instance.stock:
+        stock_changed.send(sender=Product, product_ids=[instance.pk])
+
+
+@receiver(stock_changed)
+def check_changed_stock(sender, product_ids, **kwargs):
+    """Alert and archive once the change commits, instead of on the next sweep"""
+    enqueue(
+        message(
+            process_stock_changes.name,
+            product_ids=product_ids,
+            key=f"stock-changed:{uuid.uuid4().hex}",
+        )
+    )
+
+
+@receiver(post_save, sender=StockAlertRule)
+@receiver(post_delete, sender=StockAlertRule)
+def recheck_stock_on_rule_change(sender, instance, **kwargs):
+    """A new threshold may put the seller's products above or below it"""
+    enqueue(
+        message(
+            process_stock_changes.name,
+            owner_id=instance.owner_id,
+            key=f"stock-rules-changed:{uuid.uuid4().hex}",
+        )
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def drop_product_from_carts(sender, instance, **kwargs):
+    # Cart items are cascade-deleted without signals, so settle totals now
+    Cart.objects.drop_product(instance.pk, instance.price)
 
 
 @receiver(post_save, sender=Order)
@@ -36,134 +221,158 @@ def handle_order_updates(sender, instance, created, **kwargs):
     """Handle order creation and status updates"""
     if created:
         # New order created
-        if instance.seller:
-            # Send email notification with error handling
-            try:
-                send_order_notification_email.delay(instance.id, "seller")
-                logger.info(
-                    f"Email notification queued for order {instance.id} to seller"
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to queue email notification for order {instance.id} to seller: {str(e)}"
-                )
-
-            # Send WebSocket notification with error handling
-            try:
-                send_websocket_notification.delay(
-                    instance.seller.id,
+        if instance.seller_id:
+            buyer_name = instance.buyer.fullname if instance.buyer else "Guest"
+            enqueue(
+                message(
+                    send_order_notification_email.name,
+                    instance.id,
+                    "seller",
+                    key=f"order:{instance.id}:new:email",
+                ),
+                message(
+                    send_websocket_notification.name,
+                    instance.seller_id,
                     {
                         "title": "New Order Received!",
-                        "message": f'Order #{instance.id} from {instance.buyer.fullname if instance.buyer else "Guest"}',
+                        "message": f"Order #{instance.id} from {buyer_name}",
                         "notification_type": "order_new",
                         "data": {
                             "order_id": str(instance.id),
-                            "buyer_name": (
-                                instance.buyer.fullname if instance.buyer else "Guest"
-                            ),
+                            "buyer_name": buyer_name,
                             "total_amount": str(instance.total_amount),
                         },
                     },
-                )
-                logger.info(
-                    f"WebSocket notification queued for order {instance.id} to seller"
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to queue WebSocket notification for order {instance.id} to seller: {str(e)}"
-                )
-    else:
-        # Order updated - check if status changed
-        try:
-            old_instance = Order.objects.get(id=instance.id)
-            if hasattr(instance, "_state") and not instance._state.adding:
-                # Status might have changed, notify buyer
-                if instance.buyer:
-                    # Send email notification with error handling
-                    try:
-                        send_order_notification_email.delay(instance.id, "buyer")
-                        logger.info(
-                            f"Email notification queued for order {instance.id} to buyer"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to queue email notification for order {instance.id} to buyer: {str(e)}"
-                        )
-
-                    # Send WebSocket notification with error handling
-                    try:
-                        send_websocket_notification.delay(
-                            instance.buyer.id,
-                            {
-                                "title": "Order Status Updated",
-                                "message": f"Your order #{instance.id} is now {instance.get_status_display()}",
-                                "notification_type": "order_update",
-                                "data": {
-                                    "order_id": str(instance.id),
-                                    "new_status": instance.status,
-                                    "status_display": instance.get_status_display(),
-                                },
-                            },
-                        )
-                        logger.info(
-                            f"WebSocket notification queued for order {instance.id} to buyer"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to queue WebSocket notification for order {instance.id} to buyer: {str(e)}"
-                        )
-        except Order.DoesNotExist:
-            pass
+                    key=f"order:{instance.id}:new:notification",
+                ),
+            )
+    elif instance.status != instance.get_loaded_value("status"):
+        order_status_changed.send(
+            sender=Order,
+            changes=[
+                {
+                    "order_id": instance.id,
+                    "buyer_id": instance.buyer_id,
+                    "previous_status": instance.get_loaded_value("status"),
+                    "new_status": instance.status,
+                }
+            ],
+            changed_by=None,
+        )
 
 
 @receiver(pre_save, sender=Order)
-def track_order_status_changes(sender, instance, **kwargs):
-    """Track order status changes"""
-    if instance.pk:  # Only for existing orders
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            if old_instance.status != instance.status:
-                # Create status history record
-                OrderStatusHistory.objects.create(
-                    order=instance,
-                    previous_status=old_instance.status,
-                    new_status=instance.status,
-                    # You can add changed_by if you track who made the change
-                )
-                logger.info(
-                    f"Status change recorded for order {instance.id}: {old_instance.status} -> {instance.status}"
-                )
-        except Order.DoesNotExist:
-            pass
-        except Exception as e:
-            logger.error(
-                f"Failed to create status history for order {instance.id}: {str(e)}"
-            )
+def snapshot_order_status(sender, instance, **kwargs):
+    """
+    Orders loaded from the database already carry their loaded status; one
+    built by hand is read once here, before the save overwrites the row.
+    """
+    if not instance._state.adding:
+        instance.get_loaded_value("status")
 
 
-@receiver(post_save, sender=CouponUser)
-def update_coupon_stats_on_use(sender, instance, created, **kwargs):
-    """Update coupon usage statistics when coupon is used"""
-    if created:
-        try:
-            # Delay the update to avoid race conditions
-            update_coupon_usage_stats.apply_async(countdown=5)
-            logger.info(
-                f"Coupon usage stats update queued for CouponUser {instance.id}"
+@receiver(order_status_changed)
+def handle_order_status_changes(sender, changes, changed_by=None, **kwargs):
+    """Record status history and notify buyers, for saves and bulk updates"""
+    history = [
+        OrderStatusHistory(
+            order_id=change["order_id"],
+            previous_status=change["previous_status"],
+            new_status=change["new_status"],
+            changed_by=changed_by,
+        )
+        for change in changes
+    ]
+    OrderStatusHistory.objects.bulk_create(history)
+
+    status_display = dict(Order.STATUS_CHOICES)
+    messages = []
+    for change, record in zip(changes, history):
+        if not change["buyer_id"]:
+            continue
+        order_id = change["order_id"]
+        display = status_display.get(change["new_status"], change["new_status"])
+        messages.append(
+            message(
+                send_order_notification_email.name,
+                order_id,
+                "buyer",
+                key=f"order-status:{record.id}:email",
             )
-        except Exception as e:
-            logger.error(
-                f"Failed to queue coupon usage stats update for CouponUser {instance.id}: {str(e)}"
+        )
+        messages.append(
+            message(
+                send_websocket_notification.name,
+                change["buyer_id"],
+                {
+                    "title": "Order Status Updated",
+                    "message": f"Your order #{order_id} is now {display}",
+                    "notification_type": "order_update",
+                    "data": {
+                        "order_id": str(order_id),
+                        "new_status": change["new_status"],
+                        "status_display": display,
+                    },
+                },
+                key=f"order-status:{record.id}:notification",
+            )
+        )
+    enqueue(*messages)
+
+
+@receiver(order_status_changed)
+def restock_cancelled_orders(sender, changes, **kwargs):
+    """
+    Cancelled orders give back the stock checkout reserved for them, once:
+    items are marked as released in the same transaction and skipped after.
+    Items that never reserved stock (admin, fixtures, older orders) are left
+    alone.
+    """
+    cancelled = [
+        change["order_id"] for change in changes if change["new_status"] == "cancelled"
+    ]
+    if not cancelled:
+        return
+    with transaction.atomic():
+        items = list(
+            OrderItem.objects.filter(
+                order_id__in=cancelled,
+                product__isnull=False,
+                stock_reserved_at__isnull=False,
+                stock_released_at__isnull=True,
             )
+            .select_for_update()
+            .values_list("id", "product_id", "quantity")
+        )
+        if not items:
+            return
+        OrderItem.objects.filter(pk__in=[item_id for item_id, _, _ in items]).update(
+            stock_released_at=timezone.now()
+        )
+        quantities = defaultdict(int)
+        for _, product_id, quantity in items:
+            quantities[product_id] += quantity
+        Product.objects.release_stock(quantities)
+
+
+@receiver(post_delete, sender=Order)
+def drop_deleted_order_from_sales_rollup(sender, instance, **kwargs):
+    """Deleted orders leave no updated_at behind, so rebuild their group now"""
+    group = (timezone.localdate(instance.created_at), instance.seller_id)
+    enqueue(
+        message(
+            rebuild_sales_rollup.name,
+            [group],
+            key=f"order:{instance.pk}:deleted:sales-rollup",
+        )
+    )
 
 
 @receiver(post_save, sender=User)
 def send_welcome_email_on_registration(sender, instance, created, **kwargs):
     if created and instance.email:
-        try:
-            send_welcome_email.delay(instance.id)
-            logger.info(f"Email notification queued for welcoming user {instance.id}")
-        except Exception as e:
-            logger.error(
-                f"Failed to queue email notification for welcoming user {instance.id}: {str(e)}"
+        enqueue(
+            message(
+                send_welcome_email.name, instance.id, key=f"user:{instance.id}:welcome"
             )
+        )
@@ -1,20 +1,42 @@
+import asyncio
+import uuid
+from itertools import islice
+
 from celery import shared_task
+from django.conf import settings
 from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.core.files.storage import default_storage
 from PIL import Image
 import requests
 import os
 import tempfile
-from decimal import Decimal
+from datetime import date, timedelta
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from cart.models import Cart, CartItem
+from cart.store import get_cart_store
+from ecommerce.models import Watermark
+from ecommerce.outbox import prune as prune_outbox, relay as relay_outbox_batch
 from users.models import User
+from product.cache import invalidate_many as invalidate_catalog_cache
 from product.models import Product, ProductMedia, ProcessedProductMedia
-from orders.models import Order
-from coupons.models import Coupon
+from product.search import reindex_products
+from product.stock_alerts import check_stock
+from orders.models import Order, SalesRollup
+from coupons.cache import invalidate_catalog as invalidate_coupon_catalog
+from coupons.models import Coupon, CouponUser
 from notification.models import Notification
 
+# Expired coupon codes named in the admin notification; the count covers all
+EXPIRED_CODES_LISTED = 100
+
+# Channel layer sends in flight at once while pushing a chunk of notifications
+NOTIFICATION_PUSHES_IN_FLIGHT = 100
+
 
 @shared_task(bind=True, max_retries=3)
 def process_product_media(self, media_id):
@@ -96,21 +118,28 @@ def process_product_media(self, media_id):
 
 @shared_task
 def deactivate_expired_coupons():
-    """Deactivate expired coupons and notify admin"""
+    """
+    Deactivate expired coupons in one UPDATE and notify admins with one
+    bulk insert, whatever the number of coupons or admins.
+    """
     try:
         expired_coupons = Coupon.objects.filter(
             valid_to__lt=timezone.now(), is_active=True
         )
-
-        expired_codes = list(expired_coupons.values_list("code", flat=True))
+        expired_codes = list(
+            expired_coupons.order_by("valid_to").values_list("code", flat=True)[
+                :EXPIRED_CODES_LISTED
+            ]
+        )
         count = expired_coupons.update(is_active=False)
 
         if count > 0:
-            # Notify admin
-            admin_users = User.objects.filter(role__in=["admin", "superadmin"])
-            for admin in admin_users:
-                send_websocket_notification.delay(
-                    admin.id,
+            # Queryset updates skip the post_save eviction
+            transaction.on_commit(invalidate_coupon_catalog)
+
+            fan_out_notifications(
+                (
+                    admin_id,
                     {
                         "title": "Coupons Expired",
                         "message": f"{count} coupons have been deactivated",
@@ -118,6 +147,10 @@ def deactivate_expired_coupons():
                         "data": {"expired_codes": expired_codes},
                     },
                 )
+                for admin_id in User.objects.filter(
+                    role__in=["admin", "superadmin"]
+                ).values_list("id", flat=True)
+            )
 
         return f"Deactivated {count} expired coupons: {expired_codes}"
     except Exception as e:
@@ -187,97 +220,253 @@ def send_order_notification_email(order_id, recipient_type):
 def send_websocket_notification(user_id, notification_data):
     """Send real-time notification via WebSocket and save to database"""
     try:
-        if not User.objects.filter(id=user_id).exists():
+        if not fan_out_notifications([(user_id, notification_data)]):
             return f"Error: User with ID {user_id} does not exist."
+        return f"Notification sent to user {user_id}"
+    except Exception as e:
+        return f"Error sending notification to user {user_id}: {str(e)}"
 
-        notification = Notification.objects.create(
-            user_id=user_id,
-            title=notification_data["title"],
-            message=notification_data["message"],
-            notification_type=notification_data.get("notification_type", "system"),
-            data=notification_data.get("data", {}),
-        )
 
-        # Send via WebSocket
-        channel_layer = get_channel_layer()
-        group_name = f"user_{user_id}"
+@shared_task
+def send_bulk_notifications(recipients):
+    """Save and push notifications for a list of [user_id, notification_data]"""
+    try:
+        return f"Sent {fan_out_notifications(recipients)} notifications"
+    except Exception as e:
+        return f"Error sending notifications: {str(e)}"
+
+
+def fan_out_notifications(recipients):
+    """
+    Save and push one notification per (user_id, notification_data) pair,
+    taking the payload send_websocket_notification does; returns how many
+    were saved. Pairs are handled NOTIFICATION_CHUNK_SIZE at a time: one
+    query drops unknown users, one bulk_create saves the rest, and once that
+    commits their pushes go to the channel layer concurrently.
+    """
+    to_pk = User._meta.pk.to_python
+    recipients = iter(recipients)
+    sent = 0
+    while chunk := list(islice(recipients, settings.NOTIFICATION_CHUNK_SIZE)):
+        known = set(
+            User.objects.filter(
+                id__in={to_pk(user_id) for user_id, _ in chunk}
+            ).values_list("id", flat=True)
+        )
+        notifications = [
+            Notification(
+                user_id=to_pk(user_id),
+                title=notification_data["title"],
+                message=notification_data["message"],
+                notification_type=notification_data.get("notification_type", "system"),
+                data=notification_data.get("data", {}),
+            )
+            for user_id, notification_data in chunk
+            if to_pk(user_id) in known
+        ]
+        Notification.objects.bulk_create(notifications)
+        transaction.on_commit(lambda batch=notifications: _push_notifications(batch))
+        sent += len(notifications)
+    return sent
+
+
+def _push_notifications(notifications):
+    """Send `notifications` to their users' channel groups in one event loop"""
+    channel_layer = get_channel_layer()
+    in_flight = asyncio.Semaphore(NOTIFICATION_PUSHES_IN_FLIGHT)
+
+    async def push(notification):
+        async with in_flight:
+            await channel_layer.group_send(
+                f"user_{notification.user_id}", _notification_event(notification)
+            )
 
-        # FIXED: Send notification data in the correct format
-        async_to_sync(channel_layer.group_send)(
-            group_name,
+    async def push_all():
+        # Failed pushes are saved already; the user sees them on their next visit
+        await asyncio.gather(*map(push, notifications), return_exceptions=True)
+
+    async_to_sync(push_all)()
+
+
+def _notification_event(notification):
+    """The channel layer message NotificationConsumer relays to the browser"""
+    return {
+        "type": "send_notification",
+        "notification": {
+            "id": str(notification.id),
+            "title": notification.title,
+            "message": notification.message,
+            "type": notification.notification_type,
+            "notification_type": notification.notification_type,
+            "data": notification.data,
+            "created_at": notification.created_at.isoformat(),
+            "is_read": notification.is_read,
+        },
+    }
+
+
+def _send_low_stock_digests(digests):
+    """One notification per seller listing their newly low products"""
+    return fan_out_notifications(
+        (
+            owner_id,
             {
-                "type": "send_notification",
-                "notification": {
-                    "id": str(notification.id),
-                    "title": notification.title,
-                    "message": notification.message,
-                    "type": notification.notification_type,
-                    "notification_type": notification.notification_type,
-                    "data": notification.data,
-                    "created_at": notification.created_at.isoformat(),
-                    "is_read": notification.is_read,
-                },
+                "title": "Low Stock Alert",
+                "message": f"{count} of your products "
+                f"{'is' if count == 1 else 'are'} running low on stock",
+                "notification_type": "stock_alert",
+                "data": {"count": count, "products": products},
             },
         )
+        for owner_id, count, products in digests
+    )
+
+
+def _archive_out_of_stock(products):
+    # update() sends no post_save, so evict and reindex the archived ids here
+    with transaction.atomic():
+        ids = list(
+            products.filter(stock=0, is_archived=False)
+            .select_for_update()
+            .values_list("id", flat=True)
+        )
+        if not ids:
+            return 0
+        archived = Product.objects.filter(pk__in=ids).update(
+            is_archived=True, updated_at=timezone.now()
+        )
+        reindex_products(Product.objects.filter(pk__in=ids))
+        transaction.on_commit(lambda: invalidate_catalog_cache("product", ids))
+    return archived
 
-        return f"Notification sent to user {user_id}"
+
+@shared_task
+def process_stock_changes(product_ids=None, owner_id=None):
+    """
+    React to a stock_changed event as soon as it commits: alert sellers about
+    the given products (or all of `owner_id`'s, after their thresholds
+    changed) that crossed their threshold, and archive the sold out ones.
+    """
+    try:
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        if owner_id is not None:
+            products = products.filter(owner_id=owner_id)
+
+        sent = _send_low_stock_digests(check_stock(products))
+        archived = _archive_out_of_stock(products)
+        return f"Sent {sent} low stock digests, archived {archived} products"
     except Exception as e:
-        return f"Error sending notification to user {user_id}: {str(e)}"
+        return f"Error processing stock changes: {str(e)}"
 
 
 @shared_task
 def check_low_stock_products():
-    """Check for products with low stock and notify sellers"""
+    """
+    Reconcile low stock alerts for products changed since the last run.
+    Stock changes are handled as they happen by process_stock_changes; this
+    only catches changes made around it, such as raw updates or imports.
+    Each seller gets one digest of their newly low products.
+    """
     try:
-        low_stock_threshold = Decimal("10.00")  # Adjust as needed
-        low_stock_products = Product.objects.filter(
-            stock__lte=low_stock_threshold, is_archived=False
-        ).select_related("owner")
-
-        notifications_sent = 0
-        for product in low_stock_products:
-            send_websocket_notification.delay(
-                product.owner.id,
-                {
-                    "title": "Low Stock Alert",
-                    "message": f'Your product "{product.name}" is running low on stock ({product.stock} remaining)',
-                    "notification_type": "stock_alert",
-                    "data": {
-                        "product_id": str(product.id),
-                        "current_stock": str(product.stock),
-                        "threshold": str(low_stock_threshold),
-                    },
-                },
+        started = timezone.now()
+        watermark, _ = Watermark.objects.get_or_create(name="stock_alerts")
+        changed = Product.objects.all()
+        if watermark.timestamp is not None:
+            # Overlap the last run: a change committed late may carry an
+            # earlier updated_at, and checking a product twice is harmless
+            changed = changed.filter(
+                updated_at__gte=watermark.timestamp - timedelta(minutes=10)
             )
-            notifications_sent += 1
 
-        return f"Sent {notifications_sent} low stock notifications"
+        notifications_sent = _send_low_stock_digests(check_stock(changed))
+        watermark.advance(started)
+        return f"Sent {notifications_sent} low stock digests"
     except Exception as e:
         return f"Error checking stock: {str(e)}"
 
 
+def _refresh_sales_rollup():
+    """
+    Rebuild the SalesRollup rows of every (day, seller) with an order
+    changed since the last run, SALES_ROLLUP_CHUNK_SIZE groups at a time.
+    """
+    started = timezone.now()
+    chunk_size = settings.SALES_ROLLUP_CHUNK_SIZE
+    watermark, _ = Watermark.objects.get_or_create(name="sales_rollup")
+    changed = Order.objects.all()
+    if watermark.timestamp is not None:
+        # Overlap the last run: an order committed late may carry an earlier
+        # updated_at, and rebuilding a group twice is harmless
+        changed = changed.filter(
+            updated_at__gte=watermark.timestamp - timedelta(minutes=10)
+        )
+    # By day, so each chunk spans as few days as possible
+    groups = (
+        changed.annotate(day=TruncDate("created_at"))
+        .values_list("day", "seller_id")
+        .distinct()
+        .order_by("day", "seller_id")
+    )
+
+    rebuilt = 0
+    chunk = []
+    for group in groups.iterator():
+        chunk.append(group)
+        if len(chunk) == chunk_size:
+            SalesRollup.objects.rebuild(chunk)
+            rebuilt += len(chunk)
+            chunk = []
+    SalesRollup.objects.rebuild(chunk)
+    rebuilt += len(chunk)
+
+    watermark.advance(started)
+    return rebuilt
+
+
+@shared_task(bind=True, max_retries=3)
+def rebuild_sales_rollup(self, groups):
+    """Rebuild the given [day, seller_id] groups, e.g. of a deleted order"""
+    groups = [
+        (date.fromisoformat(day), uuid.UUID(seller_id) if seller_id else None)
+        for day, seller_id in groups
+    ]
+    try:
+        rebuilt = SalesRollup.objects.rebuild(groups)
+    except IntegrityError as e:
+        # Raced another rebuild of the same group; retry once it committed
+        raise self.retry(exc=e, countdown=5)
+    return f"Rebuilt {rebuilt} sales rollup rows"
+
+
 @shared_task
 def generate_sales_analytics():
-    """Generate daily sales analytics and reports"""
+    """
+    Bring the sales rollup up to date, then report today's sales from it.
+    Revenue is summed in SQL and the report reads a few rollup rows, so the
+    cost does not grow with the number of orders.
+    """
     try:
-        today = timezone.now().date()
-        yesterday = today - timezone.timedelta(days=1)
-
-        # Daily statistics
-        daily_orders = Order.objects.filter(created_at__date=today)
-        yesterday_orders = Order.objects.filter(created_at__date=yesterday)
+        _refresh_sales_rollup()
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        daily = SalesRollup.objects.summary(today, today)
+        previous = SalesRollup.objects.summary(yesterday, yesterday)
 
         analytics = {
             "date": today.isoformat(),
-            "total_orders": daily_orders.count(),
-            "completed_orders": daily_orders.filter(status="completed").count(),
-            "total_revenue": sum(order.total_amount for order in daily_orders),
-            "yesterday_orders": yesterday_orders.count(),
+            "total_orders": daily["total_orders"],
+            "completed_orders": daily["by_status"]
+            .get("completed", {})
+            .get("orders", 0),
+            "total_revenue": str(daily["total_revenue"]),
+            "yesterday_orders": previous["total_orders"],
             "growth_rate": 0,
         }
 
         # Calculate growth rate
-        if yesterday_orders.count() > 0:
+        if analytics["yesterday_orders"] > 0:
             analytics["growth_rate"] = (
                 (analytics["total_orders"] - analytics["yesterday_orders"])
                 / analytics["yesterday_orders"]
@@ -285,10 +474,9 @@ def generate_sales_analytics():
             )
 
         # Send report to admins
-        admin_users = User.objects.filter(role__in=["admin", "superadmin"])
-        for admin in admin_users:
-            send_websocket_notification.delay(
-                admin.id,
+        fan_out_notifications(
+            (
+                admin_id,
                 {
                     "title": "Daily Sales Report",
                     "message": f'Daily analytics ready: {analytics["total_orders"]} orders, ₹{analytics["total_revenue"]} revenue',
@@ -296,6 +484,10 @@ def generate_sales_analytics():
                     "data": analytics,
                 },
             )
+            for admin_id in User.objects.filter(
+                role__in=["admin", "superadmin"]
+            ).values_list("id", flat=True)
+        )
 
         return f"Analytics generated for {today}: {analytics}"
     except Exception as e:
@@ -318,17 +510,57 @@ def cleanup_old_notifications():
 
 @shared_task
 def update_coupon_usage_stats():
-    """Update coupon usage statistics"""
+    """
+    Reconcile `used_count` for coupons used since the last run. Redemption
+    keeps the counter exact, so this only repairs uses recorded some other
+    way (admin, imports). Touched coupons are taken COUPON_STATS_CHUNK_SIZE
+    at a time, each chunk counted in one grouped query, and only the ones
+    that drifted are written back with one bulk_update.
+    """
     try:
-        coupons = Coupon.objects.filter(is_active=True)
-        updated_count = 0
-
-        for coupon in coupons:
-            old_count = coupon.used_count
-            coupon.update_used_count()
-            if coupon.used_count != old_count:
-                updated_count += 1
+        started = timezone.now()
+        chunk_size = settings.COUPON_STATS_CHUNK_SIZE
+        watermark, _ = Watermark.objects.get_or_create(name="coupon_usage")
+        touched = CouponUser.objects.all()
+        if watermark.timestamp is not None:
+            # Overlap the last run: a use committed late may carry an earlier
+            # used_at, and recounting a coupon twice is harmless
+            touched = touched.filter(
+                used_at__gte=watermark.timestamp - timedelta(minutes=10)
+            )
 
+        updated_count = 0
+        last = None
+        while True:
+            coupons = Coupon.objects.filter(pk__in=touched.values("coupon"))
+            if last is not None:
+                coupons = coupons.filter(pk__gt=last)
+            chunk = list(
+                coupons.annotate(actual=Count("users"))
+                .only("id", "used_count")
+                .order_by("pk")[:chunk_size]
+            )
+            if not chunk:
+                break
+            last = chunk[-1].pk
+
+            changed = []
+            for coupon in chunk:
+                drift = coupon.actual - coupon.used_count
+                if drift:
+                    # Applied as a delta: a redemption committing meanwhile
+                    # bumps the counter and the count alike, so the drift
+                    # holds where an absolute value would undo its increment
+                    coupon.used_count = F("used_count") + drift
+                    changed.append(coupon)
+            if changed:
+                Coupon.objects.bulk_update(changed, ["used_count"])
+                updated_count += len(changed)
+
+            if len(chunk) < chunk_size:
+                break
+
+        watermark.advance(started)
         return f"Updated usage stats for {updated_count} coupons"
     except Exception as e:
         return f"Error updating coupon stats: {str(e)}"
@@ -336,16 +568,129 @@ def update_coupon_usage_stats():
 
 @shared_task
 def send_abandoned_cart_reminders():
-    """Send reminders for abandoned carts (if you have cart functionality)"""
-    # This would require a Cart model - placeholder implementation
+    """
+    Remind owners of carts whose latest item change is older than
+    ABANDONED_CART_AFTER_HOURS. Carts are taken in chunks ordered by that
+    latest change, and a watermark records the last one reminded, so each
+    run only aggregates cart items changed since the previous run.
+    """
     try:
-        # You would implement cart abandonment logic here
-        # For now, returning a placeholder
-        return "Cart reminder functionality would be implemented here"
+        cutoff = timezone.now() - timedelta(hours=settings.ABANDONED_CART_AFTER_HOURS)
+        chunk_size = settings.ABANDONED_CART_CHUNK_SIZE
+        watermark, _ = Watermark.objects.get_or_create(name="abandoned_carts")
+        if watermark.timestamp is None:
+            watermark.timestamp = cutoff - timedelta(
+                days=settings.ABANDONED_CART_LOOKBACK_DAYS
+            )
+
+        reminded = 0
+        while True:
+            since = watermark.timestamp
+            after = Q(last_activity__gt=since)
+            if watermark.key:
+                after |= Q(last_activity=since, cart_id__gt=watermark.key)
+            # Only carts with an item changed since the watermark can be new
+            # candidates; the index on (updated_at, cart) finds them without
+            # reading older items, then their latest change is aggregated.
+            recent = CartItem.objects.filter(updated_at__gte=since).values("cart_id")
+            chunk = list(
+                CartItem.objects.filter(cart_id__in=recent)
+                .values("cart_id")
+                .annotate(last_activity=Max("updated_at"))
+                .filter(after, last_activity__lte=cutoff)
+                .order_by("last_activity", "cart_id")[:chunk_size]
+            )
+            if not chunk:
+                break
+            owners = dict(
+                Cart.objects.filter(
+                    pk__in=[row["cart_id"] for row in chunk]
+                ).values_list("id", "owner_id")
+            )
+
+            with transaction.atomic():
+                # Pushed once the watermark is saved with them
+                reminded += fan_out_notifications(
+                    (
+                        owners[row["cart_id"]],
+                        {
+                            "title": "You left something in your cart",
+                            "message": "Items in your cart are waiting for you. "
+                            "Complete your purchase before they sell out!",
+                            "notification_type": "cart_reminder",
+                            "data": {
+                                "cart_id": str(row["cart_id"]),
+                                "last_activity": row["last_activity"].isoformat(),
+                            },
+                        },
+                    )
+                    for row in chunk
+                    if row["cart_id"] in owners
+                )
+                watermark.advance(chunk[-1]["last_activity"], chunk[-1]["cart_id"].hex)
+
+            if len(chunk) < chunk_size:
+                break
+
+        return f"Sent {reminded} abandoned cart reminders"
     except Exception as e:
         return f"Error with cart reminders: {str(e)}"
 
 
+@shared_task
+def relay_outbox():
+    """Send every pending outbox message to the broker, then prune old ones"""
+    try:
+        relayed = 0
+        while True:
+            sent = relay_outbox_batch()
+            relayed += sent
+            if sent < settings.OUTBOX_BATCH_SIZE:
+                break
+        pruned = prune_outbox()
+        return f"Relayed {relayed} outbox messages, pruned {pruned}"
+    except Exception as e:
+        return f"Error relaying outbox: {str(e)}"
+
+
+@shared_task
+def flush_redis_carts():
+    """Write carts changed in the Redis cart store back to the database"""
+    store = get_cart_store()
+    if store is None:
+        return "Redis cart store is disabled"
+    try:
+        return f"Flushed {store.flush_dirty()} carts to the database"
+    except Exception as e:
+        return f"Error flushing carts: {str(e)}"
+
+
+@shared_task
+def reconcile_cart_totals():
+    """
+    Recompute the stored totals of every cart from its items, repairing any
+    drift the incremental updates missed (bulk writes, lost races). Carts are
+    taken CART_RECONCILE_CHUNK_SIZE at a time, each chunk one UPDATE.
+    """
+    try:
+        chunk_size = settings.CART_RECONCILE_CHUNK_SIZE
+        carts = Cart.objects.order_by("pk").values_list("pk", flat=True)
+        reconciled = 0
+        last = None
+        while True:
+            chunk = carts if last is None else carts.filter(pk__gt=last)
+            ids = list(chunk[:chunk_size])
+            if not ids:
+                break
+            last = ids[-1]
+            reconciled += Cart.objects.filter(pk__in=ids).refresh_totals()
+            if len(ids) < chunk_size:
+                break
+        return f"Reconciled totals of {reconciled} carts"
+    except Exception as e:
+        return f"Error reconciling cart totals: {str(e)}"
+
+
 @shared_task
 def process_bulk_product_updates():
     """Process bulk product updates (price changes, stock updates, etc.)"""
@@ -359,8 +704,12 @@ def process_bulk_product_updates():
 
 @shared_task
 def archive_out_of_stock_products():
-    products = Product.objects.filter(stock=0, is_archived=False)
-    count = products.update(is_archived=True)
+    """
+    Archive sold out products that process_stock_changes missed. The partial
+    index on live products' stock reads only those rows, so no watermark is
+    needed to keep this cheap.
+    """
+    count = _archive_out_of_stock(Product.objects.all())
     return f"Archived {count} out-of-stock products"
 
 
@@ -369,17 +718,20 @@ def remind_inactive_users():
     cutoff = timezone.now() - timezone.timedelta(days=30)
     inactive_users = User.objects.filter(last_login__lt=cutoff, is_active=True)
 
-    email_count = 0
-    for user in inactive_users:
-        send_websocket_notification.delay(
-            user.id,
+    reminded = fan_out_notifications(
+        (
+            user_id,
             {
                 "title": "We Miss You!",
                 "message": "It’s been a while since your last visit. Check out what’s new!",
                 "notification_type": "system",
             },
         )
+        for user_id in inactive_users.values_list("id", flat=True).iterator()
+    )
 
+    email_count = 0
+    for user in inactive_users.only("fullname", "email").iterator():
         try:
             send_mail(
                 subject="We Miss You at Your Ecommerce Store!",
@@ -401,7 +753,7 @@ def remind_inactive_users():
         except Exception as e:
             return f"Error sending inactive user email to user {user.id}: {str(e)}"
 
-    return f"Sent {inactive_users.count()} WebSocket reminders and {email_count} emails to inactive users."
+    return f"Sent {reminded} WebSocket reminders and {email_count} emails to inactive users."
 
 
 @shared_task
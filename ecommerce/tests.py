@@ -0,0 +1,273 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import router
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import viewsets
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cart.models import Cart, CartItem
+from ecommerce.middleware import DatabaseRoutingMiddleware
+from ecommerce.models import OutboxMessage, Watermark
+from ecommerce.outbox import batch, enqueue, message, prune, relay
+from ecommerce.routers import read_replica
+from ecommerce.tasks import fan_out_notifications, send_abandoned_cart_reminders
+from ecommerce.utils.views import ReplicaReadMixin
+from notification.models import Notification
+from product.models import Product
+from users.models import User
+
+
+class ProbeViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """Reports where a read would be routed instead of running one"""
+
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        return Response({"db": router.db_for_read(Product)})
+
+    def create(self, request):
+        router.db_for_write(Product)
+        return Response({"db": router.db_for_read(Product)})
+
+
+@mock.patch("ecommerce.routers.replica_configured", return_value=True)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.middleware = DatabaseRoutingMiddleware(self.dispatch)
+        self.alice = User(id="0b0d1c5c-8a3e-4c55-9a3c-6a4d7a1e0001", email="a@x.io")
+        self.bob = User(id="0b0d1c5c-8a3e-4c55-9a3c-6a4d7a1e0002", email="b@x.io")
+
+    def dispatch(self, request):
+        actions = {"get": "list", "post": "create"}
+        view = ProbeViewSet.as_view(actions)
+        return view(request)
+
+    def call(self, method, user):
+        request = getattr(self.factory, method)("/probe/")
+        force_authenticate(request, user=user)
+        # force_authenticate only reaches the DRF request; mirror what DRF
+        # does for real authentication so the middleware sees the user.
+        request.user = user
+        return self.middleware(request).data["db"]
+
+    def test_reads_default_to_primary(self, _):
+        self.assertEqual(router.db_for_read(Product), "default")
+
+    def test_replica_scope_until_first_write(self, _):
+        with read_replica():
+            self.assertEqual(router.db_for_read(Product), "replica")
+            self.assertEqual(router.db_for_write(Product), "default")
+            self.assertEqual(router.db_for_read(Product), "default")
+
+    def test_list_reads_from_replica(self, _):
+        self.assertEqual(self.call("get", self.alice), "replica")
+
+    def test_writer_is_pinned_to_primary(self, _):
+        self.assertEqual(self.call("post", self.alice), "default")
+
+        self.assertEqual(self.call("get", self.alice), "default")
+        self.assertEqual(self.call("get", self.bob), "replica")
+
+    def test_no_replica_configured(self, replica_configured):
+        replica_configured.return_value = False
+
+        self.assertEqual(self.call("get", self.alice), "default")
+
+
+@override_settings(
+    ABANDONED_CART_AFTER_HOURS=24,
+    ABANDONED_CART_CHUNK_SIZE=2,
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class AbandonedCartReminderTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        # bulk_create skips the welcome email signal
+        self.users = [
+            User(fullname=f"user {i}", email=f"user{i}@example.com") for i in range(5)
+        ]
+        User.objects.bulk_create(self.users)
+        self.product = Product(
+            name="product", desp="", price=Decimal("1.00"), stock=1, owner=self.users[0]
+        )
+        Product.objects.bulk_create([self.product])
+        self.carts = [Cart(owner=user) for user in self.users]
+        Cart.objects.bulk_create(self.carts)
+
+    def touch(self, cart, hours_ago):
+        """Give `cart` an item last changed `hours_ago`"""
+        item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        CartItem.objects.filter(pk=item.pk).update(
+            updated_at=self.now - timedelta(hours=hours_ago)
+        )
+
+    def reminded(self):
+        return sorted(
+            Notification.objects.filter(notification_type="cart_reminder").values_list(
+                "data__cart_id", flat=True
+            )
+        )
+
+    def test_reminds_each_abandoned_cart_once(self):
+        # Three abandoned carts, two sharing a timestamp across a chunk edge
+        self.touch(self.carts[0], 30)
+        self.touch(self.carts[1], 48)
+        self.touch(self.carts[2], 48)
+        # Still active: its newest item is recent
+        self.touch(self.carts[3], 72)
+        self.touch(self.carts[3], 1)
+
+        self.assertEqual(
+            send_abandoned_cart_reminders(), "Sent 3 abandoned cart reminders"
+        )
+        self.assertEqual(
+            self.reminded(), sorted(str(cart.pk) for cart in self.carts[:3])
+        )
+        self.assertEqual(
+            send_abandoned_cart_reminders(), "Sent 0 abandoned cart reminders"
+        )
+
+    def test_later_runs_only_pick_up_new_candidates(self):
+        self.touch(self.carts[0], 30)
+        send_abandoned_cart_reminders()
+        watermark = Watermark.objects.get(name="abandoned_carts")
+        self.assertEqual(watermark.key, self.carts[0].pk.hex)
+
+        # A cart that goes quiet later, and the first one coming back to life
+        # and going quiet again, are both new candidates.
+        self.touch(self.carts[1], 25)
+        self.touch(self.carts[0], 26)
+
+        self.assertEqual(
+            send_abandoned_cart_reminders(), "Sent 2 abandoned cart reminders"
+        )
+        self.assertEqual(Notification.objects.filter(user=self.users[0]).count(), 2)
+
+    def test_carts_older_than_the_lookback_are_skipped_on_first_run(self):
+        self.touch(self.carts[0], 24 * 30)
+
+        self.assertEqual(
+            send_abandoned_cart_reminders(), "Sent 0 abandoned cart reminders"
+        )
+
+
+@override_settings(
+    NOTIFICATION_CHUNK_SIZE=2,
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class NotificationFanOutTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.users = [
+            User(fullname=f"user {i}", email=f"user{i}@example.com") for i in range(5)
+        ]
+        User.objects.bulk_create(self.users)
+
+    def payload(self, title):
+        return {"title": title, "message": "hello", "notification_type": "system"}
+
+    def test_unknown_users_are_dropped_with_constant_queries_per_chunk(self):
+        recipients = [(user.pk, self.payload(user.fullname)) for user in self.users]
+        recipients.insert(2, (uuid.uuid4(), self.payload("nobody")))
+
+        # Three chunks of two, each one user lookup and one insert
+        with self.assertNumQueries(6):
+            sent = fan_out_notifications(iter(recipients))
+
+        self.assertEqual(sent, 5)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("user_id", "title")),
+            sorted((user.pk, user.fullname) for user in self.users),
+        )
+
+    def test_pushes_are_sent_once_the_notifications_commit(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{self.users[0].pk}", channel)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            fan_out_notifications(
+                [(str(user.pk), self.payload("Sale")) for user in self.users]
+            )
+        self.assertEqual(len(callbacks), 3)
+        for callback in callbacks:
+            callback()
+
+        event = async_to_sync(channel_layer.receive)(channel)
+        notification = Notification.objects.get(user=self.users[0])
+        self.assertEqual(event["notification"]["id"], str(notification.pk))
+        self.assertEqual(event["notification"]["title"], "Sale")
+
+
+class OutboxRelayTests(TestCase):
+    def queue(self, *keys):
+        enqueue(*(message("ecommerce.tasks.probe", key, key=key) for key in keys))
+
+    @mock.patch("ecommerce.outbox.current_app.send_task")
+    def test_pending_messages_are_sent_oldest_first_with_stable_ids(
+        self, mock_send_task
+    ):
+        self.queue("first")
+        self.queue("second", "third")
+
+        self.assertEqual(relay(batch_size=2), 2)
+        self.assertEqual(relay(batch_size=2), 1)
+        self.assertEqual(relay(batch_size=2), 0)
+
+        sent = [call.kwargs["args"] for call in mock_send_task.call_args_list]
+        self.assertEqual(sent, [["first"], ["second"], ["third"]])
+        first = OutboxMessage.objects.get(key="first")
+        # The row id doubles as the task id, so a re-sent message can be told apart
+        self.assertEqual(
+            mock_send_task.call_args_list[0].kwargs["task_id"], str(first.id)
+        )
+        self.assertFalse(
+            OutboxMessage.objects.filter(dispatched_at__isnull=True).exists()
+        )
+
+    @mock.patch("ecommerce.outbox.current_app.send_task")
+    def test_broker_errors_leave_messages_pending(self, mock_send_task):
+        mock_send_task.side_effect = [None, ConnectionError("broker down")]
+        self.queue("first", "second", "third")
+
+        self.assertEqual(relay(), 1)
+
+        pending = OutboxMessage.objects.filter(dispatched_at__isnull=True)
+        self.assertEqual(
+            sorted(pending.values_list("key", "attempts")),
+            [("second", 1), ("third", 0)],
+        )
+        self.assertEqual(pending.get(key="second").last_error, "broker down")
+
+    def test_batches_write_once_and_drop_duplicate_keys(self):
+        self.queue("first")
+        with self.assertNumQueries(1):
+            with batch():
+                self.queue("first", "second")
+                self.queue("third")
+
+        self.assertEqual(OutboxMessage.objects.count(), 3)
+
+    def test_prune_keeps_recent_and_pending_messages(self):
+        self.queue("old", "recent", "pending")
+        OutboxMessage.objects.filter(key="old").update(
+            dispatched_at=timezone.now() - timedelta(days=30)
+        )
+        OutboxMessage.objects.filter(key="recent").update(dispatched_at=timezone.now())
+
+        self.assertEqual(prune(), 1)
+        self.assertEqual(
+            sorted(OutboxMessage.objects.values_list("key", flat=True)),
+            ["pending", "recent"],
+        )
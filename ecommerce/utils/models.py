@@ -8,9 +8,58 @@ class UUID(models.Model):
     class Meta:
         abstract = True
 
+
 class TimeStampModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+
+class TrackedFieldsModel(models.Model):
+    """
+    Keeps the value of each of TRACKED_FIELDS as last loaded or saved, so a
+    save (and its signal receivers) can tell what changed without a query.
+    """
+
+    TRACKED_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, "_loaded_values", {})
+        for field in self.TRACKED_FIELDS:
+            if field not in deferred and (fields is None or field in fields):
+                loaded[field] = getattr(self, field)
+        self._loaded_values = loaded
+
+    def get_loaded_value(self, field):
+        """`field` as last loaded or saved; read from the row only if never"""
+        loaded = getattr(self, "_loaded_values", {})
+        if field not in loaded:
+            loaded[field] = (
+                type(self)
+                ._default_manager.filter(pk=self.pk)
+                .values_list(field, flat=True)
+                .first()
+            )
+            self._loaded_values = loaded
+        return loaded[field]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # After post_save, so its receivers still see the previous values
+        self._remember_loaded_values(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_loaded_values(fields)
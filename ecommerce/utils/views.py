@@ -0,0 +1,20 @@
+from ecommerce.routers import get_state, is_pinned
+
+
+class ReplicaReadMixin:
+    """
+    Serve the read-only viewset actions from the read replica, unless the
+    user changed something recently and must see their own writes.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = get_state()
+        if (
+            state is not None
+            and self.action in self.replica_actions
+            and not is_pinned(request.user)
+        ):
+            state.use_replica = True
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notification", "0002_notification_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="notification_type",
+            field=models.CharField(
+                choices=[
+                    ("order_new", "New Order"),
+                    ("order_update", "Order Update"),
+                    ("coupon_expiry", "Coupon Expiry"),
+                    ("stock_alert", "Stock Alert"),
+                    ("payment_success", "Payment Success"),
+                    ("cart_reminder", "Cart Reminder"),
+                    ("system", "System Notification"),
+                ],
+                default="system",
+                max_length=20,
+            ),
+        ),
+    ]
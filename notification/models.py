@@ -10,6 +10,7 @@ class Notification(UUID, TimeStampModel):
         ("coupon_expiry", "Coupon Expiry"),
         ("stock_alert", "Stock Alert"),
         ("payment_success", "Payment Success"),
+        ("cart_reminder", "Cart Reminder"),
         ("system", "System Notification"),
     ]
 
@@ -29,3 +30,16 @@ class Notification(UUID, TimeStampModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"], name="notification_user_created_idx"
+            ),
+            # Unread badge counts only ever touch the unread rows
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+            # Retention cleanup
+            models.Index(fields=["created_at"], name="notification_created_idx"),
+        ]
@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from rest_framework.exceptions import ValidationError
+
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from product.models import Product
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Run parallel checkouts against one low-stock product and report throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--checkouts", type=int, default=2000)
+        parser.add_argument("--stock", type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Worker threads need committed rows, so the fixture is committed and
+        # deleted again at the end rather than rolled back.
+        seller, buyer, product = self.seed(options["stock"])
+        try:
+            self.run(product, buyer, options)
+        finally:
+            Order.objects.filter(buyer=buyer).delete()
+            product.delete()
+            User.objects.filter(pk__in=[seller.pk, buyer.pk]).delete()
+
+    def seed(self, stock):
+        # bulk_create keeps the welcome email signal out of the benchmark
+        seller = User(fullname="Bench Seller", email=f"bench-{uuid.uuid4().hex}@x.io")
+        buyer = User(fullname="Bench Buyer", email=f"bench-{uuid.uuid4().hex}@x.io")
+        User.objects.bulk_create([seller, buyer])
+        product = Product(
+            name="Bench limited product",
+            desp="benchmark",
+            price=Decimal("50.00"),
+            stock=Decimal(stock),
+            owner=seller,
+        )
+        Product.objects.bulk_create([product])
+        return seller, buyer, product
+
+    def run(self, product, buyer, options):
+        payload = {
+            "base_amount": "50.00",
+            "convenience_fee": "0.00",
+            "delivery_fee": "0.00",
+            "total_amount": "50.00",
+            "order_items": [
+                {
+                    "product_id": str(product.id),
+                    "price_at_order": "50.00",
+                    "quantity": 1,
+                }
+            ],
+        }
+        retries = 0
+        retries_lock = threading.Lock()
+
+        def checkout(_):
+            nonlocal retries
+            try:
+                while True:
+                    serializer = OrderSerializer(data=payload)
+                    serializer.is_valid(raise_exception=True)
+                    try:
+                        serializer.save(buyer=buyer)
+                        return "ordered"
+                    except ValidationError:
+                        return "sold out"
+                    except OperationalError:
+                        # "database is locked" on SQLite without SQLITE_WAL
+                        with retries_lock:
+                            retries += 1
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            outcomes = list(pool.map(checkout, range(options["checkouts"])))
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        ordered = outcomes.count("ordered")
+        self.stdout.write(
+            f"{options['checkouts']} checkouts by {options['workers']} workers in "
+            f"{elapsed:.2f}s ({options['checkouts'] / elapsed:.1f}/s): "
+            f"{ordered} ordered, {outcomes.count('sold out')} sold out, "
+            f"{retries} lock retries, stock left {product.stock}"
+        )
+        if ordered > options["stock"] or product.stock != options["stock"] - ordered:
+            raise CommandError("Stock was oversold")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_sales_rollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="stock_released_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0007_orderitem_stock_released"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="stock_reserved_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
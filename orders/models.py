@@ -1,11 +1,53 @@
-from django.db import models
-from ecommerce.utils.models import UUID, TimeStampModel
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from ecommerce.utils.models import UUID, TimeStampModel, TrackedFieldsModel
+from orders.signals import order_status_changed
 from users.models import User
 from product.models import Product
 from coupons.models import Coupon
 
 
-class Order(UUID, TimeStampModel):
+class OrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if "status" in kwargs:
+            return self.update_status(**kwargs)
+        return super().update(**kwargs)
+
+    def update_status(self, status, changed_by=None, **kwargs):
+        """
+        Set `status` (and any other `kwargs`) on every matched order in one
+        UPDATE. The orders whose status actually changes are read in the
+        same transaction and announced through `order_status_changed`, so
+        history and notifications work as they do for Order.save().
+        """
+        kwargs.setdefault("updated_at", timezone.now())
+        with transaction.atomic(using=self.db):
+            changes = [
+                {
+                    "order_id": order_id,
+                    "buyer_id": buyer_id,
+                    "previous_status": previous_status,
+                    "new_status": status,
+                }
+                for order_id, buyer_id, previous_status in self.exclude(status=status)
+                .select_for_update()
+                .order_by()
+                .values_list("id", "buyer_id", "status")
+            ]
+            count = super().update(status=status, **kwargs)
+            if changes:
+                order_status_changed.send(
+                    sender=Order, changes=changes, changed_by=changed_by
+                )
+        return count
+
+
+class Order(TrackedFieldsModel, UUID, TimeStampModel):
     STATUS_CHOICES = (
         ("created", "Created"),
         ("confirmed", "Confirmed"),
@@ -45,8 +87,26 @@ class Order(UUID, TimeStampModel):
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default="created")
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Fields whose value as loaded is kept, so a save can tell what changed
+    TRACKED_FIELDS = ("status",)
+
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # "My orders" as buyer or seller, newest first
+            models.Index(
+                fields=["buyer", "-created_at"], name="order_buyer_created_idx"
+            ),
+            models.Index(
+                fields=["seller", "-created_at"], name="order_seller_created_idx"
+            ),
+            # Date range reports
+            models.Index(fields=["created_at"], name="order_created_idx"),
+            # Orders changed since the sales rollup last ran
+            models.Index(fields=["updated_at"], name="order_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Order of {self.buyer.fullname} ({self.id})"
@@ -69,6 +129,11 @@ class OrderItem(UUID, TimeStampModel):
     )
     price_at_order = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
+    # Set when checkout took the quantity out of stock. Only reserved items
+    # give it back on cancellation, once: stock_released_at marks that, so a
+    # cancelled order that is reopened and cancelled again releases nothing
+    stock_reserved_at = models.DateTimeField(null=True, blank=True)
+    stock_released_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in order {self.order.id}"
@@ -90,3 +155,125 @@ class OrderStatusHistory(UUID, TimeStampModel):
 
     class Meta:
         ordering = ["-created_at"]
+
+
+def day_bounds(day):
+    """First and last instant of `day` in the current time zone"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1) - timedelta(microseconds=1)
+
+
+def _sellers_filter(seller_ids):
+    """Q matching orders or rollups of any of `seller_ids`, None included"""
+    condition = Q(seller_id__in=[pk for pk in seller_ids if pk is not None])
+    if None in seller_ids:
+        condition |= Q(seller__isnull=True)
+    return condition
+
+
+class SalesRollupQuerySet(models.QuerySet):
+    def rebuild(self, groups):
+        """
+        Recount the (day, seller_id) `groups` from their orders: one grouped
+        Count/Sum over just those orders, then their rollup rows are replaced.
+
+        Orders are selected by the groups' day range and sellers rather than
+        one condition per group, so the query stays the same size for any
+        number of groups; rows of other groups in that range are skipped.
+        """
+        groups = set(groups)
+        if not groups:
+            return 0
+        first = min(day for day, _ in groups)
+        last = max(day for day, _ in groups)
+        sellers = _sellers_filter({seller_id for _, seller_id in groups})
+
+        rows = (
+            Order.objects.filter(
+                sellers,
+                created_at__range=(day_bounds(first)[0], day_bounds(last)[1]),
+            )
+            .annotate(day=TruncDate("created_at"))
+            .values("day", "seller_id", "status")
+            .annotate(order_count=Count("id"), revenue=Sum("total_amount"))
+            .order_by()
+        )
+        rollups = [
+            SalesRollup(
+                date=row["day"],
+                seller_id=row["seller_id"],
+                status=row["status"],
+                order_count=row["order_count"],
+                revenue=row["revenue"],
+            )
+            for row in rows
+            if (row["day"], row["seller_id"]) in groups
+        ]
+        with transaction.atomic():
+            existing = self.filter(sellers, date__range=(first, last)).values_list(
+                "pk", "date", "seller_id"
+            )
+            self.filter(
+                pk__in=[
+                    pk for pk, day, seller_id in existing if (day, seller_id) in groups
+                ]
+            ).delete()
+            self.bulk_create(rollups)
+        return len(rollups)
+
+    def summary(self, start, end):
+        """Order count and revenue per status from `start` to `end`, inclusive"""
+        by_status = {
+            row["status"]: {"orders": row["orders"], "revenue": row["revenue"]}
+            for row in self.filter(date__range=(start, end))
+            .values("status")
+            .annotate(orders=Sum("order_count"), revenue=Sum("revenue"))
+            .order_by()
+        }
+        return {
+            "start": start,
+            "end": end,
+            "total_orders": sum(row["orders"] for row in by_status.values()),
+            "total_revenue": sum(
+                (row["revenue"] for row in by_status.values()), Decimal("0.00")
+            ),
+            "by_status": by_status,
+        }
+
+
+class SalesRollup(UUID, TimeStampModel):
+    """
+    Orders and revenue per local day (of `Order.created_at`), seller and
+    status, kept by the generate_sales_analytics task so reports read a
+    handful of rows instead of the orders themselves.
+    """
+
+    date = models.DateField()
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="sales_rollups",
+        blank=True,
+        null=True,
+    )
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+
+    objects = SalesRollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "seller", "status"], name="salesrollup_group_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["seller", "date"], name="salesrollup_seller_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.seller_id} {self.status}: {self.order_count}"
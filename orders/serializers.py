@@ -1,5 +1,9 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from orders.models import Order, OrderItem
+from product.cache import invalidate_many as invalidate_catalog_cache
+from product.models import Product
 from product.serializers import ProductListSerializer
 from coupons.serializers import CouponSerializer
 from users.serializers import UserProfileSerializer
@@ -52,13 +56,98 @@ class OrderSerializer(serializers.ModelSerializer):
         if coupon_id:
             validated_data["coupons_id"] = coupon_id
 
-        order = Order.objects.create(**validated_data)
-
+        quantities = {}
         for item in items_data:
-            OrderItem.objects.create(
-                order=order,
-                product_id=item["product_id"],
-                price_at_order=item["price_at_order"],
-                quantity=item["quantity"],
+            product_id = item["product_id"]
+            quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+
+        with transaction.atomic():
+            prices = dict(
+                Product.objects.filter(
+                    pk__in=quantities, is_archived=False
+                ).values_list("id", "price")
+            )
+            errors = {}
+            for item in items_data:
+                product_id = item["product_id"]
+                if product_id not in prices:
+                    errors[str(product_id)] = "Product is not available."
+                elif item["price_at_order"] != prices[product_id]:
+                    errors[str(product_id)] = (
+                        f"Price has changed to {prices[product_id]}."
+                    )
+            if errors:
+                raise serializers.ValidationError({"order_items": errors})
+
+            short = Product.objects.reserve_stock(quantities)
+            if short:
+                raise serializers.ValidationError(
+                    {"order_items": {str(pk): "Not enough stock." for pk in short}}
+                )
+
+            order = Order.objects.create(**validated_data)
+            reserved_at = timezone.now()
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product_id=item["product_id"],
+                        price_at_order=item["price_at_order"],
+                        quantity=item["quantity"],
+                        stock_reserved_at=reserved_at,
+                    )
+                    for item in items_data
+                ]
+            )
+
+            # Stock is updated in bulk, so no post_save evicts cached pages
+            transaction.on_commit(
+                lambda: invalidate_catalog_cache("product", list(quantities))
             )
         return order
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Flat order fields, for responses covering several orders at once"""
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "buyer",
+            "seller",
+            "base_amount",
+            "convenience_fee",
+            "delivery_fee",
+            "discount",
+            "total_amount",
+            "status",
+            "coupons",
+            "created_at",
+        ]
+
+
+class SalesRangeSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    seller = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        if attrs["end"] < attrs["start"]:
+            raise serializers.ValidationError(
+                {"end": "End date must not be before the start date."}
+            )
+        return attrs
+
+
+class SalesStatusSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class SalesSummarySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    total_orders = serializers.IntegerField()
+    total_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    by_status = serializers.DictField(child=SalesStatusSerializer())
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent with `changes`, a list of {"order_id", "buyer_id", "previous_status",
+# "new_status"}, and `changed_by` (a User or None) after order statuses
+# change, whether through Order.save() or a queryset update.
+order_status_changed = Signal()
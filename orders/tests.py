@@ -1,7 +1,23 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+from ecommerce.models import OutboxMessage
+from ecommerce.outbox import relay
+from ecommerce.tasks import generate_sales_analytics, rebuild_sales_rollup
 from users.models import User
-from orders.models import Order
+from notification.models import Notification
+from orders.models import Order, OrderItem, OrderStatusHistory, SalesRollup
+from orders.serializers import OrderSerializer
+from orders.views import OrderViewSet
+from product.models import Product
 
 
 class OrderSignalTests(TestCase):
@@ -12,22 +28,11 @@ class OrderSignalTests(TestCase):
         self.buyer = User.objects.create_user(
             fullname="buyer", email="buyer@example.com", password="testpass123"
         )
+        # Their welcome emails
+        OutboxMessage.objects.all().delete()
 
-    @patch("ecommerce.signals.send_websocket_notification.delay")
-    @patch("ecommerce.signals.send_order_notification_email.delay")
-    def test_order_creation_continues_despite_email_failure(
-        self, mock_email, mock_websocket
-    ):
-        """Test that WebSocket notification still works if email fails."""
-
-        # Mock email to raise exception
-        mock_email.side_effect = Exception("Email service down")
-
-        # Mock WebSocket to succeed
-        mock_websocket.return_value = MagicMock()
-
-        # Create order - this should succeed despite email failure
-        order = Order.objects.create(
+    def create_order(self):
+        return Order.objects.create(
             seller=self.seller,
             buyer=self.buyer,
             total_amount=100.00,
@@ -37,104 +42,349 @@ class OrderSignalTests(TestCase):
             status="created",
         )
 
-        # Verify order was created successfully
-        self.assertIsNotNone(order.id)
-        self.assertEqual(order.status, "created")
+    def queued(self, task):
+        return OutboxMessage.objects.filter(task=f"ecommerce.tasks.{task}")
 
-        # Verify email was attempted
-        mock_email.assert_called_once_with(order.id, "seller")
+    def test_new_order_queues_seller_notifications(self):
+        order = self.create_order()
 
-        # Verify WebSocket notification was still called despite email failure
-        mock_websocket.assert_called_once()
-
-        # Verify the WebSocket call has correct parameters
-        call_args = mock_websocket.call_args[0]
-        self.assertEqual(call_args[0], self.seller.id)  # seller ID
-
-        # Check the notification structure matches what's sent in the signal
-        notification_data = call_args[1]
+        email = self.queued("send_order_notification_email").get()
+        self.assertEqual(email.args, [str(order.id), "seller"])
+        recipient, notification_data = (
+            self.queued("send_websocket_notification").get().args
+        )
+        self.assertEqual(recipient, str(self.seller.id))
         self.assertEqual(notification_data["notification_type"], "order_new")
         self.assertEqual(notification_data["title"], "New Order Received!")
         self.assertIn(str(order.id), notification_data["message"])
-        self.assertEqual(notification_data["data"]["order_id"], str(order.id))
         self.assertEqual(notification_data["data"]["buyer_name"], self.buyer.fullname)
         self.assertEqual(
             notification_data["data"]["total_amount"], str(order.total_amount)
         )
 
-    @patch("ecommerce.signals.send_websocket_notification.delay")
-    @patch("ecommerce.signals.send_order_notification_email.delay")
-    def test_both_notifications_work_normally(self, mock_email, mock_websocket):
-        """Test that both notifications work when services are up."""
+    def test_order_status_update_notifications(self):
+        order = self.create_order()
+        OutboxMessage.objects.all().delete()
 
-        # Mock both to succeed
-        mock_email.return_value = MagicMock()
-        mock_websocket.return_value = MagicMock()
+        order.status = "processing"
+        order.save()
 
-        # Create order
-        order = Order.objects.create(
-            seller=self.seller,
-            buyer=self.buyer,
-            total_amount=100.00,
-            base_amount=90.00,
-            convenience_fee=5.00,
-            delivery_fee=5.00,
-            status="created",
+        email = self.queued("send_order_notification_email").get()
+        self.assertEqual(email.args, [str(order.id), "buyer"])
+        recipient, notification_data = (
+            self.queued("send_websocket_notification").get().args
         )
+        self.assertEqual(recipient, str(self.buyer.id))
+        self.assertEqual(notification_data["notification_type"], "order_update")
+        self.assertEqual(notification_data["title"], "Order Status Updated")
+        self.assertIn("processing", notification_data["message"].lower())
+        self.assertEqual(notification_data["data"]["new_status"], "processing")
 
-        # Verify both notifications were called
-        mock_email.assert_called_once_with(order.id, "seller")
-        mock_websocket.assert_called_once()
+    @patch("ecommerce.outbox.current_app.send_task")
+    @patch("celery.app.task.Task.apply_async")
+    def test_saves_make_no_broker_calls(self, mock_apply_async, mock_send_task):
+        User.objects.create_user(fullname="new", email="new@example.com")
+        order = self.create_order()
+        order.status = "confirmed"
+        order.save()
 
-        # Verify order creation succeeded
-        self.assertEqual(Order.objects.count(), 1)
-        self.assertEqual(order.status, "created")
+        mock_apply_async.assert_not_called()
+        mock_send_task.assert_not_called()
+        # Welcome email, then two notifications each for seller and buyer
+        self.assertEqual(OutboxMessage.objects.count(), 5)
 
-        # Verify WebSocket notification structure
-        call_args = mock_websocket.call_args[0]
-        notification_data = call_args[1]
-        self.assertEqual(notification_data["notification_type"], "order_new")
-        self.assertEqual(notification_data["title"], "New Order Received!")
+    @patch("ecommerce.outbox.current_app.send_task")
+    def test_rolled_back_orders_produce_no_notifications(self, mock_send_task):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                order = self.create_order()
+                order.status = "confirmed"
+                order.save()
+                raise RuntimeError("payment failed")
 
-    @patch("ecommerce.signals.send_websocket_notification.delay")
-    @patch("ecommerce.signals.send_order_notification_email.delay")
-    def test_order_status_update_notifications(self, mock_email, mock_websocket):
-        """Test that order status update notifications work correctly."""
+        self.assertEqual(relay(), 0)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+        mock_send_task.assert_not_called()
 
-        # Mock both to succeed
-        mock_email.return_value = MagicMock()
-        mock_websocket.return_value = MagicMock()
 
-        # Create order first
-        order = Order.objects.create(
-            seller=self.seller,
-            buyer=self.buyer,
-            total_amount=100.00,
-            base_amount=90.00,
-            convenience_fee=5.00,
-            delivery_fee=5.00,
-            status="created",
+class OrderCheckoutConcurrencyTests(TransactionTestCase):
+    """Parallel checkouts against a low-stock product must never oversell"""
+
+    CHECKOUTS = 24
+    STOCK = 5
+
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.seller = User(fullname="seller", email="seller@example.com")
+        self.buyers = [
+            User(fullname=f"buyer {i}", email=f"buyer{i}@example.com")
+            for i in range(self.CHECKOUTS)
+        ]
+        User.objects.bulk_create([self.seller, *self.buyers])
+        self.product = Product(
+            name="Limited sneakers",
+            desp="",
+            price=Decimal("50.00"),
+            stock=Decimal(self.STOCK),
+            owner=self.seller,
+        )
+        Product.objects.bulk_create([self.product])
+
+    def checkout(self, buyer, quantity=1):
+        serializer = OrderSerializer(
+            data={
+                "base_amount": "50.00",
+                "convenience_fee": "0.00",
+                "delivery_fee": "0.00",
+                "total_amount": "50.00",
+                "order_items": [
+                    {
+                        "product_id": str(self.product.id),
+                        "price_at_order": "50.00",
+                        "quantity": quantity,
+                    }
+                ],
+            }
         )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(buyer=buyer)
 
-        # Reset mocks after creation
-        mock_email.reset_mock()
-        mock_websocket.reset_mock()
+    def attempt(self, buyer, barrier):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    self.checkout(buyer)
+                    return "ordered"
+                except OperationalError:
+                    # SQLite's shared in-memory test database reports lock
+                    # contention instead of waiting; just try again.
+                    continue
+                except ValidationError:
+                    return "sold out"
+        finally:
+            connection.close()
 
-        # Update order status
-        order.status = "processing"
+    def test_parallel_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.CHECKOUTS)
+        with ThreadPoolExecutor(max_workers=self.CHECKOUTS) as pool:
+            outcomes = list(
+                pool.map(lambda buyer: self.attempt(buyer, barrier), self.buyers)
+            )
+
+        self.assertEqual(outcomes.count("ordered"), self.STOCK)
+        self.assertEqual(outcomes.count("sold out"), self.CHECKOUTS - self.STOCK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(OrderItem.objects.count(), self.STOCK)
+
+    def test_failed_checkout_rolls_back(self):
+        with self.assertRaises(ValidationError):
+            self.checkout(self.buyers[0], quantity=self.STOCK + 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.STOCK)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_stale_price_is_rejected(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("60.00"))
+
+        with self.assertRaises(ValidationError) as ctx:
+            self.checkout(self.buyers[0])
+
+        self.assertIn("Price has changed", str(ctx.exception.detail))
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.sellers = [
+            User(fullname=f"seller {i}", email=f"seller{i}@example.com", role="seller")
+            for i in range(2)
+        ]
+        self.admin = User(fullname="admin", email="admin@example.com", role="admin")
+        User.objects.bulk_create([*self.sellers, self.admin])
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+        def order(seller, total, status="created"):
+            return Order(
+                seller=seller,
+                base_amount=total,
+                convenience_fee=0,
+                delivery_fee=0,
+                total_amount=total,
+                status=status,
+            )
+
+        self.orders = [
+            order(self.sellers[0], Decimal("100.00")),
+            order(self.sellers[0], Decimal("50.00"), "completed"),
+            order(self.sellers[1], Decimal("30.00"), "completed"),
+            order(self.sellers[1], Decimal("20.00")),
+        ]
+        Order.objects.bulk_create(self.orders)
+        Order.objects.filter(pk=self.orders[3].pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        generate_sales_analytics()
+
+    def sales(self, user, **params):
+        params = {"start": self.yesterday, "end": self.today, **params}
+        request = APIRequestFactory().get("/api/orders/sales/", params)
+        force_authenticate(request, user=user)
+        view = OrderViewSet.as_view({"get": "sales"}, **OrderViewSet.sales.kwargs)
+        return view(request)
+
+    def test_rollup_totals_match_the_orders(self):
+        report = Notification.objects.get(user=self.admin).data
+        self.assertEqual(report["total_orders"], 3)
+        self.assertEqual(report["completed_orders"], 2)
+        self.assertEqual(report["total_revenue"], "180.00")
+        self.assertEqual(report["yesterday_orders"], 1)
+
+        with self.assertNumQueries(1):
+            response = self.sales(self.admin)
+        self.assertEqual(response.data["data"]["total_orders"], 4)
+        self.assertEqual(response.data["data"]["total_revenue"], "200.00")
+        self.assertEqual(
+            response.data["data"]["by_status"]["completed"],
+            {"orders": 2, "revenue": "80.00"},
+        )
+
+    def test_sellers_only_see_their_own_sales(self):
+        response = self.sales(self.sellers[1], seller=self.sellers[0].pk)
+        self.assertEqual(response.data["data"]["total_revenue"], "50.00")
+
+        response = self.sales(self.admin, seller=self.sellers[0].pk)
+        self.assertEqual(response.data["data"]["total_revenue"], "150.00")
+
+        buyer = User(fullname="buyer", email="buyer@example.com")
+        User.objects.bulk_create([buyer])
+        self.assertEqual(self.sales(buyer).status_code, 403)
+
+    def test_changed_and_deleted_orders_are_rolled_up_again(self):
+        order = self.orders[0]
+        order.refresh_from_db()
+        order.status = "completed"
         order.save()
+        generate_sales_analytics()
+        completed = SalesRollup.objects.get(
+            date=self.today, seller=self.sellers[0], status="completed"
+        )
+        self.assertEqual(completed.order_count, 2)
+        self.assertFalse(
+            SalesRollup.objects.filter(status="created")
+            .exclude(date=self.yesterday)
+            .exists()
+        )
 
-        # Verify buyer was notified about status change
-        mock_email.assert_called_once_with(order.id, "buyer")
-        mock_websocket.assert_called_once()
+        Order.objects.get(pk=self.orders[2].pk).delete()
+        queued = OutboxMessage.objects.get(task=rebuild_sales_rollup.name)
+        self.assertEqual(
+            rebuild_sales_rollup(*queued.args), "Rebuilt 0 sales rollup rows"
+        )
+        response = self.sales(self.admin, start=self.today)
+        self.assertEqual(response.data["data"]["total_revenue"], "150.00")
 
-        # Verify WebSocket notification for status update
-        call_args = mock_websocket.call_args[0]
-        self.assertEqual(call_args[0], self.buyer.id)  # buyer ID
+    def test_rebuild_query_does_not_grow_with_the_groups(self):
+        # One condition per group used to exceed SQLite's expression depth
+        groups = [
+            (self.today - timedelta(days=day), seller.pk)
+            for day in range(1000)
+            for seller in self.sellers
+        ]
+        SalesRollup.objects.all().delete()
 
-        notification_data = call_args[1]
-        self.assertEqual(notification_data["notification_type"], "order_update")
-        self.assertEqual(notification_data["title"], "Order Status Updated")
-        self.assertIn("processing", notification_data["message"].lower())
-        self.assertEqual(notification_data["data"]["order_id"], str(order.id))
-        self.assertEqual(notification_data["data"]["new_status"], "processing")
+        self.assertEqual(SalesRollup.objects.rebuild(groups), 4)
+        self.assertEqual(
+            sorted(SalesRollup.objects.values_list("order_count", flat=True)),
+            [1, 1, 1, 1],
+        )
+
+        # Groups outside the list keep their rows, even inside its day range
+        self.assertEqual(SalesRollup.objects.rebuild(groups[:1]), 2)
+        self.assertEqual(SalesRollup.objects.count(), 4)
+
+
+class OrderStatusTrackingTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.admin = User(
+            fullname="admin",
+            email="admin@example.com",
+            role="admin",
+            is_staff=True,
+            is_superuser=True,
+        )
+        self.buyer = User(fullname="buyer", email="buyer@example.com")
+        self.seller = User(fullname="seller", email="seller@example.com")
+        User.objects.bulk_create([self.admin, self.buyer, self.seller])
+        self.orders = [
+            Order(
+                buyer=self.buyer,
+                seller=self.seller,
+                base_amount=Decimal("10.00"),
+                convenience_fee=0,
+                delivery_fee=0,
+                total_amount=Decimal("10.00"),
+            )
+            for _ in range(3)
+        ]
+        Order.objects.bulk_create(self.orders)
+
+    def change_status(self, order, status):
+        request = APIRequestFactory().patch(
+            f"/api/orders/{order.pk}/change-status/", {"status": status}
+        )
+        force_authenticate(request, user=self.admin)
+        view = OrderViewSet.as_view(
+            {"patch": "change_status"}, **OrderViewSet.change_status.kwargs
+        )
+        return view(request, pk=order.pk)
+
+    def test_change_status_reads_the_order_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.change_status(self.orders[0], "confirmed")
+
+        self.assertEqual(response.status_code, 200)
+        order_reads = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and 'FROM "orders_order"' in query["sql"]
+        ]
+        self.assertEqual(len(order_reads), 1)
+        # Order, items, update, history, outbox, and groups/permissions of
+        # both users
+        self.assertEqual(len(queries), 9)
+        history = OrderStatusHistory.objects.get(order=self.orders[0])
+        self.assertEqual(
+            (history.previous_status, history.new_status), ("created", "confirmed")
+        )
+        self.assertEqual(
+            OutboxMessage.objects.get(key__endswith=":email").args,
+            [str(self.orders[0].pk), "buyer"],
+        )
+
+    def test_saving_without_a_status_change_notifies_nobody(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.invoice = "https://example.com/invoice.pdf"
+        with self.assertNumQueries(1):
+            order.save()
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_queryset_updates_are_tracked(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(status="confirmed")
+
+        updated = Order.objects.filter(status="created").update(status="confirmed")
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            OrderStatusHistory.objects.filter(previous_status="created").count(), 3
+        )
+        self.assertEqual(OutboxMessage.objects.count(), 6)
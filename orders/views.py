@@ -3,9 +3,14 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
-from orders.models import Order
-from orders.serializers import OrderSerializer
+from orders.models import Order, SalesRollup
+from orders.serializers import (
+    OrderSerializer,
+    SalesRangeSerializer,
+    SalesSummarySerializer,
+)
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from ecommerce.utils.views import ReplicaReadMixin
 
 
 class IsBuyerOrSellerOrAdmin(BasePermission):
@@ -21,9 +26,19 @@ class IsBuyerOrSellerOrAdmin(BasePermission):
         )
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+def is_admin(user):
+    return user.is_superuser or user.role in ("admin", "superadmin")
+
+
+class IsSellerOrAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.role == "seller" or is_admin(request.user)
+
+
+class OrderViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsBuyerOrSellerOrAdmin]
+    replica_actions = ("list", "retrieve", "sales")
 
     queryset = (
         Order.objects.all()
@@ -110,3 +125,27 @@ class OrderViewSet(viewsets.ModelViewSet):
                 "data": OrderSerializer(order, context={"request": request}).data,
             }
         )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAuthenticated, IsSellerOrAdmin],
+    )
+    def sales(self, request):
+        """
+        Orders and revenue per status between `start` and `end`, read from
+        the sales rollup. Sellers see their own sales; admins see everyone's,
+        or one seller's with `seller`.
+        """
+        serializer = SalesRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        rollups = SalesRollup.objects.all()
+        if not is_admin(request.user):
+            rollups = rollups.filter(seller=request.user)
+        elif "seller" in params:
+            rollups = rollups.filter(seller_id=params["seller"])
+
+        summary = rollups.summary(params["start"], params["end"])
+        return Response({"success": True, "data": SalesSummarySerializer(summary).data})
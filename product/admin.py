@@ -7,6 +7,7 @@ from .models import (
     size,
     brand_category,
     processedProductMedia,
+    stockAlert,
 )
 
 
@@ -149,6 +150,11 @@ class BrandCategoryAdmin(admin.ModelAdmin):
     search_fields = ("brand", "category")
 
 
+class StockAlertRuleAdmin(admin.ModelAdmin):
+    list_display = ("id", "owner", "product", "category", "threshold")
+    list_filter = ("owner",)
+
+
 admin.site.register(product.Product, ProductAdmin)
 admin.site.register(productMedia.ProductMedia, ProductMediaAdmin)
 admin.site.register(category.Category, CategoryAdmin)
@@ -156,3 +162,4 @@ admin.site.register(brand.Brand, BrandAdmin)
 admin.site.register(size.Size, SizeAdmin)
 admin.site.register(brand_category.BrandCategory, BrandCategoryAdmin)
 admin.site.register(processedProductMedia.ProcessedProductMedia)
+admin.site.register(stockAlert.StockAlertRule, StockAlertRuleAdmin)
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "catalog"
+STATS = ("hits", "misses", "evictions")
+
+# Which cached namespaces embed data from each model. A change to the model
+# evicts its own list pages and the given object's detail page; a change that
+# shows up nested inside other namespaces evicts those wholesale.
+DEPENDENTS = {
+    "product": [],
+    "brand": ["product", "size", "brand_category"],
+    "category": ["category", "product", "size", "brand_category", "brand"],
+    "size": ["product", "brand", "category"],
+    # Category lists filter on brand links (has_brands)
+    "brand_category": ["brand", "category"],
+}
+
+
+def get_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+def _version_key(namespace, scope):
+    return f"{CACHE_PREFIX}:{namespace}:v:{scope}"
+
+
+def _object_scope(pk):
+    # URL kwargs and model instances spell the same UUID differently
+    try:
+        return f"obj:{uuid.UUID(str(pk))}"
+    except ValueError:
+        return f"obj:{pk}"
+
+
+def _stat_key(name):
+    return f"{CACHE_PREFIX}:stats:{name}"
+
+
+def _get_versions(keys):
+    """Fetch version tokens, seeding any that are missing or were evicted"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+    _incr_stat("evictions", len(keys))
+
+
+def _incr_stat(name, delta=1):
+    key = _stat_key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def build_cache_key(namespace, request, pk=None):
+    if pk is None:
+        versions = _get_versions([_version_key(namespace, "list")])
+    else:
+        versions = _get_versions(
+            [
+                _version_key(namespace, "deps"),
+                _version_key(namespace, _object_scope(pk)),
+            ]
+        )
+
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in sorted(request.query_params.getlist(key))
+    )
+    raw = repr((request.get_host(), request.path, params, versions))
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"{CACHE_PREFIX}:{namespace}:r:{digest}"
+
+
+def cache_response(namespace):
+    """
+    Read-through cache for public list/retrieve handlers.
+
+    Responses are keyed on host + path + normalized query params and on the
+    namespace version tokens, so invalidation is a version bump rather than a
+    key scan. Cache errors never fail the request; the view simply runs.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            try:
+                key = build_cache_key(namespace, request, kwargs.get("pk"))
+                cached = cache.get(key)
+            except Exception as e:
+                logger.error(f"Catalog cache unavailable for {namespace}: {str(e)}")
+                return func(self, request, *args, **kwargs)
+
+            if cached is not None:
+                try:
+                    _incr_stat("hits")
+                except Exception as e:
+                    logger.error(f"Failed to record catalog cache hit: {str(e)}")
+                data, status_code = cached
+                return Response(data, status=status_code)
+
+            response = func(self, request, *args, **kwargs)
+            try:
+                _incr_stat("misses")
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, (response.data, response.status_code), get_timeout())
+            except Exception as e:
+                logger.error(f"Failed to cache {namespace} response: {str(e)}")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(namespace, pk=None):
+    """Evict cached pages after an object in `namespace` changed"""
+    invalidate_many(namespace, [] if pk is None else [pk])
+
+
+def invalidate_many(namespace, pks):
+    """Evict cached pages after several objects in `namespace` changed at once"""
+    keys = [_version_key(namespace, "list")]
+    keys.extend(_version_key(namespace, _object_scope(pk)) for pk in pks)
+    for dependent in DEPENDENTS.get(namespace, []):
+        keys.append(_version_key(dependent, "list"))
+        keys.append(_version_key(dependent, "deps"))
+
+    try:
+        _bump(list(dict.fromkeys(keys)))
+    except Exception as e:
+        logger.error(f"Failed to invalidate catalog cache for {namespace}: {str(e)}")
+
+
+def get_stats():
+    values = cache.get_many([_stat_key(name) for name in STATS])
+    stats = {name: values.get(_stat_key(name), 0) for name in STATS}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,121 @@
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+# Upper bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [25, 50, 100, 250, 500]
+
+
+def get_price_buckets():
+    bounds = getattr(settings, "PRODUCT_PRICE_FACET_BUCKETS", PRICE_BUCKETS)
+    bounds = [Decimal(str(bound)) for bound in sorted(bounds)]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def _bucket_key(low, high):
+    if low is None:
+        return f"*-{high}"
+    if high is None:
+        return f"{low}-*"
+    return f"{low}-{high}"
+
+
+def _grouped(queryset, id_field, name_field):
+    rows = (
+        queryset.order_by()
+        .filter(**{f"{id_field}__isnull": False})
+        .values(id_field, name_field)
+        .annotate(count=Count("id"))
+        .order_by("-count", name_field)
+    )
+    return [
+        {"id": row[id_field], "name": row[name_field], "count": row["count"]}
+        for row in rows
+    ]
+
+
+def brand_facet(queryset):
+    return _grouped(queryset, "brand_id", "brand__name")
+
+
+def size_facet(queryset):
+    return _grouped(queryset, "size_id", "size__name")
+
+
+def category_facet(queryset):
+    """
+    Product counts per category, rolled up so every ancestor also counts the
+    products of its subtree. Uses the materialized path, so one grouped query
+    covers the whole tree.
+    """
+    rows = (
+        queryset.order_by()
+        .filter(category__isnull=False)
+        .values("category__path", "category__path_names")
+        .annotate(count=Count("id"))
+    )
+
+    nodes = {}
+    for row in rows:
+        ids = [part for part in row["category__path"].split("/") if part]
+        names = row["category__path_names"] or []
+        parent = None
+        for depth, (node_id, name) in enumerate(zip(ids, names)):
+            node = nodes.setdefault(
+                node_id,
+                {
+                    "id": uuid.UUID(node_id),
+                    "name": name,
+                    "parent": parent and uuid.UUID(parent),
+                    "depth": depth,
+                    "count": 0,
+                },
+            )
+            node["count"] += row["count"]
+            parent = node_id
+
+    return sorted(nodes.values(), key=lambda node: (node["depth"], -node["count"]))
+
+
+def price_facet(queryset):
+    buckets = get_price_buckets()
+    aggregates = {}
+    for index, (low, high) in enumerate(buckets):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f"bucket_{index}"] = Count("id", filter=condition)
+
+    totals = queryset.order_by().aggregate(**aggregates)
+    return [
+        {
+            "key": _bucket_key(low, high),
+            "min": low if low is None else str(low),
+            "max": high if high is None else str(high),
+            "count": totals[f"bucket_{index}"],
+        }
+        for index, (low, high) in enumerate(buckets)
+    ]
+
+
+FACETS = {
+    "brand": brand_facet,
+    "category": category_facet,
+    "size": size_facet,
+    "price": price_facet,
+}
+
+
+def compute_facets(queryset, names=None):
+    """
+    Facet counts over the filtered (unpaginated) queryset, one grouped query
+    per facet.
+    """
+    names = names or list(FACETS)
+    return {name: FACETS[name](queryset) for name in names if name in FACETS}
@@ -58,13 +58,7 @@ class CategoryFilter(django_filters.FilterSet):
         return queryset.filter(category_brands__isnull=True)
 
     def filter_by_level(self, queryset, name, value):
-        # This is a simplified level filter - you might need to adjust based on your needs
-        if value == 0:
-            return queryset.filter(parent__isnull=True)
-        elif value == 1:
-            return queryset.filter(parent__isnull=False, parent__parent__isnull=True)
-        # Add more levels as needed
-        return queryset
+        return queryset.filter(depth=value)
 
 
 class SizeFilter(django_filters.FilterSet):
@@ -94,6 +88,11 @@ class SizeFilter(django_filters.FilterSet):
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
+    # Exact id filters hit the foreign key indexes; prefer them over the
+    # name lookups below, which scan the joined tables.
+    brand_id = django_filters.UUIDFilter(field_name="brand_id")
+    category_id = django_filters.UUIDFilter(method="filter_by_category_id")
+    size_id = django_filters.UUIDFilter(field_name="size_id")
     brand = django_filters.CharFilter(field_name="brand__name", lookup_expr="icontains")
     category = django_filters.CharFilter(
         field_name="category__name", lookup_expr="icontains"
@@ -102,4 +101,21 @@ class ProductFilter(django_filters.FilterSet):
 
     class Meta:
         model = Product
-        fields = ["brand", "category", "size", "is_archived"]
+        fields = [
+            "brand_id",
+            "category_id",
+            "size_id",
+            "brand",
+            "category",
+            "size",
+            "is_archived",
+        ]
+
+    def filter_by_category_id(self, queryset, name, value):
+        """Products in the category or anywhere below it"""
+        category = Category.objects.filter(pk=value).only("id", "path").first()
+        if category is None:
+            return queryset.none()
+        return queryset.filter(
+            category_id__in=category.get_descendants(include_self=True).values("id")
+        )
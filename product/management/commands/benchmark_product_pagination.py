@@ -0,0 +1,119 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APIRequestFactory
+
+from product.models import Brand, Category, Product
+from product.views import ProductViewSet
+from users.models import User
+
+
+class OffsetProductViewSet(ProductViewSet):
+    pagination_class = LimitOffsetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+# Measure the views themselves, not the catalog response cache
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = "Compare keyset and OFFSET pagination latency on the product list"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--deep-page", type=int, default=500)
+        parser.add_argument("--runs", type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Everything is seeded inside a transaction that is rolled back at the
+        # end, so the benchmark never leaves fixture rows behind.
+        try:
+            with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+                self.seed(options["products"])
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        self.stdout.write(f"Seeding {count} products...")
+        owner = User(
+            fullname="Benchmark Seller",
+            email=f"bench-{uuid.uuid4().hex}@example.com",
+            role="seller",
+        )
+        User.objects.bulk_create([owner])
+        brand = Brand(name=f"bench-{uuid.uuid4().hex[:8]}")
+        Brand.objects.bulk_create([brand])
+        category = Category(name="bench", slug=f"bench-{uuid.uuid4().hex}")
+        Category.objects.bulk_create([category])
+
+        batch = []
+        for i in range(count):
+            batch.append(
+                Product(
+                    name=f"Product {i}",
+                    desp="benchmark",
+                    price=Decimal(i % 5000) + Decimal("0.99"),
+                    stock=Decimal(i % 300),
+                    brand=brand,
+                    category=category,
+                    owner=owner,
+                )
+            )
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+    def run(self, options):
+        factory = APIRequestFactory()
+        page_size = options["page_size"]
+        deep_page = options["deep_page"]
+        runs = options["runs"]
+
+        keyset_view = ProductViewSet.as_view({"get": "list"})
+        offset_view = OffsetProductViewSet.as_view({"get": "list"})
+
+        # Walk forward once to obtain the cursor that opens the deep page.
+        deep_cursor_url = f"/api/products/?page_size={page_size}"
+        for _ in range(deep_page - 1):
+            response = keyset_view(factory.get(deep_cursor_url))
+            deep_cursor_url = response.data["data"]["next"]
+
+        scenarios = [
+            ("keyset", 1, keyset_view, f"/api/products/?page_size={page_size}"),
+            ("keyset", deep_page, keyset_view, deep_cursor_url),
+            ("offset", 1, offset_view, f"/api/products/?limit={page_size}"),
+            (
+                "offset",
+                deep_page,
+                offset_view,
+                f"/api/products/?limit={page_size}"
+                f"&offset={(deep_page - 1) * page_size}",
+            ),
+        ]
+
+        for name, page, view, url in scenarios:
+            timings = []
+            for _ in range(runs):
+                request = factory.get(url)
+                start = time.perf_counter()
+                view(request)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{name:<7} page {page:<5} p50={p50:8.2f}ms p99={p99:8.2f}ms"
+            )
@@ -0,0 +1,119 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework import filters
+from rest_framework.test import APIRequestFactory
+
+from product.models import Brand, Category, Product
+from product.search import get_search_backend
+from product.views import ProductViewSet
+from users.models import User
+
+ADJECTIVES = ["classic", "slim", "vintage", "running", "leather", "cotton", "wool"]
+NOUNS = ["sneakers", "jacket", "shirt", "jeans", "boots", "hoodie", "watch", "bag"]
+QUERIES = ["sneakers", "slim jac", "leather boots", "vint", "acme", "zzzz"]
+
+
+class LikeProductViewSet(ProductViewSet):
+    """The previous icontains SearchFilter setup, for comparison"""
+
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+
+
+class Rollback(Exception):
+    pass
+
+
+# Measure the views themselves, not the catalog response cache
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = "Compare icontains SearchFilter and the full-text index on products"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000000)
+        parser.add_argument("--runs", type=int, default=20)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("No search backend is available for this database")
+
+        # Seeded rows and index entries are rolled back at the end.
+        try:
+            with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+                self.seed(options["products"])
+                start = time.perf_counter()
+                backend.rebuild()
+                self.stdout.write(f"Indexed in {time.perf_counter() - start:.1f}s")
+                self.run(options["runs"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        self.stdout.write(f"Seeding {count} products...")
+        rng = random.Random(42)
+        owners = [
+            User(
+                fullname=f"Seller {i}",
+                email=f"bench-{uuid.uuid4().hex}@example.com",
+                role="seller",
+            )
+            for i in range(20)
+        ]
+        User.objects.bulk_create(owners)
+        brands = [Brand(name=f"acme-{uuid.uuid4().hex[:8]}") for _ in range(200)]
+        Brand.objects.bulk_create(brands)
+        categories = [
+            Category(name=noun, slug=f"bench-{uuid.uuid4().hex}") for noun in NOUNS
+        ]
+        Category.objects.bulk_create(categories)
+
+        batch = []
+        for i in range(count):
+            batch.append(
+                Product(
+                    name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                    desp="benchmark",
+                    price=Decimal(rng.randint(100, 9999)),
+                    stock=Decimal(rng.randint(0, 300)),
+                    brand=rng.choice(brands),
+                    category=rng.choice(categories),
+                    owner=rng.choice(owners),
+                )
+            )
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+    def run(self, runs):
+        factory = APIRequestFactory()
+        views = [
+            ("icontains", LikeProductViewSet.as_view({"get": "list"})),
+            ("fulltext", ProductViewSet.as_view({"get": "list"})),
+        ]
+
+        for query in QUERIES:
+            for name, view in views:
+                timings = []
+                for _ in range(runs):
+                    request = factory.get(
+                        "/api/products/", {"search": query, "page_size": 20}
+                    )
+                    start = time.perf_counter()
+                    view(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                p50 = timings[len(timings) // 2]
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(
+                    f"{query!r:<16} {name:<9} p50={p50:9.2f}ms p99={p99:9.2f}ms"
+                )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from product.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute every category's materialized path from its parent links"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuilt = Category.objects.rebuild_paths()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} category paths"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from product.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from scratch"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("No search backend is available for this database")
+
+        with transaction.atomic():
+            backend.create_schema()
+            backend.rebuild()
+
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt"))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Category = apps.get_model("product", "Category")
+    categories = list(Category.objects.all())
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    stack = [(node, None) for node in children.get(None, [])]
+    while stack:
+        node, parent = stack.pop()
+        if parent is None:
+            node.path, node.depth, node.path_names = f"{node.id.hex}/", 0, [node.name]
+        else:
+            node.path = f"{parent.path}{node.id.hex}/"
+            node.depth = parent.depth + 1
+            node.path_names = parent.path_names + [node.name]
+        stack.extend((child, node) for child in children.get(node.id, []))
+
+    Category.objects.bulk_update(
+        categories, ["path", "depth", "path_names"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0005_product_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                db_index=True, default=0, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=1000
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path_names",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from product.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection, apps=apps)
+    if backend is not None:
+        backend.create_schema()
+        backend.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    from product.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection, apps=apps)
+    if backend is not None:
+        backend.drop_schema()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0006_category_materialized_path"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0007_product_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_archived", False)),
+                fields=["stock"],
+                name="product_live_stock_idx",
+            ),
+        ),
+    ]
@@ -5,3 +5,4 @@ from .category import Category
 from .productMedia import ProductMedia
 from .size import Size
 from .processedProductMedia import ProcessedProductMedia
+from .stockAlert import StockAlert, StockAlertRule
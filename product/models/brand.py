@@ -1,5 +1,15 @@
 from ecommerce.utils.models import UUID, TimeStampModel
 from django.db import models
+from django.db.models import Count
+
+
+class BrandQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate the counts BrandListSerializer would otherwise query per row"""
+        return self.annotate(
+            categories_total=Count("brand_categories", distinct=True),
+            sizes_total=Count("sizes", distinct=True),
+        )
 
 
 class Brand(UUID, TimeStampModel):
@@ -7,6 +17,8 @@ class Brand(UUID, TimeStampModel):
     logo = models.URLField(blank=True, null=True)
     website = models.URLField(blank=True, null=True)
 
+    objects = BrandQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -1,19 +1,64 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count
 from django.utils.text import slugify
 from ecommerce.utils.models import UUID, TimeStampModel
 
 
+class CategoryQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate the counts CategoryListSerializer would otherwise query per row"""
+        return self.annotate(
+            children_total=Count("children", distinct=True),
+            sizes_total=Count("sizes", distinct=True),
+        )
+
+    def rebuild_paths(self):
+        """
+        Recompute path, depth and path_names of every category from the
+        parent links, for rows written without save() (bulk_create, fixtures,
+        update()). Returns the number of categories rewritten.
+        """
+        categories = list(self.model.objects.order_by())
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+
+        stack = [(node, None) for node in children.get(None, [])]
+        while stack:
+            node, parent = stack.pop()
+            node.path, node.depth, node.path_names = node._build_path(parent)
+            stack.extend((child, node) for child in children.get(node.id, []))
+
+        self.model.objects.bulk_update(
+            categories, ["path", "depth", "path_names"], batch_size=500
+        )
+        return len(categories)
+
+
 class Category(UUID, TimeStampModel):
+    PATH_SEPARATOR = "/"
+
     name = models.CharField(max_length=50)
     parent = models.ForeignKey(
         "self", on_delete=models.CASCADE, related_name="children", blank=True, null=True
     )
     slug = models.SlugField(max_length=500, unique=True, blank=True)
+    # Materialized path: hex ids from the root down to (and including) this
+    # node, e.g. "<root>/<child>/". Descendants share it as a prefix.
+    path = models.CharField(max_length=1000, db_index=True, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    path_names = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.slug
 
     def get_ancestor_names(self):
+        if self.path_names:
+            return list(self.path_names)
+
         names = []
         current = self
         while current:
@@ -21,11 +66,85 @@ class Category(UUID, TimeStampModel):
             current = current.parent
         return names
 
+    def get_ancestor_ids(self):
+        return [part for part in self.path.split(self.PATH_SEPARATOR) if part][:-1]
+
+    def get_ancestors(self):
+        """Ancestors from the root down, fetched in a single query."""
+        return Category.objects.filter(id__in=self.get_ancestor_ids()).order_by("depth")
+
+    def get_descendants(self, include_self=False):
+        """Whole subtree below this node, fetched in a single query."""
+        if self.path:
+            queryset = Category.objects.filter(path__startswith=self.path)
+        else:
+            # An empty prefix would match every category: walk the parent
+            # links instead until rebuild_category_paths repairs the row.
+            queryset = Category.objects.filter(
+                pk__in=[self.pk, *self._walk_descendant_ids()]
+            )
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def _walk_descendant_ids(self):
+        ids, seen, level = [], {self.pk}, [self.pk]
+        while level:
+            level = [
+                pk
+                for pk in Category.objects.filter(parent_id__in=level).values_list(
+                    "id", flat=True
+                )
+                if pk not in seen
+            ]
+            seen.update(level)
+            ids.extend(level)
+        return ids
+
+    def _build_path(self, parent):
+        node = f"{self.id.hex}{self.PATH_SEPARATOR}"
+        if parent is None:
+            return node, 0, [self.name]
+        return parent.path + node, parent.depth + 1, parent.path_names + [self.name]
+
+    def _build_slug(self):
+        return "/".join(slugify(name) for name in self.path_names)
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            full_path = "/".join([slugify(name) for name in self.get_ancestor_names()])
-            self.slug = full_path
-        super().save(*args, **kwargs)
+        old_path = self.path
+        old_names = list(self.path_names or [])
+
+        parent = self.parent
+        if parent is not None and parent.path and self.path:
+            if parent.path.startswith(self.path):
+                raise ValidationError("A category cannot be moved under itself.")
+
+        self.path, self.depth, self.path_names = self._build_path(parent)
+        if not self.slug or (old_names and old_names != self.path_names):
+            self.slug = self._build_slug()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and (old_path != self.path or old_names != self.path_names):
+                self._rewrite_descendants(old_path)
+
+    def _rewrite_descendants(self, old_path):
+        """Re-root the subtree after a move or rename, including slugs."""
+        descendants = list(
+            Category.objects.filter(path__startswith=old_path)
+            .exclude(pk=self.pk)
+            .order_by("depth")
+        )
+        nodes = {self.pk: self}
+        for node in descendants:
+            parent = nodes[node.parent_id]
+            node.path, node.depth, node.path_names = node._build_path(parent)
+            node.slug = node._build_slug()
+            nodes[node.pk] = node
+
+        Category.objects.bulk_update(
+            descendants, ["path", "depth", "path_names", "slug"], batch_size=500
+        )
 
     class Meta:
         verbose_name_plural = "categories"
@@ -1,12 +1,53 @@
 from django.db import models
-from ecommerce.utils.models import UUID, TimeStampModel
+from django.db.models import F
+from django.utils import timezone
+from ecommerce.utils.models import UUID, TimeStampModel, TrackedFieldsModel
+from product.signals import stock_changed
 from .category import Category
 from .brand import Brand
 from .size import Size
 from users.models import User
 
 
-class Product(UUID, TimeStampModel):
+class ProductQuerySet(models.QuerySet):
+    def reserve_stock(self, quantities):
+        """
+        Take {product_id: quantity} out of stock with one conditional UPDATE
+        per product, so stock can never go negative. Rows are locked in id
+        order, which keeps concurrent checkouts from deadlocking. Returns the
+        ids that did not have enough stock; the caller must roll back then.
+        """
+        short = []
+        reserved = []
+        changed_at = timezone.now()
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            updated = self.filter(
+                pk=product_id, is_archived=False, stock__gte=quantity
+            ).update(stock=F("stock") - quantity, updated_at=changed_at)
+            if updated:
+                reserved.append(product_id)
+            else:
+                short.append(product_id)
+        if reserved:
+            stock_changed.send(sender=self.model, product_ids=reserved)
+        return short
+
+    def release_stock(self, quantities):
+        """Put {product_id: quantity} back into stock, locking in id order"""
+        released = []
+        changed_at = timezone.now()
+        for product_id in sorted(quantities):
+            if self.filter(pk=product_id).update(
+                stock=F("stock") + quantities[product_id], updated_at=changed_at
+            ):
+                released.append(product_id)
+        if released:
+            stock_changed.send(sender=self.model, product_ids=released)
+        return released
+
+
+class Product(TrackedFieldsModel, UUID, TimeStampModel):
     name = models.CharField(max_length=200)
     desp = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -27,8 +68,27 @@ class Product(UUID, TimeStampModel):
     is_archived = models.BooleanField(default=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="products")
 
+    # Cart totals and stock events react to changes of these on save
+    TRACKED_FIELDS = ("price", "stock")
+
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}-{self.owner.fullname}"
 
     class Meta:
         ordering = ["created_at", "name"]
+        indexes = [
+            # Composite keys backing KeysetPagination for each ordering field
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["stock", "id"], name="product_stock_id_idx"),
+            # Stock sweeps (low stock alerts, archiving) skip archived products
+            models.Index(
+                fields=["stock"],
+                condition=models.Q(is_archived=False),
+                name="product_live_stock_idx",
+            ),
+            # Stock reconciliation picks up products changed since its last run
+            models.Index(fields=["updated_at"], name="product_updated_idx"),
+        ]
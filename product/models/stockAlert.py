@@ -0,0 +1,71 @@
+from django.db import models
+from ecommerce.utils.models import UUID, TimeStampModel
+from .category import Category
+from .product import Product
+from users.models import User
+
+
+class StockAlertRule(UUID, TimeStampModel):
+    """
+    A seller's low stock threshold for one product, or for every product of
+    theirs in a category and its subcategories. The product rule wins over
+    category rules, and the nearest category over its ancestors.
+    """
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="stock_alert_rules"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="stock_alert_rules",
+        null=True,
+        blank=True,
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="stock_alert_rules",
+        null=True,
+        blank=True,
+    )
+    threshold = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product or self.category} <= {self.threshold}"
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(product__isnull=False, category__isnull=True)
+                | models.Q(product__isnull=True, category__isnull=False),
+                name="stockalertrule_product_xor_category",
+            ),
+            models.UniqueConstraint(
+                fields=["owner", "product"],
+                condition=models.Q(product__isnull=False),
+                name="stockalertrule_owner_product_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["owner", "category"],
+                condition=models.Q(category__isnull=False),
+                name="stockalertrule_owner_category_uniq",
+            ),
+        ]
+
+
+class StockAlert(UUID, TimeStampModel):
+    """
+    A product its seller has been alerted about: its stock fell to the
+    threshold and has not risen above it since. Removed once it recovers, so
+    the next fall alerts again.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, related_name="stock_alert"
+    )
+    stock = models.DecimalField(max_digits=10, decimal_places=2)
+    threshold = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_id} at {self.stock} <= {self.threshold}"
@@ -0,0 +1,232 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+Cursor = namedtuple("Cursor", ["values", "reverse"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a composite ordering.
+
+    The ordering applied by OrderingFilter is extended with a unique
+    tiebreaker so every row has a stable position, and each page is fetched
+    with a `WHERE (ordering) > (last row)` predicate instead of an OFFSET.
+    Deep pages therefore cost the same as the first one as long as an index
+    covers the ordering columns.
+
+    Pagination is opt-in: it only kicks in when the client sends `cursor` or
+    `page_size`, so existing callers keep receiving the full list.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    tiebreaker = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = self.invert(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor:
+            queryset = queryset.filter(
+                self.build_seek_filter(queryset.model, ordering, self.cursor.values)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Return the queryset ordering with the tiebreaker appended.
+
+        The tiebreaker follows the direction of the leading column so a single
+        composite index can serve both ascending and descending scans.
+        """
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        ordering = [field for field in ordering if isinstance(field, str)]
+        if not ordering:
+            ordering = ["-created_at"]
+
+        names = [field.lstrip("-") for field in ordering]
+        for name in names:
+            if "__" in name or name == "?":
+                raise NotFound(f"Ordering by '{name}' is not supported here")
+
+        if self.tiebreaker not in names:
+            prefix = "-" if ordering[0].startswith("-") else ""
+            ordering.append(f"{prefix}{self.tiebreaker}")
+        return ordering
+
+    def invert(self, ordering):
+        return [
+            field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+        ]
+
+    def build_seek_filter(self, model, ordering, values):
+        """
+        Expand `(a, b, c) > (x, y, z)` into the equivalent OR-of-ANDs so that
+        mixed ascending/descending orderings are supported.
+        """
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        names = [field.lstrip("-") for field in ordering]
+        try:
+            values = [
+                self.parse_value(model, name, value)
+                for name, value in zip(names, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        seek = Q()
+        for index, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            conditions = dict(zip(names[:index], values[:index]))
+            conditions[f"{names[index]}__{lookup}"] = values[index]
+            seek |= Q(**conditions)
+        return seek
+
+    def parse_value(self, model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations (e.g. a search rank) are plain JSON scalars
+            return value
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            return Cursor(values=list(payload["v"]), reverse=bool(payload["r"]))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        payload = json.dumps(
+            {
+                "v": [self.serialize_value(value) for value in cursor.values],
+                "r": cursor.reverse,
+            },
+            separators=(",", ":"),
+        )
+        encoded = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def serialize_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (Decimal, UUID)):
+            return str(value)
+        return value
+
+    def get_position(self, instance):
+        return [getattr(instance, field.lstrip("-")) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked backwards past the first row; restart from the top.
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(
+            Cursor(values=self.get_position(self.page[-1]), reverse=False)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(Cursor(values=self.cursor.values, reverse=True))
+        return self.encode_cursor(
+            Cursor(values=self.get_position(self.page[0]), reverse=True)
+        )
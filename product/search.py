@@ -0,0 +1,316 @@
+import logging
+import re
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import IntegerField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def get_search_terms(text):
+    """Split user input into plain word tokens, dropping query syntax"""
+    return [term.lower() for term in TERM_RE.findall(text or "")][:10]
+
+
+class BaseSearchBackend:
+    """
+    Keeps a denormalized search document per product (name, brand, category
+    and owner name) in a backend-specific table and answers ranked, prefix
+    matching queries against it.
+
+    Models are looked up through `apps`, so migrations can pass their
+    historical app registry instead of the live models.
+    """
+
+    table = "product_search"
+
+    def __init__(self, connection, apps=None):
+        self.connection = connection
+        self.apps = apps or global_apps
+
+    @property
+    def product_model(self):
+        return self.apps.get_model("product", "Product")
+
+    @property
+    def tables(self):
+        return {
+            "product": self.product_model._meta.db_table,
+            "brand": self.apps.get_model("product", "Brand")._meta.db_table,
+            "category": self.apps.get_model("product", "Category")._meta.db_table,
+            "user": self.apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table,
+        }
+
+    def create_schema(self):
+        raise NotImplementedError
+
+    def drop_schema(self):
+        raise NotImplementedError
+
+    def index(self, queryset):
+        """(Re)index every product matched by `queryset` with set-based SQL"""
+        raise NotImplementedError
+
+    def remove(self, pks):
+        raise NotImplementedError
+
+    def search(self, terms, limit):
+        """Return matching product ids, best match first"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        self.remove_all()
+        self.index(self.product_model.objects.all())
+
+    def remove_all(self):
+        raise NotImplementedError
+
+    def prep_pks(self, pks):
+        field = self.product_model._meta.pk
+        return [field.get_db_prep_value(pk, self.connection) for pk in pks]
+
+    def ids_sql(self, queryset):
+        return queryset.order_by().values("id").query.sql_with_params()
+
+    def document_select(self):
+        t = self.tables
+        return (
+            f"FROM {t['product']} p "
+            f"LEFT JOIN {t['brand']} b ON b.id = p.brand_id "
+            f"LEFT JOIN {t['category']} c ON c.id = p.category_id "
+            f"LEFT JOIN {t['user']} u ON u.id = p.owner_id "
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    FTS5 index. FTS5 rows are addressed by integer rowid, so a small mapping
+    table translates product ids to rowids for cheap targeted updates.
+    """
+
+    def create_schema(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table}_doc ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "product_id char(32) NOT NULL UNIQUE)"
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "name, brand, category, owner, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def drop_schema(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}_doc")
+
+    def index(self, queryset):
+        ids_sql, params = self.ids_sql(queryset)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ("
+                f"SELECT id FROM {self.table}_doc WHERE product_id IN ({ids_sql}))",
+                params,
+            )
+            cursor.execute(
+                f"INSERT OR IGNORE INTO {self.table}_doc (product_id) {ids_sql}",
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, brand, category, owner) "
+                "SELECT d.id, p.name, COALESCE(b.name, ''), "
+                "COALESCE(c.name, ''), COALESCE(u.fullname, '') "
+                f"{self.document_select()}"
+                f"JOIN {self.table}_doc d ON d.product_id = p.id "
+                f"WHERE p.id IN ({ids_sql})",
+                params,
+            )
+
+    def remove(self, pks):
+        pks = self.prep_pks(pks)
+        if not pks:
+            return
+        placeholders = ", ".join(["%s"] * len(pks))
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ("
+                f"SELECT id FROM {self.table}_doc "
+                f"WHERE product_id IN ({placeholders}))",
+                pks,
+            )
+            cursor.execute(
+                f"DELETE FROM {self.table}_doc WHERE product_id IN ({placeholders})",
+                pks,
+            )
+
+    def remove_all(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"DELETE FROM {self.table}_doc")
+
+    def search(self, terms, limit):
+        match = " ".join(f'"{term}"*' for term in terms)
+        with self.connection.cursor() as cursor:
+            # Column weights: name, brand, category, owner
+            cursor.execute(
+                f"SELECT d.product_id FROM {self.table} "
+                f"JOIN {self.table}_doc d ON d.id = {self.table}.rowid "
+                f"WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, 10.0, 4.0, 4.0, 1.0) LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector documents with per-column weights behind a GIN index"""
+
+    config = "simple"
+
+    def create_schema(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "product_id uuid PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx "
+                f"ON {self.table} USING GIN (document)"
+            )
+
+    def drop_schema(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, queryset):
+        ids_sql, params = self.ids_sql(queryset)
+        config = self.config
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (product_id, document) "
+                "SELECT p.id, "
+                f"setweight(to_tsvector('{config}', p.name), 'A') || "
+                f"setweight(to_tsvector('{config}', COALESCE(b.name, '')), 'B') || "
+                f"setweight(to_tsvector('{config}', COALESCE(c.name, '')), 'B') || "
+                f"setweight(to_tsvector('{config}', COALESCE(u.fullname, '')), 'C') "
+                f"{self.document_select()}"
+                f"WHERE p.id IN ({ids_sql}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                params,
+            )
+
+    def remove(self, pks):
+        pks = self.prep_pks(pks)
+        if not pks:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE product_id = ANY(%s)", [pks]
+            )
+
+    def remove_all(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+    def search(self, terms, limit):
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table}, "
+                f"to_tsquery('{self.config}', %s) query "
+                "WHERE document @@ query "
+                "ORDER BY ts_rank(document, query) DESC LIMIT %s",
+                [tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(conn=None, apps=None):
+    """
+    Backend for the given connection, or None when the database has no
+    full-text support wired up (callers then fall back to icontains).
+    """
+    conn = conn or connection
+    backend_path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)(conn, apps=apps)
+    backend_class = BACKENDS.get(conn.vendor)
+    return backend_class(conn, apps=apps) if backend_class else None
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backed by the full-text index. Results are ranked by relevance
+    unless the client asks for an explicit `ordering`, and each term matches
+    as a prefix ("sne" finds "sneakers").
+
+    Only the PRODUCT_SEARCH_MAX_RESULTS best matches are kept. When a search
+    matches more, `request.search_truncated` is set to that limit so the view
+    can tell the client its results and facets are partial.
+    """
+
+    rank_field = "search_rank"
+
+    def filter_queryset(self, request, queryset, view):
+        terms = get_search_terms(request.query_params.get(self.search_param, ""))
+        # Query the index on whichever database serves this read
+        conn = connections[queryset.db]
+        backend = get_search_backend(conn)
+        if not terms or backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        limit = getattr(settings, "PRODUCT_SEARCH_MAX_RESULTS", 1000)
+        # One extra row tells a search that hit the limit from one that filled it
+        ids = backend.search(terms, limit + 1)
+        if not ids:
+            return queryset.none()
+        if len(ids) > limit:
+            ids = ids[:limit]
+            request.search_truncated = limit
+            logger.warning(
+                f"Product search for {terms} matched more than {limit} products"
+            )
+
+        # A raw CASE keeps the rank expression cheap to compile for long id lists
+        column = "{}.{}".format(
+            conn.ops.quote_name(queryset.model._meta.db_table),
+            conn.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        whens = " ".join(f"WHEN %s THEN {rank}" for rank in range(len(ids)))
+        queryset = queryset.filter(id__in=ids).annotate(
+            **{
+                self.rank_field: RawSQL(
+                    f"CASE {column} {whens} END", ids, output_field=IntegerField()
+                )
+            }
+        )
+        if "ordering" not in request.query_params:
+            queryset = queryset.order_by(self.rank_field)
+        return queryset
+
+
+def reindex_products(queryset):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index(queryset)
+
+
+def remove_products(pks):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove(pks)
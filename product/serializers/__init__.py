@@ -3,3 +3,4 @@ from .brand import BrandListSerializer, BrandSerializer
 from .brand_category import BrandCategoryDetailSerializer, BrandCategorySerializer
 from .size import SizeSerializer, SizeListSerializer, SizeDetailSerializer
 from .product import ProductDetailSerializer, ProductListSerializer, ProductSerializer
+from .stock_alert import StockAlertRuleSerializer
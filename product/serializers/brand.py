@@ -27,6 +27,8 @@ class BrandSerializer(serializers.ModelSerializer):
         return CategoryListSerializer(categories, many=True, context=self.context).data
 
     def get_sizes_count(self, obj):
+        if hasattr(obj, "sizes_total"):
+            return obj.sizes_total
         return obj.sizes.count()
 
 
@@ -51,7 +53,11 @@ class BrandListSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
     def get_categories_count(self, obj):
+        if hasattr(obj, "categories_total"):
+            return obj.categories_total
         return obj.brand_categories.count()
 
     def get_sizes_count(self, obj):
+        if hasattr(obj, "sizes_total"):
+            return obj.sizes_total
         return obj.sizes.count()
@@ -16,13 +16,31 @@ class CategorySerializer(serializers.ModelSerializer):
             "slug",
             "children",
             "ancestor_names",
+            "depth",
             "sizes_count",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["slug", "created_at", "updated_at"]
+        read_only_fields = ["slug", "depth", "created_at", "updated_at"]
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None:
+            subtree = self.instance.get_descendants(include_self=True)
+            if subtree.filter(pk=value.pk).exists():
+                raise serializers.ValidationError(
+                    "A category cannot be moved under itself or its descendants."
+                )
+        return value
 
     def get_children(self, obj):
+        # When the view has preloaded the subtree, nest from that map instead
+        # of querying each level.
+        tree = self.context.get("tree")
+        if tree is not None:
+            return CategorySerializer(
+                tree.get(obj.pk, []), many=True, context=self.context
+            ).data
+
         if obj.children.exists():
             return CategorySerializer(
                 obj.children.all(), many=True, context=self.context
@@ -30,6 +48,8 @@ class CategorySerializer(serializers.ModelSerializer):
         return []
 
     def get_sizes_count(self, obj):
+        if hasattr(obj, "sizes_total"):
+            return obj.sizes_total
         return obj.sizes.count()
 
 
@@ -48,15 +68,20 @@ class CategoryListSerializer(serializers.ModelSerializer):
             "parent",
             "slug",
             "ancestor_names",
+            "depth",
             "children_count",
             "sizes_count",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["slug", "created_at", "updated_at"]
+        read_only_fields = ["slug", "depth", "created_at", "updated_at"]
 
     def get_children_count(self, obj):
+        if hasattr(obj, "children_total"):
+            return obj.children_total
         return obj.children.count()
 
     def get_sizes_count(self, obj):
+        if hasattr(obj, "sizes_total"):
+            return obj.sizes_total
         return obj.sizes.count()
@@ -0,0 +1,52 @@
+from rest_framework import serializers
+from product.models import StockAlertRule
+
+
+class StockAlertRuleSerializer(serializers.ModelSerializer):
+    product_name = serializers.ReadOnlyField(source="product.name")
+    category_name = serializers.ReadOnlyField(source="category.name")
+
+    class Meta:
+        model = StockAlertRule
+        fields = [
+            "id",
+            "product",
+            "category",
+            "product_name",
+            "category_name",
+            "threshold",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["created_at", "updated_at"]
+
+    def validate_threshold(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Threshold cannot be negative")
+        return value
+
+    def validate(self, data):
+        """A rule covers either one of the seller's products or a category"""
+        product = data.get("product", getattr(self.instance, "product", None))
+        category = data.get("category", getattr(self.instance, "category", None))
+        if (product is None) == (category is None):
+            raise serializers.ValidationError(
+                "Set either a product or a category, not both"
+            )
+
+        owner = self.context["request"].user
+        if product is not None and product.owner_id != owner.pk:
+            raise serializers.ValidationError(
+                {"product": "You can only set thresholds for your own products"}
+            )
+
+        existing = StockAlertRule.objects.filter(
+            owner=owner, product=product, category=category
+        )
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError(
+                "You already have a threshold for this product or category"
+            )
+        return data
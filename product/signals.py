@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with `product_ids` after the stock of those products changed, whether
+# through Product.save() or one of ProductQuerySet's stock updates.
+stock_changed = Signal()
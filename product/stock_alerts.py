@@ -0,0 +1,140 @@
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from product.models import Category, Product, StockAlert, StockAlertRule
+
+# Products named in a seller's digest, lowest stock first; the count covers all
+PRODUCTS_LISTED = 50
+
+
+class Thresholds:
+    """
+    The stock alert rules of `owner_ids` (default: every seller), loaded in
+    one query. Pass the owners being checked so a stock event only reads its
+    own sellers' rules.
+    """
+
+    def __init__(self, owner_ids=None):
+        self.default = Decimal(settings.LOW_STOCK_THRESHOLD)
+        self.products = {}
+        self.categories = {}
+        rules = StockAlertRule.objects.all()
+        if owner_ids is not None:
+            rules = rules.filter(owner_id__in=owner_ids)
+        rules = rules.values_list("owner_id", "product_id", "category_id", "threshold")
+        for owner_id, product_id, category_id, threshold in rules:
+            if product_id is not None:
+                self.products[product_id] = threshold
+            else:
+                self.categories[(owner_id, category_id.hex)] = threshold
+        self.highest = max(
+            [self.default, *self.products.values(), *self.categories.values()]
+        )
+
+    def get(self, product_id, owner_id, category_path):
+        """Threshold of a product, given its category's materialized path"""
+        if product_id in self.products:
+            return self.products[product_id]
+        if self.categories and category_path:
+            ancestors = category_path.split(Category.PATH_SEPARATOR)
+            for category in reversed(ancestors):
+                threshold = self.categories.get((owner_id, category))
+                if threshold is not None:
+                    return threshold
+        return self.default
+
+
+class Digests:
+    """Newly low products per seller, keeping only the lowest few"""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.lowest = defaultdict(list)
+
+    def add(self, owner_id, product_id, name, stock, threshold):
+        self.counts[owner_id] += 1
+        entry = (-stock, str(product_id), name, threshold)
+        if len(self.lowest[owner_id]) < PRODUCTS_LISTED:
+            heapq.heappush(self.lowest[owner_id], entry)
+        else:
+            heapq.heappushpop(self.lowest[owner_id], entry)
+
+    def __iter__(self):
+        """(seller_id, product count, listed products) per seller"""
+        for owner_id, count in self.counts.items():
+            products = [
+                {
+                    "product_id": product_id,
+                    "name": name,
+                    "stock": str(-stock),
+                    "threshold": str(threshold),
+                }
+                for stock, product_id, name, threshold in sorted(
+                    self.lowest[owner_id], reverse=True
+                )
+            ]
+            yield owner_id, count, products
+
+
+def check_stock(products=None):
+    """
+    Record which of `products` (default: all) crossed their low stock
+    threshold since the last check, and rearm the ones that recovered.
+    Returns the Digests of newly low products.
+
+    Only crossings alert: a product stays in StockAlert while it is low, so
+    checking it again is silent. Candidates are read through the index on
+    live products' stock, bounded by the highest threshold any rule sets,
+    and streamed in STOCK_ALERT_CHUNK_SIZE rows.
+    """
+    if products is None:
+        products, thresholds = Product.objects.all(), Thresholds()
+    else:
+        thresholds = Thresholds(products.order_by().values("owner_id"))
+    chunk_size = settings.STOCK_ALERT_CHUNK_SIZE
+    digests = Digests()
+
+    candidates = (
+        products.filter(
+            is_archived=False, stock__lte=thresholds.highest, stock_alert__isnull=True
+        )
+        .values_list("id", "name", "stock", "owner_id", "category__path")
+        .order_by()
+    )
+    alerts = []
+    for product_id, name, stock, owner_id, category_path in candidates.iterator(
+        chunk_size
+    ):
+        threshold = thresholds.get(product_id, owner_id, category_path)
+        if stock > threshold:
+            continue
+        alerts.append(
+            StockAlert(product_id=product_id, stock=stock, threshold=threshold)
+        )
+        digests.add(owner_id, product_id, name, stock, threshold)
+        if len(alerts) == chunk_size:
+            StockAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+            alerts = []
+    StockAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+
+    alerted = (
+        products.filter(stock_alert__isnull=False)
+        .values_list("id", "stock", "is_archived", "owner_id", "category__path")
+        .order_by()
+    )
+    recovered = [
+        product_id
+        for product_id, stock, is_archived, owner_id, category_path in (
+            alerted.iterator(chunk_size)
+        )
+        if is_archived or stock > thresholds.get(product_id, owner_id, category_path)
+    ]
+    for start in range(0, len(recovered), chunk_size):
+        StockAlert.objects.filter(
+            product_id__in=recovered[start : start + chunk_size]
+        ).delete()
+
+    return digests
@@ -1,3 +1,846 @@
-from django.test import TestCase
+import base64
+import json
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from datetime import timedelta
+from django.utils import timezone
+from ecommerce.models import OutboxMessage, Watermark
+from ecommerce.tasks import (
+    archive_out_of_stock_products,
+    check_low_stock_products,
+    process_stock_changes,
+)
+from notification.models import Notification
+from orders.models import Order, OrderItem
+from product.cache import get_stats
+from product.models import (
+    Brand,
+    BrandCategory,
+    Category,
+    Product,
+    Size,
+    StockAlert,
+    StockAlertRule,
+)
+from product.stock_alerts import Thresholds, check_stock
+from product.views import (
+    BrandViewSet,
+    CategoryViewSet,
+    ProductViewSet,
+    SizeViewSet,
+    StockAlertRuleViewSet,
+)
+from users.models import User
 
-# Create your tests here.
+
+class CategorySubtreeQueryTests(TestCase):
+    # Children per node for each level below the root: 1 + 6 + 36 + 216 + 1728
+    FAN_OUT = [6, 6, 6, 8]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name="root")
+        level = [cls.root]
+        for fan_out in cls.FAN_OUT:
+            next_level = []
+            for parent in level:
+                for i in range(fan_out):
+                    next_level.append(
+                        Category.objects.create(
+                            name=f"{parent.name}-{i}", parent=parent
+                        )
+                    )
+            level = next_level
+
+        brand = Brand.objects.create(name="Acme")
+        for category in level[:10]:
+            Size.objects.create(name="M", brand=brand, category=category)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = CategoryViewSet.as_view({"get": "retrieve"})
+
+    def retrieve(self, params=None):
+        request = self.factory.get(f"/api/categories/{self.root.id}/", params)
+        return self.view(request, pk=str(self.root.id))
+
+    def count_nodes(self, node):
+        return 1 + sum(self.count_nodes(child) for child in node["children"])
+
+    def test_retrieve_subtree_uses_bounded_queries(self):
+        self.assertEqual(Category.objects.count(), 1987)
+
+        with self.assertNumQueries(3):
+            response = self.retrieve()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        self.assertEqual(self.count_nodes(data), 1987)
+
+        leaf = data
+        while leaf["children"]:
+            leaf = leaf["children"][0]
+        self.assertEqual(leaf["depth"], 4)
+        self.assertEqual(leaf["sizes_count"], 1)
+
+    def test_retrieve_respects_max_depth(self):
+        response = self.retrieve({"max_depth": 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.count_nodes(response.data["data"]), 1 + 6 + 36)
+
+    def test_invalid_max_depth_is_rejected(self):
+        response = self.retrieve({"max_depth": "-1"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.clothing = Category.objects.create(name="Clothing")
+        self.shirts = Category.objects.create(name="Shirts", parent=self.clothing)
+        self.polos = Category.objects.create(name="Polos", parent=self.shirts)
+        self.shoes = Category.objects.create(name="Shoes")
+
+    def assertPath(self, category, *ancestors):
+        category.refresh_from_db()
+        nodes = [*ancestors, category]
+        self.assertEqual(category.path, "".join(f"{node.id.hex}/" for node in nodes))
+        self.assertEqual(category.depth, len(ancestors))
+        self.assertEqual(category.path_names, [node.name for node in nodes])
+
+    def test_reparenting_moves_the_subtree(self):
+        self.shirts.parent = self.shoes
+        self.shirts.save()
+
+        self.assertPath(self.shirts, self.shoes)
+        self.assertPath(self.polos, self.shoes, self.shirts)
+        self.assertEqual(self.polos.slug, "shoes/shirts/polos")
+        self.assertEqual(set(self.shoes.get_descendants()), {self.shirts, self.polos})
+        self.assertFalse(self.clothing.get_descendants().exists())
+
+    def test_renaming_rewrites_descendant_names_and_slugs(self):
+        self.clothing.name = "Apparel"
+        self.clothing.save()
+
+        self.assertEqual(self.clothing.slug, "apparel")
+        self.assertPath(self.shirts, self.clothing)
+        self.assertPath(self.polos, self.clothing, self.shirts)
+        self.assertEqual(self.polos.slug, "apparel/shirts/polos")
+        self.assertEqual(
+            self.polos.get_ancestor_names(), ["Apparel", "Shirts", "Polos"]
+        )
+
+    def test_moving_a_category_under_itself_is_rejected(self):
+        self.clothing.parent = self.polos
+
+        with self.assertRaises(ValidationError):
+            self.clothing.save()
+
+    def test_missing_paths_do_not_match_every_category(self):
+        Category.objects.filter(pk__in=[self.clothing.pk, self.shirts.pk]).update(
+            path=""
+        )
+        self.clothing.refresh_from_db()
+
+        self.assertEqual(
+            set(self.clothing.get_descendants()), {self.shirts, self.polos}
+        )
+
+        call_command("rebuild_category_paths", stdout=StringIO())
+
+        self.assertPath(self.clothing)
+        self.assertPath(self.polos, self.clothing, self.shirts)
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints must issue the same number of queries for any row count"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        # bulk_create skips the post_save welcome email signal
+        self.owner = User(fullname="seller", email="seller@example.com", role="seller")
+        User.objects.bulk_create([self.owner])
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            brand = Brand.objects.create(name=f"brand-{self.rows}")
+            parent = Category.objects.create(name=f"parent-{self.rows}")
+            category = Category.objects.create(name="child", parent=parent)
+            BrandCategory.objects.create(brand=brand, category=category)
+            size = Size.objects.create(name="M", brand=brand, category=category)
+            Product.objects.create(
+                name=f"product-{self.rows}",
+                desp="",
+                price=Decimal("10.00"),
+                stock=Decimal("5.00"),
+                brand=brand,
+                category=category,
+                size=size,
+                owner=self.owner,
+            )
+
+    def assert_constant_queries(self, viewset, path):
+        view = viewset.as_view({"get": "list"})
+
+        self.add_rows(2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            response = view(self.factory.get(path))
+        self.assertEqual(response.status_code, 200)
+
+        self.add_rows(10)
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            response = view(self.factory.get(path))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_category_list(self):
+        self.assert_constant_queries(CategoryViewSet, "/api/categories/")
+
+    def test_brand_list(self):
+        self.assert_constant_queries(BrandViewSet, "/api/brands/")
+
+    def test_size_list(self):
+        self.assert_constant_queries(SizeViewSet, "/api/sizes/")
+
+    def test_product_list(self):
+        self.assert_constant_queries(ProductViewSet, "/api/products/")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductViewSet.as_view({"get": "list"})
+        owner = User(fullname="seller", email="seller@example.com", role="seller")
+        User.objects.bulk_create([owner])
+        # Three products share a price, so only the id orders them
+        self.products = [
+            Product(
+                name=f"product {i}",
+                desp="",
+                price=Decimal(price),
+                stock=Decimal("1.00"),
+                owner=owner,
+            )
+            for i, price in enumerate(["10.00", "20.00", "20.00", "20.00", "30.00"])
+        ]
+        Product.objects.bulk_create(self.products)
+        self.by_price = [
+            str(product.pk)
+            for product in sorted(self.products, key=lambda p: (p.price, p.pk))
+        ]
+
+    def list(self, params):
+        return self.view(self.factory.get("/api/products/", params))
+
+    def follow(self, link):
+        params = dict(parse_qsl(urlsplit(link).query))
+        response = self.list(params)
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]
+
+    def ids(self, page):
+        return [product["id"] for product in page["results"]]
+
+    def cursor(self, values, reverse=False):
+        payload = json.dumps({"v": values, "r": reverse}).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def test_without_cursor_or_page_size_the_full_list_is_returned(self):
+        data = self.list({}).data["data"]
+
+        self.assertEqual(len(data), 5)
+
+    def test_next_and_previous_cursors_walk_ties_by_id(self):
+        page = self.list({"ordering": "price", "page_size": 2}).data["data"]
+        self.assertIsNone(page["previous"])
+        pages = [self.ids(page)]
+        while page["next"]:
+            page = self.follow(page["next"])
+            pages.append(self.ids(page))
+
+        self.assertEqual(sum(pages, []), self.by_price)
+        self.assertEqual(len(pages), 3)
+
+        back = self.follow(page["previous"])
+        self.assertEqual(self.ids(back), pages[1])
+        back = self.follow(back["previous"])
+        self.assertEqual(self.ids(back), pages[0])
+        self.assertIsNone(back["previous"])
+
+    def test_descending_order_uses_a_descending_tiebreaker(self):
+        page = self.list({"ordering": "-price", "page_size": 3}).data["data"]
+        rest = self.follow(page["next"])
+
+        self.assertEqual(self.ids(page) + self.ids(rest), self.by_price[::-1])
+        self.assertIsNone(rest["next"])
+
+    def test_invalid_cursors_are_rejected(self):
+        for cursor in [
+            "not base64 at all",
+            base64.urlsafe_b64encode(b"[1, 2]").decode(),
+            self.cursor(["20.00"]),
+            self.cursor(["not a date", str(self.products[0].pk)]),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.list({"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductViewSet.as_view({"get": "list"})
+        self.owner = User(fullname="seller", email="seller@example.com", role="seller")
+        User.objects.bulk_create([self.owner])
+        self.product = Product.objects.create(
+            name="Shirt",
+            desp="",
+            price=Decimal("10.00"),
+            stock=Decimal("5.00"),
+            owner=self.owner,
+        )
+
+    def test_repeated_list_is_served_from_cache(self):
+        self.view(self.factory.get("/api/products/", {"b": "1", "a": "2"}))
+
+        with self.assertNumQueries(0):
+            response = self.view(self.factory.get("/api/products/?a=2&b=1"))
+
+        self.assertEqual(response.data["data"][0]["name"], "Shirt")
+        self.assertEqual(get_stats()["hits"], 1)
+
+    def test_product_save_evicts_cached_list(self):
+        self.view(self.factory.get("/api/products/"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Jacket"
+            self.product.save()
+
+        response = self.view(self.factory.get("/api/products/"))
+        self.assertEqual(response.data["data"][0]["name"], "Jacket")
+        self.assertEqual(get_stats()["misses"], 2)
+
+    def test_seller_rename_evicts_cached_product_pages(self):
+        detail = ProductViewSet.as_view({"get": "retrieve"})
+        self.view(self.factory.get("/api/products/"))
+        detail(
+            self.factory.get(f"/api/products/{self.product.pk}/"), pk=self.product.pk
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.fullname = "renamed seller"
+            self.owner.save()
+
+        response = self.view(self.factory.get("/api/products/"))
+        self.assertEqual(
+            response.data["data"][0]["owner"]["fullname"], "renamed seller"
+        )
+        response = detail(
+            self.factory.get(f"/api/products/{self.product.pk}/"), pk=self.product.pk
+        )
+        self.assertEqual(response.data["data"]["owner"]["fullname"], "renamed seller")
+
+    def test_archiving_sold_out_products_evicts_cached_list(self):
+        self.view(self.factory.get("/api/products/"))
+        Product.objects.filter(pk=self.product.pk).update(stock=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = archive_out_of_stock_products()
+
+        self.assertEqual(result, "Archived 1 out-of-stock products")
+        response = self.view(self.factory.get("/api/products/"))
+        self.assertTrue(response.data["data"][0]["is_archived"])
+
+    def test_brand_links_evict_filtered_category_lists(self):
+        view = CategoryViewSet.as_view({"get": "list"})
+        category = Category.objects.create(name="Shoes")
+        brand = Brand.objects.create(name="Acme")
+
+        def with_brands():
+            response = view(
+                self.factory.get("/api/categories/", {"has_brands": "true"})
+            )
+            return [row["name"] for row in response.data["data"]]
+
+        self.assertEqual(with_brands(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            BrandCategory.objects.create(brand=brand, category=category)
+
+        self.assertEqual(with_brands(), ["Shoes"])
+
+
+class FacetedProductListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductViewSet.as_view({"get": "list"})
+        owner = User(fullname="seller", email="seller@example.com", role="seller")
+        User.objects.bulk_create([owner])
+
+        self.clothing = Category.objects.create(name="clothing")
+        self.shirts = Category.objects.create(name="shirts", parent=self.clothing)
+        self.shoes = Category.objects.create(name="shoes")
+        self.acme = Brand.objects.create(name="Acme")
+        self.globex = Brand.objects.create(name="Globex")
+        self.medium = Size.objects.create(
+            name="M", brand=self.acme, category=self.shirts
+        )
+
+        for name, price, brand, category, size in [
+            ("Tee", "10.00", self.acme, self.shirts, self.medium),
+            ("Polo", "30.00", self.acme, self.shirts, self.medium),
+            ("Coat", "120.00", self.globex, self.clothing, None),
+            ("Boot", "80.00", self.globex, self.shoes, None),
+        ]:
+            Product.objects.create(
+                name=name,
+                desp="",
+                price=Decimal(price),
+                stock=Decimal("1.00"),
+                brand=brand,
+                category=category,
+                size=size,
+                owner=owner,
+            )
+
+    def list(self, params):
+        return self.view(self.factory.get("/api/products/", params))
+
+    def test_category_id_includes_descendants(self):
+        response = self.list({"category_id": str(self.clothing.id)})
+
+        names = sorted(product["name"] for product in response.data["data"])
+        self.assertEqual(names, ["Coat", "Polo", "Tee"])
+
+    def test_category_id_without_a_path_only_matches_its_subtree(self):
+        Category.objects.filter(pk=self.clothing.pk).update(path="")
+
+        response = self.list({"category_id": str(self.clothing.id)})
+
+        names = sorted(product["name"] for product in response.data["data"])
+        self.assertEqual(names, ["Coat", "Polo", "Tee"])
+
+    def test_facet_counts(self):
+        # Five for the page itself, then one grouped query per facet
+        with self.assertNumQueries(9):
+            response = self.list({"facets": "true", "brand_id": str(self.acme.id)})
+
+        data = response.data["data"]
+        self.assertEqual(len(data["results"]), 2)
+        facets = data["facets"]
+        self.assertEqual(
+            facets["brand"], [{"id": self.acme.id, "name": "Acme", "count": 2}]
+        )
+        self.assertEqual(facets["size"][0]["count"], 2)
+        categories = {node["name"]: node for node in facets["category"]}
+        self.assertEqual(categories["clothing"]["count"], 2)
+        self.assertEqual(categories["shirts"]["count"], 2)
+        self.assertEqual(categories["shirts"]["parent"], self.clothing.id)
+        prices = {bucket["key"]: bucket["count"] for bucket in facets["price"]}
+        self.assertEqual(prices["*-25"], 1)
+        self.assertEqual(prices["25-50"], 1)
+
+    def test_category_facet_rolls_up_subtree(self):
+        response = self.list({"facets": "category", "page_size": 2})
+
+        data = response.data["data"]
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(list(data["facets"]), ["category"])
+        counts = {node["name"]: node["count"] for node in data["facets"]["category"]}
+        self.assertEqual(counts, {"clothing": 3, "shirts": 2, "shoes": 1})
+
+    def test_unknown_facet_is_rejected(self):
+        response = self.list({"facets": "colour"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductViewSet.as_view({"get": "list"})
+        self.owner = User(fullname="Northwind", email="seller@example.com")
+        User.objects.bulk_create([self.owner])
+        self.acme = Brand.objects.create(name="Acme")
+        self.shoes = Category.objects.create(name="Shoes")
+        self.sneakers = self.add("Running sneakers", self.acme)
+        self.boots = self.add("Hiking boots")
+        self.socks = self.add("Sneaker socks")
+
+    def add(self, name, brand=None):
+        return Product.objects.create(
+            name=name,
+            desp="",
+            price=Decimal("10.00"),
+            stock=Decimal("5.00"),
+            brand=brand,
+            category=self.shoes,
+            owner=self.owner,
+        )
+
+    def search(self, text, **params):
+        response = self.view(
+            self.factory.get("/api/products/", {"search": text, **params})
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def names(self, text, **params):
+        return [product["name"] for product in self.search(text, **params).data["data"]]
+
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(
+            sorted(self.names("sneak")), ["Running sneakers", "Sneaker socks"]
+        )
+        self.assertEqual(self.names("hik boo"), ["Hiking boots"])
+        self.assertEqual(self.names("sandals"), [])
+
+    def test_name_matches_rank_above_brand_category_and_owner(self):
+        self.add("Acme laces")
+
+        self.assertEqual(self.names("acme"), ["Acme laces", "Running sneakers"])
+        self.assertEqual(len(self.names("shoes")), 4)
+        self.assertEqual(len(self.names("northwind")), 4)
+
+    def test_explicit_ordering_overrides_rank(self):
+        Product.objects.filter(pk=self.socks.pk).update(price=Decimal("5.00"))
+
+        self.assertEqual(
+            self.names("sneak", ordering="price"), ["Sneaker socks", "Running sneakers"]
+        )
+        self.assertEqual(
+            self.names("sneak", ordering="-price"),
+            ["Running sneakers", "Sneaker socks"],
+        )
+
+    def test_saves_and_deletes_keep_the_index_in_sync(self):
+        self.boots.name = "Trail shoes"
+        self.boots.save()
+        self.socks.delete()
+
+        self.assertEqual(self.names("trail"), ["Trail shoes"])
+        self.assertEqual(self.names("hiking"), [])
+        self.assertEqual(self.names("socks"), [])
+
+    def test_renames_reindex_related_products(self):
+        self.acme.name = "Globex"
+        self.acme.save()
+        self.shoes.name = "Footwear"
+        self.shoes.save()
+        owner = User.objects.get(pk=self.owner.pk)
+        owner.fullname = "Contoso"
+        owner.save()
+
+        self.assertEqual(self.names("globex"), ["Running sneakers"])
+        self.assertEqual(self.names("acme"), [])
+        self.assertEqual(len(self.names("footwear")), 3)
+        self.assertEqual(len(self.names("contoso")), 3)
+
+    def test_deleting_a_brand_drops_it_from_the_documents(self):
+        self.acme.delete()
+
+        self.assertEqual(self.names("acme"), [])
+        self.assertEqual(len(self.names("running")), 1)
+
+    @override_settings(PRODUCT_SEARCH_MAX_RESULTS=1)
+    def test_truncated_results_are_reported(self):
+        with self.assertLogs("product.search", "WARNING"):
+            response = self.search("sneak")
+
+        self.assertTrue(response.data["truncated"])
+        self.assertIn("more than 1 products", response.data["message"])
+        self.assertEqual(len(response.data["data"]), 1)
+
+        self.assertNotIn("truncated", self.search("hiking").data)
+
+    def test_migration_builds_the_index_from_historical_models(self):
+        migration = import_module("product.migrations.0007_product_search_index")
+        state = MigrationExecutor(connection).loader.project_state(
+            ("product", "0007_product_search_index")
+        )
+        editor = SimpleNamespace(connection=connection)
+
+        migration.drop_search_index(state.apps, editor)
+        migration.create_search_index(state.apps, editor)
+
+        self.assertEqual(len(self.names("shoes")), 3)
+
+
+class HotQueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        # Raises CommandError when any plan falls back to a full scan
+        call_command("explain_hot_queries", stdout=StringIO())
+
+
+class StockAlertTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.sellers = [
+            User(fullname=f"seller {i}", email=f"seller{i}@example.com", role="seller")
+            for i in range(2)
+        ]
+        User.objects.bulk_create(self.sellers)
+        self.clothing = Category.objects.create(name="clothing")
+        self.shirts = Category.objects.create(name="shirts", parent=self.clothing)
+
+    def make_products(self, seller, *stocks, category=None):
+        products = [
+            Product(
+                name=f"{seller.fullname} item {i}",
+                desp="",
+                price=Decimal("1.00"),
+                stock=stock,
+                owner=seller,
+                category=category,
+            )
+            for i, stock in enumerate(stocks)
+        ]
+        Product.objects.bulk_create(products)
+        return products
+
+    def alerted(self, digests):
+        return {
+            owner_id: [product["name"] for product in products]
+            for owner_id, count, products in digests
+        }
+
+    def test_only_threshold_crossings_alert(self):
+        low, ok = self.make_products(self.sellers[0], 5, 50)
+
+        self.assertEqual(self.alerted(check_stock()), {self.sellers[0].pk: [low.name]})
+        # Still low, so nothing new
+        self.assertEqual(self.alerted(check_stock()), {})
+
+        Product.objects.filter(pk=low.pk).update(stock=20)
+        Product.objects.filter(pk=ok.pk).update(stock=1)
+        self.assertEqual(self.alerted(check_stock()), {self.sellers[0].pk: [ok.name]})
+        self.assertFalse(StockAlert.objects.filter(product=low).exists())
+
+        # Recovered, so falling again alerts again
+        Product.objects.filter(pk=low.pk).update(stock=2)
+        self.assertEqual(self.alerted(check_stock()), {self.sellers[0].pk: [low.name]})
+
+    def test_product_rules_beat_the_nearest_category_rule(self):
+        seller = self.sellers[0]
+        own_rule, in_shirts = self.make_products(seller, 30, 15, category=self.shirts)
+        (in_clothing,) = self.make_products(seller, 15, category=self.clothing)
+        StockAlertRule.objects.bulk_create(
+            [
+                StockAlertRule(owner=seller, product=own_rule, threshold=40),
+                StockAlertRule(owner=seller, category=self.shirts, threshold=20),
+                StockAlertRule(owner=seller, category=self.clothing, threshold=5),
+                # Someone else's rule does not apply
+                StockAlertRule(
+                    owner=self.sellers[1], category=self.clothing, threshold=100
+                ),
+            ]
+        )
+
+        digests = list(check_stock())
+
+        self.assertEqual(len(digests), 1)
+        owner_id, count, products = digests[0]
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [(product["name"], product["threshold"]) for product in products],
+            [(in_shirts.name, "20.00"), (own_rule.name, "40.00")],
+        )
+
+    def test_checks_only_load_the_rules_of_the_products_owners(self):
+        seller, other = self.sellers
+        (product,) = self.make_products(seller, 15, category=self.shirts)
+        StockAlertRule.objects.bulk_create(
+            [
+                StockAlertRule(owner=seller, category=self.shirts, threshold=20),
+                StockAlertRule(owner=other, category=self.clothing, threshold=100),
+            ]
+        )
+        products = Product.objects.filter(pk=product.pk)
+
+        thresholds = Thresholds(products.values("owner_id"))
+        self.assertEqual(list(thresholds.categories), [(seller.pk, self.shirts.id.hex)])
+        self.assertEqual(thresholds.highest, Decimal("20.00"))
+        self.assertEqual(
+            self.alerted(check_stock(products)), {seller.pk: [product.name]}
+        )
+
+    def test_each_seller_gets_one_digest(self):
+        self.make_products(self.sellers[0], *range(8))
+        self.make_products(self.sellers[1], 3, 60)
+
+        with self.settings(STOCK_ALERT_CHUNK_SIZE=3):
+            self.assertEqual(check_low_stock_products(), "Sent 2 low stock digests")
+        self.assertEqual(check_low_stock_products(), "Sent 0 low stock digests")
+
+        digest = Notification.objects.get(user=self.sellers[0]).data
+        self.assertEqual(digest["count"], 8)
+        self.assertEqual(digest["products"][0]["stock"], "0.00")
+        self.assertEqual(Notification.objects.filter(user=self.sellers[1]).count(), 1)
+
+    def test_sellers_can_only_set_thresholds_for_their_own_products(self):
+        (theirs,) = self.make_products(self.sellers[1], 50)
+        (own,) = self.make_products(self.sellers[0], 50)
+        view = StockAlertRuleViewSet.as_view({"post": "create"})
+
+        def create(data):
+            request = APIRequestFactory().post(
+                "/api/stock-alert-rules/", data, format="json"
+            )
+            force_authenticate(request, user=self.sellers[0])
+            return view(request)
+
+        self.assertEqual(
+            create({"product": theirs.pk, "threshold": 5}).status_code, 400
+        )
+        self.assertEqual(
+            create(
+                {"product": own.pk, "category": self.shirts.pk, "threshold": 5}
+            ).status_code,
+            400,
+        )
+        self.assertEqual(create({"product": own.pk, "threshold": 5}).status_code, 201)
+        self.assertEqual(create({"product": own.pk, "threshold": 8}).status_code, 400)
+        self.assertEqual(StockAlertRule.objects.get(owner=self.sellers[0]).threshold, 5)
+
+
+class StockEventTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the welcome email signal
+        self.seller = User(fullname="seller", email="seller@example.com", role="seller")
+        User.objects.bulk_create([self.seller])
+        self.products = [
+            Product(
+                name=f"item {i}",
+                desp="",
+                price=Decimal("1.00"),
+                stock=stock,
+                owner=self.seller,
+            )
+            for i, stock in enumerate([12, 12, 50])
+        ]
+        Product.objects.bulk_create(self.products)
+
+    def stock_events(self):
+        events = OutboxMessage.objects.filter(
+            task="ecommerce.tasks.process_stock_changes"
+        )
+        return [sorted(event.kwargs["product_ids"]) for event in events]
+
+    def test_reserved_stock_is_checked_as_soon_as_it_commits(self):
+        low, sold_out, _ = self.products
+        Product.objects.reserve_stock({low.pk: 5, sold_out.pk: 12})
+
+        self.assertEqual(self.stock_events(), [sorted([str(low.pk), str(sold_out.pk)])])
+        result = process_stock_changes(
+            **OutboxMessage.objects.get(task__endswith="process_stock_changes").kwargs
+        )
+
+        self.assertEqual(result, "Sent 1 low stock digests, archived 1 products")
+        self.assertEqual(Notification.objects.get(user=self.seller).data["count"], 2)
+        sold_out.refresh_from_db()
+        self.assertTrue(sold_out.is_archived)
+
+    def test_only_stock_edits_by_the_seller_are_events(self):
+        product = self.products[2]
+        view = ProductViewSet.as_view({"patch": "partial_update"})
+
+        def edit(data):
+            request = APIRequestFactory().patch(
+                f"/api/products/{product.pk}/", data, format="json"
+            )
+            force_authenticate(request, user=self.seller)
+            return view(request, pk=product.pk)
+
+        self.assertEqual(edit({"price": "2.00"}).status_code, 200)
+        self.assertEqual(self.stock_events(), [])
+        self.assertEqual(edit({"stock": "3.00"}).status_code, 200)
+        self.assertEqual(self.stock_events(), [[str(product.pk)]])
+
+    def place_order(self, product, quantity, reserve=True):
+        order = Order.objects.create(
+            seller=self.seller,
+            base_amount=quantity,
+            convenience_fee=0,
+            delivery_fee=0,
+            total_amount=quantity,
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            price_at_order=1,
+            quantity=quantity,
+            # As checkout records it after taking the quantity out of stock
+            stock_reserved_at=timezone.now() if reserve else None,
+        )
+        if reserve:
+            Product.objects.reserve_stock({product.pk: quantity})
+        return order
+
+    def test_cancelled_orders_give_their_stock_back(self):
+        product = self.products[0]
+        order = self.place_order(product, 4)
+        OutboxMessage.objects.all().delete()
+
+        Order.objects.filter(pk=order.pk).update(status="cancelled")
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 12)
+        self.assertEqual(self.stock_events(), [[str(product.pk)]])
+
+    def test_reopened_orders_only_give_their_stock_back_once(self):
+        product = self.products[0]
+        order = self.place_order(product, 3)
+
+        for status in ("cancelled", "created", "cancelled", "confirmed", "cancelled"):
+            order.status = status
+            order.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 12)
+
+    def test_orders_that_never_reserved_stock_give_nothing_back(self):
+        product = self.products[0]
+        order = self.place_order(product, 3, reserve=False)
+
+        order.status = "cancelled"
+        order.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 12)
+
+    def test_reconciliation_only_checks_products_changed_since_last_run(self):
+        check_low_stock_products()
+        last_run = Watermark.objects.get(name="stock_alerts").timestamp
+        changed, untouched, _ = self.products
+        # Raw updates that bypass the stock events
+        Product.objects.filter(pk=changed.pk).update(stock=1, updated_at=timezone.now())
+        Product.objects.filter(pk=untouched.pk).update(
+            stock=1, updated_at=last_run - timedelta(hours=1)
+        )
+
+        self.assertEqual(check_low_stock_products(), "Sent 1 low stock digests")
+        self.assertEqual(
+            list(StockAlert.objects.values_list("product_id", flat=True)),
+            [changed.pk],
+        )
@@ -6,6 +6,8 @@ from .views import (
     CategoryViewSet,
     SizeViewSet,
     ProductViewSet,
+    CatalogCacheStatsView,
+    StockAlertRuleViewSet,
 )
 
 router = DefaultRouter()
@@ -14,7 +16,13 @@ router.register(r"categories", CategoryViewSet)
 router.register(r"brand-categories", BrandCategoryViewSet)
 router.register(r"sizes", SizeViewSet)
 router.register(r"products", ProductViewSet)
+router.register(r"stock-alert-rules", StockAlertRuleViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "catalog/cache-stats/",
+        CatalogCacheStatsView.as_view(),
+        name="catalog-cache-stats",
+    ),
 ]
@@ -3,3 +3,5 @@ from .brand import BrandViewSet
 from .category import CategoryViewSet
 from .size import SizeViewSet
 from .product import ProductViewSet
+from .cache import CatalogCacheStatsView
+from .stock_alert import StockAlertRuleViewSet
@@ -2,6 +2,8 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Count, Prefetch
+from product.cache import cache_response
 from product.models import Brand, Category, BrandCategory
 from product.serializers import (
     BrandSerializer,
@@ -12,9 +14,10 @@ from product.serializers import (
 )
 from product.filters import BrandFilter
 from rest_framework.permissions import IsAdminUser
+from ecommerce.utils.views import ReplicaReadMixin
 
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all().prefetch_related("brand_categories__category")
     filter_backends = [
         DjangoFilterBackend,
@@ -61,6 +64,24 @@ class BrandViewSet(viewsets.ModelViewSet):
             return BrandListSerializer
         return BrandSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = queryset.prefetch_related(None).with_counts()
+        elif self.action == "retrieve":
+            queryset = (
+                queryset.prefetch_related(None)
+                .prefetch_related(
+                    Prefetch(
+                        "brand_categories__category",
+                        queryset=Category.objects.with_counts(),
+                    )
+                )
+                .annotate(sizes_total=Count("sizes"))
+            )
+        return queryset
+
+    @cache_response("brand")
     def list(self, request, *args, **kwargs):
         """Override list method to format response"""
         response = super().list(request, *args, **kwargs)
@@ -75,6 +96,7 @@ class BrandViewSet(viewsets.ModelViewSet):
             status_code=response.status_code,
         )
 
+    @cache_response("brand")
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve method to format response"""
         response = super().retrieve(request, *args, **kwargs)
@@ -100,8 +122,9 @@ class BrandViewSet(viewsets.ModelViewSet):
     def categories(self, request, pk=None):
         """Get all categories associated with this brand"""
         brand = self.get_object()
-        brand_categories = brand.brand_categories.all().select_related("category")
-        categories = [bc.category for bc in brand_categories]
+        categories = Category.objects.filter(
+            id__in=brand.brand_categories.values("category_id")
+        ).with_counts()
         serializer = CategoryListSerializer(
             categories, many=True, context={"request": request}
         )
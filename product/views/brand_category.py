@@ -3,15 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Count
+from product.cache import cache_response
 from product.models import Brand, Category, BrandCategory
 from product.serializers import (
     BrandCategorySerializer,
     BrandCategoryDetailSerializer,
 )
 from rest_framework.permissions import IsAdminUser
+from ecommerce.utils.views import ReplicaReadMixin
 
 
-class BrandCategoryViewSet(viewsets.ModelViewSet):
+class BrandCategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = BrandCategory.objects.all().select_related("brand", "category")
     filter_backends = [
         DjangoFilterBackend,
@@ -36,6 +38,7 @@ class BrandCategoryViewSet(viewsets.ModelViewSet):
             return BrandCategoryDetailSerializer
         return BrandCategorySerializer
 
+    @cache_response("brand_category")
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
         return self.format_response(response.data, status_code=response.status_code)
@@ -48,6 +51,7 @@ class BrandCategoryViewSet(viewsets.ModelViewSet):
             status_code=response.status_code,
         )
 
+    @cache_response("brand_category")
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
         return self.format_response(response.data, status_code=response.status_code)
@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from product.cache import get_stats
+
+
+class CatalogCacheStatsView(APIView):
+    """Hit/miss/eviction counters for the public catalog response cache"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {"success": True, "data": get_stats()}, status=status.HTTP_200_OK
+        )
@@ -2,7 +2,9 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from product.models import Category, BrandCategory
+from django.db.models import Count
+from product.cache import cache_response
+from product.models import Brand, Category
 from product.serializers import (
     BrandListSerializer,
     CategorySerializer,
@@ -11,9 +13,10 @@ from product.serializers import (
 )
 from product.filters import CategoryFilter
 from rest_framework.permissions import IsAdminUser
+from ecommerce.utils.views import ReplicaReadMixin
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().prefetch_related("children", "parent")
     filter_backends = [
         DjangoFilterBackend,
@@ -25,6 +28,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ["name", "created_at", "updated_at"]
     ordering = ["name"]
     filterset_class = CategoryFilter
+    replica_actions = ("list", "retrieve", "tree")
 
     def get_permissions(self):
         """Define which actions require admin permissions"""
@@ -56,6 +60,44 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return CategoryListSerializer
         return CategorySerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = queryset.prefetch_related(None).with_counts()
+        elif self.action in ["retrieve", "tree"]:
+            queryset = queryset.annotate(sizes_total=Count("sizes"))
+        return queryset
+
+    def get_max_depth(self):
+        """Parse the optional `max_depth` query param (levels below the root)"""
+        max_depth = self.request.query_params.get("max_depth")
+        if max_depth in (None, ""):
+            return None
+        try:
+            max_depth = int(max_depth)
+        except ValueError:
+            raise ValueError("max_depth must be a non-negative integer")
+        if max_depth < 0:
+            raise ValueError("max_depth must be a non-negative integer")
+        return max_depth
+
+    def build_tree(self, nodes):
+        """Group preloaded nodes by parent so the serializer can nest them"""
+        tree = {}
+        for node in nodes:
+            tree.setdefault(node.parent_id, []).append(node)
+        return tree
+
+    def get_subtree(self, root, max_depth):
+        """Load every descendant of `root` with its size count in one query"""
+        descendants = root.get_descendants()
+        if max_depth is not None:
+            descendants = descendants.filter(depth__lte=root.depth + max_depth)
+        return self.build_tree(
+            descendants.annotate(sizes_total=Count("sizes")).order_by("name")
+        )
+
+    @cache_response("category")
     def list(self, request, *args, **kwargs):
         """List all categories with formatted response"""
         try:
@@ -85,11 +127,24 @@ class CategoryViewSet(viewsets.ModelViewSet):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @cache_response("category")
     def retrieve(self, request, *args, **kwargs):
-        """Retrieve a single category with formatted response"""
+        """Retrieve a single category with its subtree, down to `max_depth`"""
+        try:
+            max_depth = self.get_max_depth()
+        except ValueError as e:
+            return self.format_response(
+                data=None,
+                success=False,
+                message=str(e),
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(instance)
+            context = self.get_serializer_context()
+            context["tree"] = self.get_subtree(instance, max_depth)
+            serializer = self.get_serializer(instance, context=context)
             return self.format_response(
                 data=serializer.data,
                 message="Category retrieved successfully",
@@ -228,10 +283,9 @@ class CategoryViewSet(viewsets.ModelViewSet):
         """Get all brands associated with this category"""
         try:
             category = self.get_object()
-            brand_categories = BrandCategory.objects.filter(
-                category=category
-            ).select_related("brand")
-            brands = [bc.brand for bc in brand_categories]
+            brands = Brand.objects.filter(
+                id__in=category.category_brands.values("brand_id")
+            ).with_counts()
             serializer = BrandListSerializer(
                 brands, many=True, context={"request": request}
             )
@@ -271,12 +325,28 @@ class CategoryViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=["get"])
+    @cache_response("category")
     def tree(self, request):
-        """Get the complete category tree structure"""
+        """Get the complete category tree structure, down to `max_depth`"""
         try:
-            root_categories = self.queryset.filter(parent__isnull=True)
+            max_depth = self.get_max_depth()
+        except ValueError as e:
+            return self.format_response(
+                data=None,
+                success=False,
+                message=str(e),
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            categories = self.get_queryset().prefetch_related(None).order_by("name")
+            if max_depth is not None:
+                categories = categories.filter(depth__lte=max_depth)
+            tree = self.build_tree(categories)
             serializer = CategorySerializer(
-                root_categories, many=True, context={"request": request}
+                tree.get(None, []),
+                many=True,
+                context={"request": request, "tree": tree},
             )
             return self.format_response(
                 data=serializer.data,
@@ -1,15 +1,21 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from product.models import Product
+from django.db.models import Prefetch
+from product.cache import cache_response
+from product.facets import FACETS, compute_facets
+from product.models import Brand, Category, Product
 from product.serializers import (
     ProductSerializer,
     ProductListSerializer,
     ProductDetailSerializer,
 )
 from product.filters import ProductFilter
+from product.pagination import KeysetPagination
+from product.search import ProductSearchFilter
 from rest_framework.response import Response
 from rest_framework import permissions
+from ecommerce.utils.views import ReplicaReadMixin
 
 
 class IsSellerOrAdminAndOwner(permissions.BasePermission):
@@ -41,20 +47,39 @@ class IsSellerOrAdminAndOwner(permissions.BasePermission):
         return user.role == "seller" and obj.owner == user
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().select_related(
         "brand", "category", "size", "owner"
     )
+    # Nested brand/category/size/owner serializers for list and retrieve. The
+    # count annotations are resolved once per page instead of once per row.
+    read_queryset = (
+        Product.objects.all()
+        .select_related("size__brand", "size__category", "owner")
+        .prefetch_related(
+            Prefetch("brand", queryset=Brand.objects.with_counts()),
+            Prefetch("category", queryset=Category.objects.with_counts()),
+            "owner__groups",
+            "owner__user_permissions",
+        )
+    )
+    # Search runs last so it can rank results when no explicit ordering is set
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        ProductSearchFilter,
     ]
     filterset_class = ProductFilter
     search_fields = ["name", "brand__name", "category__name", "owner__fullname"]
     ordering_fields = ["price", "stock", "created_at"]
     ordering = ["-created_at"]
     permission_classes = [IsSellerOrAdminAndOwner]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.action in ["list", "retrieve"]:
+            return self.read_queryset.all()
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -66,10 +91,59 @@ class ProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def get_facet_names(self):
+        """
+        Parse `facets`: "true"/"all" for every facet, or a comma-separated
+        subset of FACETS. Returns an empty list when faceting is off.
+        """
+        value = self.request.query_params.get("facets", "").strip().lower()
+        if value in ("", "false", "0"):
+            return []
+        if value in ("true", "1", "all"):
+            return list(FACETS)
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in FACETS]
+        if unknown:
+            raise ValueError(
+                f"Unknown facets: {', '.join(unknown)}. "
+                f"Choose from: {', '.join(FACETS)}"
+            )
+        return names
+
+    @cache_response("product")
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        return Response({"success": True, "data": response.data})
-
+        try:
+            facet_names = self.get_facet_names()
+        except ValueError as e:
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            data = self.get_paginated_response(serializer.data).data
+        else:
+            data = self.get_serializer(queryset, many=True).data
+
+        if facet_names:
+            # Facets describe the whole filtered result set, not just the page
+            if page is None:
+                data = {"results": data}
+            data["facets"] = compute_facets(queryset, facet_names)
+        body = {"success": True, "data": data}
+        limit = getattr(request, "search_truncated", None)
+        if limit:
+            body["truncated"] = True
+            body["message"] = (
+                f"Search matched more than {limit} products; "
+                f"showing the {limit} best matches"
+            )
+        return Response(body)
+
+    @cache_response("product")
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
         return Response({"success": True, "data": response.data})
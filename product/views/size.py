@@ -2,7 +2,8 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
+from django.db.models import Count, Prefetch
+from product.cache import cache_response
 from product.models import Brand, Category, BrandCategory, Size
 from product.serializers import (
     SizeSerializer,
@@ -11,9 +12,10 @@ from product.serializers import (
 )
 from product.filters import SizeFilter
 from rest_framework.permissions import IsAdminUser
+from ecommerce.utils.views import ReplicaReadMixin
 
 
-class SizeViewSet(viewsets.ModelViewSet):
+class SizeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Size.objects.all().select_related("brand", "category")
     filter_backends = [
         DjangoFilterBackend,
@@ -68,6 +70,18 @@ class SizeViewSet(viewsets.ModelViewSet):
             return SizeDetailSerializer
         return SizeSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "retrieve":
+            # SizeDetailSerializer nests the list serializers, which read
+            # their counts from these annotations
+            queryset = queryset.prefetch_related(
+                Prefetch("brand", queryset=Brand.objects.with_counts()),
+                Prefetch("category", queryset=Category.objects.with_counts()),
+            )
+        return queryset
+
+    @cache_response("size")
     def list(self, request, *args, **kwargs):
         """List all sizes with pagination and filtering"""
         queryset = self.filter_queryset(self.get_queryset())
@@ -89,6 +103,7 @@ class SizeViewSet(viewsets.ModelViewSet):
             status_code=status.HTTP_200_OK,
         )
 
+    @cache_response("size")
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a specific size"""
         instance = self.get_object()
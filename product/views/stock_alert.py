@@ -0,0 +1,63 @@
+from rest_framework import permissions, viewsets
+from rest_framework.response import Response
+from product.models import StockAlertRule
+from product.serializers import StockAlertRuleSerializer
+
+
+class IsSellerOrAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return user.role == "seller" or user.is_staff
+
+
+class StockAlertRuleViewSet(viewsets.ModelViewSet):
+    """A seller's own low stock thresholds, per product or per category"""
+
+    serializer_class = StockAlertRuleSerializer
+    permission_classes = [IsSellerOrAdmin]
+    queryset = StockAlertRule.objects.select_related("product", "category")
+
+    def get_queryset(self):
+        return super().get_queryset().filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def format_response(self, data, success=True, message=None, status_code=None):
+        response_data = {"success": success, "data": data}
+        if message:
+            response_data["message"] = message
+
+        return Response(response_data, status=status_code)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        return self.format_response(response.data, status_code=response.status_code)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        return self.format_response(response.data, status_code=response.status_code)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        return self.format_response(
+            response.data,
+            message="Stock alert threshold created successfully",
+            status_code=response.status_code,
+        )
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        return self.format_response(
+            response.data,
+            message="Stock alert threshold updated successfully",
+            status_code=response.status_code,
+        )
+
+    def destroy(self, request, *args, **kwargs):
+        super().destroy(request, *args, **kwargs)
+        return self.format_response(
+            None, message="Stock alert threshold deleted successfully"
+        )
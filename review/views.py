@@ -4,9 +4,10 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Review, ReviewMedia
 from .serializers import ReviewSerializer, ReviewMediaSerializer
 from rest_framework.response import Response
+from ecommerce.utils.views import ReplicaReadMixin
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all().select_related("user", "product")
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]